@@ -3,6 +3,10 @@ ASGI config for Park_IT project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run with uvicorn workers, e.g.:
+
+    gunicorn Park_IT.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +16,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Park_IT.settings')
+# Serve the async versions of the I/O-heavy views (see Park_IT/async_views.py)
+os.environ.setdefault('PARKIT_ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
+
+# Serving process: send the history rows an earlier run left in the journal
+from utils import history_outbox  # noqa: E402
+
+history_outbox.start()
@@ -0,0 +1,623 @@
+"""
+Async versions of the I/O-heavy views, routed instead of their sync counterparts
+when settings.PARKIT_ASYNC_VIEWS is on (the default under Park_IT/asgi.py).
+
+They reuse the context/JSON builders from views.py and only change how Supabase
+is queried: awaited on the event loop with the async client, so one uvicorn
+worker keeps serving other attendants while it waits on the database.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone as dt_timezone
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import render, redirect
+from django.utils import timezone
+from django.views import View
+from django.views.decorators.http import require_GET, require_POST
+
+from utils import get_async_client
+from utils import history_outbox, metrics, slot_events
+from utils.concurrency import gather
+from utils.idempotency import idempotent_view
+from utils.occupancy import atransition_slot, engine as occupancy, parking_of
+from utils.reference_cache import aget_lots
+from utils.resilience import arun_query, is_unavailable
+from . import views
+
+logger = logging.getLogger('parkit.views')
+
+USER_COLUMNS = 'first_name, last_name, email, student_employee_id, role'
+
+# Comment line sent on idle event streams so proxies don't close them
+SSE_KEEPALIVE_SECONDS = 15
+
+# Template rendering (context processors, message storage) is sync-only
+_render = sync_to_async(render)
+
+
+def _role_of(user_data):
+    # Normalize role: convert to lowercase, handle NULL/empty, default to 'user'
+    raw_role = user_data.get('role') or 'user'
+    role_name = str(raw_role).strip().lower() if raw_role else 'user'
+    if role_name not in ['admin', 'user']:
+        role_name = 'user'
+    return role_name
+
+
+async def _load_user(client, request, columns=USER_COLUMNS):
+    user_id = await request.session.aget('user_id')
+    user_response = await arun_query(client.table('users').select(columns).eq('id', user_id), 'users.profile')
+    return user_response.data[0] if user_response.data else None
+
+
+async def fetch_parking_lots(client):
+    try:
+        return await aget_lots()
+    except Exception:
+        return []
+
+
+async def fetch_parking_slots(client):
+    try:
+        # Try to include extended columns; fall back to base columns if they don't exist yet
+        try:
+            slots_resp = await arun_query(client.table('parking_slot').select(
+                'id, lot_id, slot_number, status, license_plate, check_in_time'
+            ), 'slots.list')
+        except Exception:
+            slots_resp = await arun_query(
+                client.table('parking_slot').select('id, lot_id, slot_number, status'), 'slots.list'
+            )
+        slots = slots_resp.data or []
+        for slot in slots:
+            slot.setdefault('license_plate', None)
+            slot.setdefault('check_in_time', None)
+    except Exception:
+        slots = []
+    return slots
+
+
+async def lot_counts():
+    # The engine answers from memory; only a (re)load has to leave the event loop
+    if occupancy.counts_fresh():
+        return occupancy.lot_counts()
+    return await sync_to_async(occupancy.lot_counts)()
+
+
+async def occupancy_grid(client, selected_lot_id=None):
+    lots = await fetch_parking_lots(client)
+    try:
+        if not occupancy.counts_fresh():
+            await sync_to_async(occupancy.ensure_counts)()
+        lot_options, current_lot, selected_lot_id = views.resolve_lot_options(lots, selected_lot_id)
+        if not occupancy.lot_fresh(selected_lot_id):
+            await sync_to_async(occupancy.ensure_lot)(selected_lot_id)
+        return views.build_occupancy_display(lots, selected_lot_id)
+    except Exception:
+        return views.build_lot_display(lots, await fetch_parking_slots(client), selected_lot_id)
+
+
+class AsyncDashboardView(View):
+    async def get(self, request):
+        if not await request.session.ahas_key('access_token'):
+            messages.error(request, 'Please log in first.')
+            return redirect('login')
+
+        try:
+            client = await get_async_client()
+            user_data = await _load_user(client, request)
+            if user_data is None:
+                messages.error(request, 'User not found.')
+                return redirect('home')
+            role_name = _role_of(user_data)
+        except ValueError:
+            # Supabase credentials not configured
+            messages.error(request, 'Server configuration error. Please contact administrator.')
+            return redirect('home')
+        except Exception as e:
+            messages.error(request, f'Database error: {str(e)}')
+            return redirect('home')
+
+        # Only allow admins to access this dashboard
+        if role_name != 'admin':
+            messages.error(request, 'Access denied. Admins only.')
+            return redirect('user_dashboard')
+
+        window = views.dashboard_window(timezone.localtime(timezone.now()))
+
+        async def load_today_entries():
+            entries_resp = await arun_query(
+                client.table('entries_exits')
+                .select('id, time, vehicle_id, action, zone, lot_id')
+                .gte('time', window['start_of_day'].isoformat())
+                .lt('time', window['end_of_day'].isoformat())
+                .order('time', desc=True)
+                .limit(50),
+                'dashboard.today',
+            )
+            return entries_resp.data or []
+
+        async def load_weekly_entries():
+            weekly_entries_resp = await arun_query(
+                client.table('entries_exits')
+                .select('time, action')
+                .eq('action', 'entry')
+                .gte('time', window['week_start_iso'])
+                .lte('time', window['week_end_iso'])
+                .order('time'),
+                'dashboard.weekly',
+            )
+            return weekly_entries_resp.data or []
+
+        results = await gather(
+            {
+                'lots': partial(fetch_parking_lots, client),
+                'lot_counts': lot_counts,
+                'entries': load_today_entries,
+                'weekly': load_weekly_entries,
+            },
+            defaults={'lots': [], 'lot_counts': {}, 'entries': [], 'weekly': []},
+        )
+
+        entry_rows = results['entries']
+        vehicle_ids = {row.get('vehicle_id') for row in entry_rows if row.get('vehicle_id')}
+        vehicle_map = {}
+        if vehicle_ids:
+            try:
+                vehicle_resp = await arun_query(
+                    client.table('vehicle').select('id, plate').in_('id', list(vehicle_ids)), 'dashboard.vehicles'
+                )
+                vehicle_map = {row['id']: row.get('plate') or '—' for row in (vehicle_resp.data or [])}
+            except Exception:
+                vehicle_map = {}
+
+        context = views.build_dashboard_context(
+            user_data, role_name, window,
+            lots=results['lots'],
+            lot_counts=results['lot_counts'],
+            entry_rows=entry_rows,
+            vehicle_map=vehicle_map,
+            weekly_records=results['weekly'],
+            weekly_error=results.errors.get('weekly'),
+        )
+        return await _render(request, 'dashboard.html', context)
+
+
+class _AsyncSlotGridView(View):
+    template_name = None
+
+    def redirect_for_role(self, request, role_name):
+        return None
+
+    async def get(self, request):
+        if not await request.session.ahas_key('access_token'):
+            messages.error(request, 'Please log in first.')
+            return redirect('login')
+
+        try:
+            client = await get_async_client()
+            user_data = await _load_user(client, request)
+            if user_data is None:
+                messages.error(request, 'User not found.')
+                return redirect('home')
+            role_name = _role_of(user_data)
+        except ValueError:
+            messages.error(request, 'Server configuration error. Please contact administrator.')
+            return redirect('home')
+        except Exception as e:
+            messages.error(request, f'Database error: {str(e)}')
+            return redirect('home')
+
+        response = self.redirect_for_role(request, role_name)
+        if response is not None:
+            return response
+
+        lot_options, current_lot, slots_display, filled_count, available_count, selected_lot_id = await occupancy_grid(
+            client, request.GET.get('lot')
+        )
+
+        context = {
+            'role': role_name,
+            'full_name': f"{user_data['first_name']} {user_data['last_name']}",
+            'first_name': user_data['first_name'],
+            'last_name': user_data['last_name'],
+            'email': user_data['email'],
+            'username': user_data['student_employee_id'],
+            'lots': lot_options,
+            'current_lot': current_lot,
+            'slots': slots_display,
+            'filled_count': filled_count,
+            'available_count': available_count,
+            'selected_lot_id': selected_lot_id,
+        }
+        return await _render(request, self.template_name, context)
+
+
+class AsyncParkingSpacesView(_AsyncSlotGridView):
+    template_name = 'parking_spaces.html'
+
+    def redirect_for_role(self, request, role_name):
+        # Only allow admins to manage parking slots
+        if role_name != 'admin':
+            messages.error(request, 'Access denied. Admins only.')
+            return redirect('user_dashboard')
+        return None
+
+
+class AsyncUserParkingSpacesView(_AsyncSlotGridView):
+    """Parking spaces view for regular users (non-admin)"""
+    template_name = 'stud_parking_spaces.html'
+
+    def redirect_for_role(self, request, role_name):
+        if role_name == 'admin':
+            return redirect('parking_spaces')
+        return None
+
+
+# Names the routes use, so urls.py can pick this module or views.py as a whole
+DashboardView = AsyncDashboardView
+ParkingSpacesView = AsyncParkingSpacesView
+UserParkingSpacesView = AsyncUserParkingSpacesView
+
+
+async def parking_history_api(request):
+    """
+    Async GET /api/admin/parking/history/ - same contract as views.parking_history_api.
+
+    Lot names come from the reference cache, and the exit lookup of every
+    matching entry is issued concurrently instead of one after another.
+    """
+    if not await request.session.ahas_key('access_token'):
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    try:
+        client = await get_async_client()
+        user_data = await _load_user(client, request, columns='role')
+        if user_data is None:
+            return JsonResponse({'error': 'User not found'}, status=404)
+        if _role_of(user_data) != 'admin':
+            return JsonResponse({'error': 'Admin privileges required'}, status=403)
+    except Exception as e:
+        return JsonResponse({'error': f'Authentication error: {str(e)}'}, status=500)
+
+    params = views.history_query_params(request)
+
+    try:
+        entries_query = client.table('entries_exits').select(
+            'id, time, vehicle_id, action, lot_id'
+        ).eq('action', 'entry').order('time', desc=True)
+        if params['date_from']:
+            entries_query = entries_query.gte('time', f"{params['date_from']}T00:00:00")
+        if params['date_to']:
+            entries_query = entries_query.lte('time', f"{params['date_to']}T23:59:59")
+
+        entry_records = (await arun_query(entries_query, 'history.entries')).data or []
+        if not entry_records:
+            return JsonResponse({
+                'results': [],
+                'count': 0,
+                'page': params['page'],
+                'page_size': params['page_size'],
+                'total_pages': 0
+            })
+
+        vehicle_ids = [e['vehicle_id'] for e in entry_records if e.get('vehicle_id')]
+        lot_ids = [e['lot_id'] for e in entry_records if e.get('lot_id')]
+
+        async def load_vehicles():
+            vehicles_query = client.table('vehicle').select('id, plate')
+            if vehicle_ids:
+                vehicles_query = vehicles_query.in_('id', vehicle_ids)
+            if params['search_plate']:
+                vehicles_query = vehicles_query.ilike('plate', f"%{params['search_plate']}%")
+            return (await arun_query(vehicles_query, 'history.vehicles')).data or []
+
+        wanted_lots = {str(lot_id) for lot_id in lot_ids}
+        lot_names = {
+            lot['id']: lot.get('name', '')
+            for lot in await aget_lots()
+            if not wanted_lots or str(lot['id']) in wanted_lots
+        }
+        lots_map = views.history_lots_map(lot_names, params['lot_name'])
+        vehicles_map = {v['id']: v.get('plate', '') for v in await load_vehicles()}
+
+        # Bounded so a long history does not queue past the HTTP pool timeout
+        limit = asyncio.Semaphore(getattr(settings, 'QUERY_FANOUT_WORKERS', 16))
+
+        async def load_exit_time(entry):
+            async with limit:
+                exit_response = await arun_query(client.table('entries_exits').select('time').eq(
+                    'vehicle_id', entry.get('vehicle_id')
+                ).eq('action', 'exit').gte('time', entry.get('time')).order('time', desc=True).limit(1), 'history.exit')
+            return exit_response.data[0].get('time') if exit_response.data else None
+
+        candidates = views.history_candidates(entry_records, vehicles_map, lots_map)
+        exits = await gather({entry.get('id'): partial(load_exit_time, entry) for entry in candidates})
+        # A failed exit lookup leaves the session incomplete, as in the sync view
+        exit_times = {entry_id: exit_time for entry_id, exit_time in exits.items() if exit_time is not None}
+
+        return JsonResponse(views.build_history_page(entry_records, vehicles_map, lots_map, exit_times, params))
+
+    except Exception as e:
+        return JsonResponse({'error': f'Database error: {str(e)}'}, status=500)
+
+
+@require_GET
+async def lot_slots_api(request, lot_id):
+    """Async GET /api/lots/<lot_id>/slots/ - same contract as views.lot_slots_api.
+
+    A poll of a loaded lot is answered from memory without leaving the event loop.
+    """
+    if not await request.session.ahas_key('access_token'):
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    since = views.grid_since(request)
+    try:
+        if not any(str(lot['id']) == str(lot_id) for lot in await aget_lots()):
+            return JsonResponse({'error': 'Parking lot not found'}, status=404)
+        if occupancy.lot_fresh(lot_id):
+            grid = occupancy.lot_grid(lot_id, since)
+        else:
+            grid = await sync_to_async(occupancy.lot_grid)(lot_id, since)
+    except Exception as e:
+        if is_unavailable(e):
+            return JsonResponse({'error': 'The parking database is temporarily unavailable.', 'retryable': True}, status=503)
+        return JsonResponse({'error': f'Failed to load slots: {str(e)}'}, status=500)
+    return views.lot_grid_response(request, lot_id, grid)
+
+
+async def lot_slot_events(request, lot_id):
+    """
+    GET /api/lots/<lot_id>/events/ - Server-Sent Events with the lot's slot changes.
+
+    Each check-in/out, status change or delete made through the app arrives as
+    `event: slot` ({'slot': {'id', 'status', ...}}) or `event: removed`
+    ({'slot_id'}); `event: resync` asks the page to reload.
+    """
+    if not await request.session.ahas_key('access_token'):
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    async def stream():
+        yield 'retry: 5000\n\n'
+        events = slot_events.subscribe(lot_id)
+        next_event = None
+        try:
+            while True:
+                if next_event is None:
+                    next_event = asyncio.ensure_future(events.__anext__())
+                done, _ = await asyncio.wait({next_event}, timeout=SSE_KEEPALIVE_SECONDS)
+                if not done:
+                    yield ': keep-alive\n\n'
+                    continue
+                try:
+                    event = next_event.result()
+                except StopAsyncIteration:
+                    return
+                next_event = None
+                yield slot_events.format_sse(event)
+        finally:
+            # Client gone: stop waiting on the hub (this also unsubscribes)
+            if next_event is not None and not next_event.done():
+                next_event.cancel()
+                try:
+                    await next_event
+                except (asyncio.CancelledError, StopAsyncIteration):
+                    pass
+            await events.aclose()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx/Heroku router: flush each event
+    return response
+
+
+# -- async check-in/out steps: views.py's rules and queries, awaited -------------
+
+async def _find_vehicle(client, license_plate, site):
+    for query in views.vehicle_queries(client, license_plate):
+        vehicle_resp = await arun_query(query, site)
+        if vehicle_resp.data:
+            return vehicle_resp.data[0]['id']
+    return None
+
+
+async def _duplicate_plate_error(client, license_plate):
+    """views._duplicate_plate_error() on the async client."""
+    vehicle_id = await _find_vehicle(client, license_plate, 'checkin.vehicle')
+    if vehicle_id is not None:
+        entries = await arun_query(views.entries_query(client, vehicle_id), 'checkin.active_entries')
+        for entry in entries.data or []:
+            exit_check = await arun_query(
+                views.exit_after_query(client, vehicle_id, entry.get('time')), 'checkin.active_exit'
+            )
+            if not exit_check.data:
+                return views.active_session_error(license_plate)
+    occupied = await arun_query(views.occupied_slots_query(client), 'checkin.plate_slot')
+    return views.parked_slot_error(license_plate, occupied.data or [])
+
+
+async def _vehicle_for_check_in(client, license_plate):
+    """views._vehicle_for_check_in() on the async client."""
+    try:
+        vehicle_id = await _find_vehicle(client, license_plate, 'checkin.vehicle')
+        if vehicle_id is not None:
+            return vehicle_id, None
+        try:
+            vehicle_insert = await arun_query(
+                views.vehicle_insert_query(client, license_plate), 'checkin.vehicle_insert', idempotent=False
+            )
+            if vehicle_insert.data:
+                logger.info('Created vehicle %s for plate %s', vehicle_insert.data[0]['id'], license_plate)
+                return vehicle_insert.data[0]['id'], None
+            insert_error = None
+        except Exception as e:
+            # Duplicate key and the like: another check-in may have created it meanwhile
+            insert_error = e
+            logger.info('Vehicle insert failed (%s), fetching existing vehicle by plate', e)
+        vehicle_id = await _find_vehicle(client, license_plate, 'checkin.vehicle')
+        if vehicle_id is not None:
+            return vehicle_id, None
+        return None, views.vehicle_not_created(license_plate, insert_error)
+    except Exception as e:
+        logger.exception('Error creating/finding vehicle for plate %s', license_plate)
+        return None, str(e)
+
+
+async def _vehicle_for_check_out(client, license_plate):
+    """views._vehicle_for_check_out() on the async client."""
+    if not license_plate:
+        return None, None
+    try:
+        vehicle_id = await _find_vehicle(client, license_plate, 'checkout.vehicle')
+        return vehicle_id, None if vehicle_id is not None else views.vehicle_not_found(license_plate)
+    except Exception as e:
+        logger.exception('Error finding vehicle for plate %s', license_plate)
+        return None, str(e)
+
+
+async def _lot_code(client, lot_id):
+    # Zone (lot code) for the history row; the check-in/out goes on without it
+    try:
+        lot = next((lot for lot in await aget_lots() if str(lot.get('id')) == str(lot_id)), None)
+        if lot is None:
+            lot_resp = await arun_query(views.lot_code_query(client, lot_id), 'lots.code')
+            lot = lot_resp.data[0] if lot_resp.data else None
+        return lot.get('code') if lot else None
+    except Exception as e:
+        logger.warning('Failed to retrieve lot code for lot_id %s: %s', lot_id, e)
+        return None
+
+
+async def _record_history(row, site, slot_id):
+    """(created, history_error) for an entries_exits row, journaled off the event loop."""
+    try:
+        # The journal write is a SQLite fsync (a Supabase insert without the outbox)
+        if await sync_to_async(history_outbox.record)(row, site):
+            logger.debug('Recorded parking history %s', row['action'], extra={'history': row})
+            return True, None
+        return False, views.history_unconfirmed(row, slot_id)
+    except Exception as e:
+        return False, views.history_failure(e, slot_id, row['action'])
+
+
+@require_POST
+@idempotent_view('checkin')
+@metrics.track_slot_action('check_in')
+async def handle_check_in(request, slot_id):
+    """Async POST /api/parking-slots/<slot_id>/check-in/ - same contract as views.handle_check_in."""
+    if not await request.session.ahas_key('access_token'):
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    try:
+        license_plate = views.posted_plate(request)
+        if not license_plate:
+            return JsonResponse({'error': 'License plate is required'}, status=400)
+
+        client = await get_async_client()
+        try:
+            duplicate = await _duplicate_plate_error(client, license_plate)
+        except Exception as check_error:
+            # If check fails, log but don't block - might be a database issue
+            logger.warning('Could not verify duplicate license plate: %s', check_error)
+            duplicate = None
+        if duplicate:
+            return JsonResponse({'error': duplicate}, status=400)
+
+        slot_rows = (await arun_query(views.check_in_slot_query(client, slot_id), 'checkin.slot')).data
+        refusal = views.slot_refusal(slot_rows, 'check_in')
+        if refusal is not None:
+            return refusal
+        current_slot = slot_rows[0]
+        lot_id = current_slot.get('lot_id')
+        lot_code = await _lot_code(client, lot_id)
+
+        check_in_time = datetime.now(dt_timezone.utc).isoformat()
+        # Status, plate and check-in time in one statement, only if nobody took the slot since we read it
+        if not await atransition_slot(client, slot_id, current_slot.get('status'), 'occupied', 'checkin.slot_update',
+                                      fields={'license_plate': license_plate, 'check_in_time': check_in_time}):
+            return views.slot_conflict('check_in')
+        # Publishing the change bumps the shared generation (a cache round trip with REDIS_URL)
+        await sync_to_async(occupancy.check_in)(slot_id, license_plate, check_in_time, lot_id)
+
+        vehicle_id, vehicle_error = await _vehicle_for_check_in(client, license_plate)
+        if vehicle_id:
+            entry_created, history_error = await _record_history(
+                views.history_row(check_in_time, vehicle_id, 'entry', lot_id, lot_code), 'checkin.entry', slot_id
+            )
+        else:
+            entry_created, history_error = False, views.missing_history_data(slot_id, vehicle_id, lot_id, 'entry')
+
+        return JsonResponse(views.with_warnings({
+            'success': True,
+            'message': 'Vehicle checked in successfully',
+            'slot_id': slot_id,
+            'license_plate': license_plate,
+            'check_in_time': check_in_time,
+            'history_created': entry_created,
+            'vehicle_id': vehicle_id,
+            'lot_id': lot_id,
+        }, history_error, vehicle_error))
+
+    except Exception as e:
+        return views.slot_action_failed(e, 'check_in')
+
+
+@require_POST
+@idempotent_view('checkout')
+@metrics.track_slot_action('check_out')
+async def handle_check_out(request, slot_id):
+    """Async POST /api/parking-slots/<slot_id>/check-out/ - same contract as views.handle_check_out."""
+    if not await request.session.ahas_key('access_token'):
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    try:
+        try:
+            provided_plate = views.posted_plate(request)
+        except Exception:
+            provided_plate = ''
+
+        client = await get_async_client()
+        slot_rows = (await arun_query(views.check_out_slot_query(client, slot_id), 'checkout.slot')).data
+        refusal = views.slot_refusal(slot_rows, 'check_out')
+        if refusal is not None:
+            return refusal
+        current_slot = slot_rows[0]
+        license_plate = (provided_plate or current_slot.get('license_plate') or '').strip().upper()
+        lot_id = current_slot.get('lot_id')
+        lot_code = await _lot_code(client, lot_id)
+        vehicle_id, vehicle_error = await _vehicle_for_check_out(client, license_plate)
+
+        check_out_time = datetime.now(dt_timezone.utc).isoformat()
+        # Status cleared with the plate and check-in time in one statement, only if the slot still
+        # holds the parking read above (not a later one by another vehicle)
+        if not await atransition_slot(client, slot_id, current_slot.get('status'), 'available', 'checkout.slot_update',
+                                      fields={'license_plate': None, 'check_in_time': None},
+                                      expected=parking_of(current_slot)):
+            return views.slot_conflict('check_out')
+        await sync_to_async(occupancy.check_out)(slot_id, lot_id)
+
+        if vehicle_id:
+            exit_created, history_error = await _record_history(
+                views.history_row(check_out_time, vehicle_id, 'exit', lot_id, lot_code), 'checkout.exit', slot_id
+            )
+        else:
+            exit_created, history_error = False, views.missing_history_data(slot_id, vehicle_id, lot_id, 'exit')
+
+        return JsonResponse(views.with_warnings({
+            'success': True,
+            'message': 'Vehicle checked out successfully',
+            'slot_id': slot_id,
+            'slot_number': current_slot.get('slot_number', ''),
+            'license_plate': license_plate,
+            'history_created': exit_created,
+            'vehicle_id': vehicle_id,
+            'lot_id': lot_id,
+        }, history_error, vehicle_error))
+
+    except Exception as e:
+        return views.slot_action_failed(e, 'check_out')
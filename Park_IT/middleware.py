@@ -1,23 +1,330 @@
 """
 Middleware for role-based access control (RBAC).
 Protects /admin/* routes to ensure only users with "admin" role can access them.
+Also tags each request with a request id for the logs, traces it, records
+request metrics and profiles requests (single ones on demand, all of them at a
+low rate), and serves static files without a thread hop under ASGI.
 """
+import logging
+import re
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.urls import resolve
-from utils import supabase
+from whitenoise.middleware import WhiteNoiseMiddleware
+from utils import supabase, get_async_client
+from utils import metrics, profiling, tracing
+from utils.log import request_id
+
+# Ids accepted from the X-Request-ID header set by the load balancer
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+def _normalize_role(rows):
+    # Normalize role: convert to lowercase, handle NULL/empty, default to 'user'
+    raw_role = rows[0].get('role', 'user')
+    user_role = str(raw_role).strip().lower() if raw_role else 'user'
+    if user_role not in ['admin', 'user']:
+        user_role = 'user'
+    return user_role
+
+
+class RequestIdMiddleware:
+    """
+    Gives every request an id (the incoming X-Request-ID, or a new one), made
+    available to log records through utils.log.request_id and echoed in the
+    X-Request-ID response header.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _begin(self, request):
+        incoming = request.headers.get('X-Request-ID', '')
+        request.request_id = incoming if _REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        return request_id.set(request.request_id)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self._begin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id.reset(token)
+        response['X-Request-ID'] = request.request_id
+        return response
+
+    async def __acall__(self, request):
+        token = self._begin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_id.reset(token)
+        response['X-Request-ID'] = request.request_id
+        return response
+
+
+class TracingMiddleware:
+    """
+    Opens the server span of each sampled request (utils/tracing.py); the
+    Supabase, template and cache spans of the request nest under it. Not used
+    unless settings.TRACING is on.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'TRACING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _begin(request):
+        root = tracing.start_trace(request.method, traceparent=request.headers.get('traceparent'), attributes={
+            'http.request.method': request.method,
+            'url.path': request.path,
+            'parkit.request_id': getattr(request, 'request_id', None),
+        })
+        return root, tracing.current_span.set(root)
+
+    @staticmethod
+    def _finish(request, response, root, token):
+        tracing.current_span.reset(token)
+        if root is None:
+            return
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            root.name = f'{request.method} {match.url_name or match.view_name}'
+            root.set_attribute('http.route', match.route)
+        if response is None:
+            root.set_error('unhandled exception')
+        else:
+            root.set_attribute('http.response.status_code', response.status_code)
+            if response.status_code >= 500:
+                root.set_error(f'HTTP {response.status_code}')
+        tracing.finish_trace(root)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        root, token = self._begin(request)
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self._finish(request, response, root, token)
+
+    async def __acall__(self, request):
+        root, token = self._begin(request)
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self._finish(request, response, root, token)
+
+
+def _observe_request(request, response, started):
+    match = getattr(request, 'resolver_match', None)
+    # URL names keep the label set small; unresolved paths (404s, static files) share one label
+    view = (match.url_name or match.view_name) if match is not None else 'unmatched'
+    metrics.REQUEST_LATENCY.observe(time.perf_counter() - started, view=view, method=request.method)
+    status = f'{response.status_code // 100}xx' if response is not None else '5xx'
+    metrics.REQUESTS.inc(view=view, method=request.method, status=status)
+
+
+class MetricsMiddleware:
+    """Records the latency and status of every request per URL name (utils/metrics.py)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            _observe_request(request, response, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            _observe_request(request, response, started)
+
+
+class ProfilingMiddleware:
+    """
+    Runs a request under utils.profiling when it carries a signed profile link
+    (?profile=<token> or X-Profile: <token>) issued to the logged-in admin.
+    Removed from the chain entirely when settings.REQUEST_PROFILING is off.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _token(request):
+        return request.GET.get('profile') or request.META.get('HTTP_X_PROFILE')
+
+    @staticmethod
+    def _finish(request, response, profile, options):
+        match = getattr(request, 'resolver_match', None)
+        name = match.url_name if match is not None and match.url_name else 'unmatched'
+        if options['download']:
+            download = HttpResponse(profile.content(), content_type='text/plain; charset=utf-8'
+                                    if profile.mode == 'sample' else 'application/octet-stream')
+            download['Content-Disposition'] = f'attachment; filename="{name}.{profile.extension}"'
+            download['X-Profile-Seconds'] = f'{profile.seconds:.4f}'
+            return download
+        filename = profile.save(f'{name}-{getattr(request, "request_id", "")}')
+        logging.getLogger('parkit.profiling').info(
+            'Profiled %s in %.3fs', request.path, profile.seconds, extra={'profile_file': filename}
+        )
+        response['X-Profile-File'] = filename
+        response['X-Profile-Seconds'] = f'{profile.seconds:.4f}'
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self._token(request)
+        options = token and profiling.read_token(token, request.session.get('user_id'))
+        if not options:
+            return self.get_response(request)
+        profile = profiling.RequestProfile(options['mode']).start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.stop()
+        return self._finish(request, response, profile, options)
+
+    async def __acall__(self, request):
+        token = self._token(request)
+        options = token and profiling.read_token(token, await request.session.aget('user_id'))
+        if not options:
+            return await self.get_response(request)
+        # Samples the event loop thread, so concurrent requests on it show up too
+        profile = profiling.RequestProfile(options['mode']).start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile.stop()
+        return self._finish(request, response, profile, options)
+
+
+class ContinuousProfilingMiddleware:
+    """
+    Registers the thread serving each request with the continuous sampler
+    (utils.profiling.ContinuousSampler), labelled with the view's URL name.
+    Not used unless settings.CONTINUOUS_PROFILING is on. Under ASGI the views
+    share the event loop thread, so async requests are not sampled.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CONTINUOUS_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sampler = profiling.get_sampler()
+        sampler.enter(request)
+        try:
+            return self.get_response(request)
+        finally:
+            sampler.exit()
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware that is also async-capable. WhiteNoise's own is
+    sync-only, so under ASGI Django would run it (and, through it, every async
+    view below) across a sync_to_async/async_to_sync pair on each request.
+    Here only a static file is served in a thread; every other request goes on
+    to the async views directly.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # DEBUG: looked up on disk on each request
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
 
 
 class RoleBasedAccessControlMiddleware:
     """
     Middleware that enforces role-based access control.
     All routes under /admin/* require the authenticated user to have role="admin".
+    Works in both the WSGI (sync) and ASGI (async) request paths.
     """
+    sync_capable = True
+    async_capable = True
     
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
         # Skip Django admin routes (moved to /django-admin/)
         if request.path.startswith('/django-admin/'):
             response = self.get_response(request)
@@ -40,14 +347,8 @@ class RoleBasedAccessControlMiddleware:
                     request.session.flush()
                     return redirect('login')
                 
-                # Normalize role: convert to lowercase, handle NULL/empty, default to 'user'
-                raw_role = user_response.data[0].get('role', 'user')
-                user_role = str(raw_role).strip().lower() if raw_role else 'user'
-                if user_role not in ['admin', 'user']:
-                    user_role = 'user'
-                
                 # Only allow "admin" role to access /admin/* routes
-                if user_role != 'admin':
+                if _normalize_role(user_response.data) != 'admin':
                     messages.error(request, 'Access denied. Admin privileges required.')
                     return redirect('user_dashboard')
                     
@@ -58,3 +359,29 @@ class RoleBasedAccessControlMiddleware:
         response = self.get_response(request)
         return response
 
+    async def __acall__(self, request):
+        # Same checks as __call__, using the async session API and Supabase client
+        if request.path.startswith('/admin/'):
+            if not await request.session.ahas_key('access_token') or not await request.session.ahas_key('user_id'):
+                messages.error(request, 'Please log in to access this page.')
+                return redirect('login')
+
+            try:
+                user_id = await request.session.aget('user_id')
+                client = await get_async_client()
+                user_response = await client.table('users').select('role').eq('id', user_id).execute()
+
+                if not user_response.data:
+                    messages.error(request, 'User not found.')
+                    await request.session.aflush()
+                    return redirect('login')
+
+                if _normalize_role(user_response.data) != 'admin':
+                    messages.error(request, 'Access denied. Admin privileges required.')
+                    return redirect('user_dashboard')
+
+            except Exception as e:
+                messages.error(request, f'Error verifying access: {str(e)}')
+                return redirect('login')
+
+        return await self.get_response(request)
@@ -45,12 +45,16 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'crispy_forms',
     'crispy_bootstrap5',
+    'parkit_ops',
 ]
 
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
+    'Park_IT.middleware.RequestIdMiddleware',  # request ids for the logs
+    'Park_IT.middleware.TracingMiddleware',  # request spans (TRACING=True)
+    'Park_IT.middleware.MetricsMiddleware',  # request latency for /metrics
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,7 +62,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'Park_IT.middleware.ProfilingMiddleware',  # signed per-request profiling for admins
+    'Park_IT.middleware.ContinuousProfilingMiddleware',  # low-rate sampling of every request
+    'Park_IT.middleware.StaticFilesMiddleware',  # WhiteNoise, async-capable for ASGI
     'Park_IT.middleware.RoleBasedAccessControlMiddleware',  # RBAC middleware
 ]
 
@@ -66,7 +72,8 @@ ROOT_URLCONF = 'Park_IT.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates with a span per render (utils/tracing.py)
+        'BACKEND': 'Park_IT.template_backends.TracingDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -110,6 +117,164 @@ else:
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_ANON_KEY = os.getenv('SUPABASE_ANON_KEY')
 
+# HTTP transport for the shared Supabase client (one pool per worker process,
+# shared by all of its threads). Size MAX_CONNECTIONS to at least the number of
+# gunicorn threads; with HTTP2 the requests are multiplexed over fewer sockets.
+SUPABASE_HTTP = {
+    'HTTP2': os.getenv('SUPABASE_HTTP2', 'True') == 'True',
+    'MAX_CONNECTIONS': int(os.getenv('SUPABASE_POOL_MAX_CONNECTIONS', '20')),
+    'MAX_KEEPALIVE_CONNECTIONS': int(os.getenv('SUPABASE_POOL_MAX_KEEPALIVE', '10')),
+    'KEEPALIVE_EXPIRY': float(os.getenv('SUPABASE_KEEPALIVE_EXPIRY', '60')),
+    'CONNECT_TIMEOUT': float(os.getenv('SUPABASE_CONNECT_TIMEOUT', '5')),
+    'READ_TIMEOUT': float(os.getenv('SUPABASE_READ_TIMEOUT', '15')),
+    'WRITE_TIMEOUT': float(os.getenv('SUPABASE_WRITE_TIMEOUT', '15')),
+    'POOL_TIMEOUT': float(os.getenv('SUPABASE_POOL_TIMEOUT', '5')),
+}
+
+# Independent queries within one request run concurrently (utils/concurrency.py)
+QUERY_FANOUT_WORKERS = int(os.getenv('QUERY_FANOUT_WORKERS', '16'))
+QUERY_FANOUT_TIMEOUT = float(os.getenv('QUERY_FANOUT_TIMEOUT', '10'))
+
+# Retries, hedged reads and circuit breaker for Supabase calls (utils/resilience.py).
+# SITES overrides the policy per call site name.
+SUPABASE_RESILIENCE = {
+    'RETRIES': int(os.getenv('SUPABASE_RETRIES', '2')),
+    'BACKOFF_BASE': float(os.getenv('SUPABASE_BACKOFF_BASE', '0.1')),
+    'BACKOFF_MAX': float(os.getenv('SUPABASE_BACKOFF_MAX', '1.0')),
+    'HEDGE': os.getenv('SUPABASE_HEDGE', 'False') == 'True',
+    'HEDGE_MIN_DELAY': float(os.getenv('SUPABASE_HEDGE_MIN_DELAY', '0.05')),
+    # Share of the hedged reads in flight that may have a second attempt out
+    'HEDGE_MAX_SHARE': float(os.getenv('SUPABASE_HEDGE_MAX_SHARE', '0.1')),
+    'BREAKER_THRESHOLD': int(os.getenv('SUPABASE_BREAKER_THRESHOLD', '5')),
+    'BREAKER_RESET': float(os.getenv('SUPABASE_BREAKER_RESET', '30')),
+    'SITES': {
+        # Small, hot reads: hedge the slow tail
+        'lots.list': {'HEDGE': True},
+        'slots.list': {'HEDGE': True},
+        'checkin.slot': {'HEDGE': True},
+        # Up to 2000 rows - a retry costs as much as the first attempt
+        'reports.entries': {'RETRIES': 1},
+    },
+}
+
+# Shared cache for reference data (utils/reference_cache.py). Set REDIS_URL so all
+# workers share one copy and see invalidations; otherwise each process keeps its own.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',  # needs the redis package
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+REFERENCE_CACHE = {
+    'TTL': int(os.getenv('REFERENCE_CACHE_TTL', '3600')),
+    'LOCAL_TTL': float(os.getenv('REFERENCE_CACHE_LOCAL_TTL', '5')),
+}
+
+# Check-in/out responses kept for replay to retries with the same Idempotency-Key
+# header (utils/idempotency.py), in the cache above.
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', '900'))
+
+# Local SQLite journal for entries_exits rows written by check-in/out, drained to
+# Supabase in the background (utils/history_outbox.py). Keep it on persistent disk;
+# an empty value inserts synchronously instead.
+HISTORY_OUTBOX_PATH = os.getenv('HISTORY_OUTBOX_PATH', str(BASE_DIR / 'history_outbox.sqlite3'))
+
+# Shared secret of the gate cameras posting to /api/gate-events/ (unset: endpoint disabled)
+GATE_API_KEY = os.getenv('GATE_API_KEY')
+
+# In-memory occupancy engine (utils/occupancy.py): how often each worker re-reads
+# parking_slot to pick up changes made outside the app. With REDIS_URL set, workers
+# also compare per-lot change counters in the cache every OCCUPANCY_SHARED_CHECK_SECONDS
+# and re-read a lot another worker wrote to; without it run a single worker, or the
+# slot grids of the others lag by up to OCCUPANCY_RECONCILE_SECONDS.
+OCCUPANCY_RECONCILE_SECONDS = float(os.getenv('OCCUPANCY_RECONCILE_SECONDS', '60'))
+OCCUPANCY_SHARED_CHECK_SECONDS = float(os.getenv('OCCUPANCY_SHARED_CHECK_SECONDS', '1'))
+
+# Route the dashboard, parking spaces, history API and check-in/out to the async
+# views (Park_IT/async_views.py). Park_IT/asgi.py turns this on by default.
+PARKIT_ASYNC_VIEWS = os.getenv('PARKIT_ASYNC_VIEWS', 'False') == 'True'
+
+# Prometheus scrape endpoint /metrics (utils/metrics.py), authenticated with
+# Authorization: Bearer <METRICS_TOKEN> (unset: endpoint disabled). With several
+# gunicorn workers, METRICS_DIR is where each worker writes its values so a
+# scrape sees the sum; clear it on each deploy.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+
+# Per-request profiling for admins (utils/profiling.py): links from
+# /api/admin/profile-link/ are valid for PROFILE_TOKEN_MAX_AGE seconds; profiles
+# are saved in PROFILE_DIR. REQUEST_PROFILING=False removes the middleware.
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', 'True') == 'True'
+PROFILE_DIR = os.getenv('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+PROFILE_TOKEN_MAX_AGE = int(os.getenv('PROFILE_TOKEN_MAX_AGE', '900'))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.001'))
+
+# Continuous profiler: the request threads are sampled every PROFILER_SAMPLE_INTERVAL
+# seconds and the stacks written to PROFILER_DIR every PROFILER_FLUSH_SECONDS (kept
+# PROFILER_RETENTION_DAYS). Merge them with `manage.py profile_stacks`. Off unless
+# enabled: point PROFILER_DIR at persistent storage first (the default under BASE_DIR
+# is lost on every deploy on ephemeral hosts such as Render).
+CONTINUOUS_PROFILING = os.getenv('CONTINUOUS_PROFILING', 'False') == 'True'
+PROFILER_DIR = os.getenv('PROFILER_DIR', str(BASE_DIR / 'profiles' / 'continuous'))
+PROFILER_SAMPLE_INTERVAL = float(os.getenv('PROFILER_SAMPLE_INTERVAL', '0.02'))
+PROFILER_FLUSH_SECONDS = float(os.getenv('PROFILER_FLUSH_SECONDS', '60'))
+PROFILER_RETENTION_DAYS = float(os.getenv('PROFILER_RETENTION_DAYS', '7'))
+
+# Supabase calls slower than SLOW_QUERY_MS are logged with their call site and
+# ranked over the last SLOW_QUERY_WINDOW_SECONDS at /api/admin/slow-queries/.
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', '500'))
+SLOW_QUERY_WINDOW_SECONDS = int(os.getenv('SLOW_QUERY_WINDOW_SECONDS', '3600'))
+
+# Tracing (utils/tracing.py): TRACE_SAMPLE_RATE of the requests get spans for their
+# Supabase calls, template renders and cache lookups, appended as OTLP/JSON to
+# TRACE_DIR and/or POSTed to TRACE_OTLP_ENDPOINT (e.g. http://localhost:4318/v1/traces).
+TRACING = os.getenv('TRACING', 'False') == 'True'
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '1.0'))
+TRACE_DIR = os.getenv('TRACE_DIR', str(BASE_DIR / 'traces'))
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', '')
+
+# Logging (utils/log.py): JSON lines on stdout, written by a background thread
+# so a log call never blocks a request. LOG_LEVEL applies to the app's loggers
+# (parkit.*); DEBUG records are sampled at LOG_DEBUG_SAMPLE_RATE (0..1).
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_JSON = os.getenv('LOG_JSON', 'True') == 'True'
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '0.01'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'utils.log.RequestIdFilter'},
+        'sample_debug': {'()': 'utils.log.SamplingFilter', 'rate': LOG_DEBUG_SAMPLE_RATE},
+    },
+    'formatters': {
+        'json': {'()': 'utils.log.JsonFormatter'},
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s [%(request_id)s %(trace_id)s] %(message)s'},
+    },
+    'handlers': {
+        'queue': {
+            'class': 'utils.log.QueueingHandler',
+            'filters': ['request_id', 'sample_debug'],
+            'formatter': 'json' if LOG_JSON else 'plain',
+        },
+    },
+    'root': {'handlers': ['queue'], 'level': 'WARNING'},
+    'loggers': {
+        'django': {'handlers': ['queue'], 'level': os.getenv('DJANGO_LOG_LEVEL', 'INFO'), 'propagate': False},
+        'parkit': {'handlers': ['queue'], 'level': LOG_LEVEL, 'propagate': False},
+        # Per-row output of the dashboard's weekly peak chart
+        'parkit.views.dashboard': {'level': os.getenv('DASHBOARD_LOG_LEVEL', LOG_LEVEL)},
+    },
+}
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'Asia/Singapore'  # GMT+8 timezone
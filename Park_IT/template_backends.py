@@ -0,0 +1,24 @@
+"""
+Django template backend that traces rendering (utils/tracing.py).
+
+Same engine and options as django.template.backends.django.DjangoTemplates;
+each render() of a page template is a 'render <template>' span of the request.
+"""
+from django.template.backends.django import DjangoTemplates, Template
+
+from utils import tracing
+
+
+class TracedTemplate(Template):
+    def render(self, context=None, request=None):
+        name = self.origin.template_name or '<string>'
+        with tracing.span(f'render {name}', attributes={'template.name': name}):
+            return super().render(context, request)
+
+
+class TracingDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TracedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TracedTemplate(super().get_template(template_name).template, self)
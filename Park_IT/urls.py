@@ -2,16 +2,22 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path
+from . import async_views, views
 from .views import (
     HomeView, RegisterView, LoginView, logout_view,
-    SignInView, DashboardView, ParkingSpacesView, ManageUsersView, UserDashboardView,
+    SignInView, ManageUsersView, UserDashboardView,
     EditUserView, deactivate_user, activate_user, AddUserView, update_parking_slot_status,
-    UserParkingSpacesView, UnifiedLoginView, update_user_role, AdminParkingHistoryView,
-    parking_history_api, ProfileForUsersView, reset_user_password, ChangePasswordView,
-    AdminResetPasswordView, handle_check_in, handle_check_out, get_slot_details,
+    UnifiedLoginView, update_user_role, AdminParkingHistoryView,
+    ProfileForUsersView, reset_user_password, ChangePasswordView,
+    AdminResetPasswordView, get_slot_details,
     AdvancedReportsView, export_parking_csv, monthly_report_api, delete_parking_slot,
+    bulk_update_slot_status, ingest_gate_events,
+    sync_attendant_actions, metrics_view, profile_link_api, slow_queries_api,
 )
 
+# Under ASGI the I/O-heavy endpoints are served by their async versions
+view_module = async_views if settings.PARKIT_ASYNC_VIEWS else views
+
 urlpatterns = [
     path('django-admin/', admin.site.urls),  # Django admin (moved to avoid conflict)
     path('', HomeView.as_view(), name='home'),
@@ -24,7 +30,7 @@ urlpatterns = [
     path('signin/<str:portal>/', LoginView.as_view(), name='signin'),
     path('logout/', logout_view, name='logout'),
     # Admin dashboard (protected by middleware) - redirects /admin to dashboard
-    path('admin/', DashboardView.as_view(), name='dashboard'),
+    path('admin/', view_module.DashboardView.as_view(), name='dashboard'),
     # User/Attendant dashboard
     path('users/attendant/', UserDashboardView.as_view(), name='user_dashboard'),
     path('user-dashboard/', UserDashboardView.as_view(), name='user_dashboard_legacy'),  # Legacy alias
@@ -34,10 +40,14 @@ urlpatterns = [
     path('profile/update/', ProfileForUsersView.as_view(), name='update_profile'),  # Alias for profile update form
     path('profile/change-password/', ChangePasswordView.as_view(), name='change_password'),
     # Parking spaces
-    path('parking-spaces/', ParkingSpacesView.as_view(), name='parking_spaces'),
-    path('user/parking-spaces/', UserParkingSpacesView.as_view(), name='user_parking_spaces'),
-    path('student/parking-spaces/', UserParkingSpacesView.as_view(), name='stud_parking_spaces'),  # Legacy alias for backward compatibility
+    path('parking-spaces/', view_module.ParkingSpacesView.as_view(), name='parking_spaces'),
+    path('user/parking-spaces/', view_module.UserParkingSpacesView.as_view(), name='user_parking_spaces'),
+    path('student/parking-spaces/', view_module.UserParkingSpacesView.as_view(), name='stud_parking_spaces'),  # Legacy alias for backward compatibility
     path('parking-slots/<int:slot_id>/status/', update_parking_slot_status, name='update_slot_status'),
+    path('api/parking-slots/bulk-status/', bulk_update_slot_status, name='bulk_update_slot_status'),
+    path('api/parking-slots/sync/', sync_attendant_actions, name='sync_attendant_actions'),
+    path('api/gate-events/', ingest_gate_events, name='ingest_gate_events'),
+    path('metrics', metrics_view, name='metrics'),
     # User management (admin only)
     path("manage-users/", ManageUsersView.as_view(), name="manage_users"),
     path("manage-users/add/", AddUserView.as_view(), name="add_user"),
@@ -51,15 +61,21 @@ urlpatterns = [
     # Advanced Reports (admin only)
     path("admin/reports/", AdvancedReportsView.as_view(), name="advanced_reports"),
     # Admin API endpoints
-    path("api/admin/parking/history/", parking_history_api, name="parking_history_api"),
+    path("api/admin/parking/history/", view_module.parking_history_api, name="parking_history_api"),
     path("api/admin/reports/export-csv/", export_parking_csv, name="export_parking_csv"),
     path("api/admin/reports/monthly/", monthly_report_api, name="monthly_report_api"),
     path("api/admin/users/<str:user_id>/role/", update_user_role, name="update_user_role"),
+    path("api/admin/profile-link/", profile_link_api, name="profile_link_api"),
+    path("api/admin/slow-queries/", slow_queries_api, name="slow_queries_api"),
     # Parking slot check-in/check-out endpoints
-    path("api/parking-slots/<int:slot_id>/check-in/", handle_check_in, name="check_in"),
-    path("api/parking-slots/<int:slot_id>/check-out/", handle_check_out, name="check_out"),
+    path("api/parking-slots/<int:slot_id>/check-in/", view_module.handle_check_in, name="check_in"),
+    path("api/parking-slots/<int:slot_id>/check-out/", view_module.handle_check_out, name="check_out"),
     path("api/parking-slots/<int:slot_id>/details/", get_slot_details, name="slot_details"),
     path("api/parking-slots/<int:slot_id>/delete/", delete_parking_slot, name="delete_slot"),
+    # Slot grid of a lot as JSON (versioned, ETag / ?since= deltas)
+    path("api/lots/<int:lot_id>/slots/", view_module.lot_slots_api, name="lot_slots_api"),
+    # Live slot changes of a lot (Server-Sent Events, ASGI only)
+    path("api/lots/<int:lot_id>/events/", view_module.lot_slot_events, name="lot_events"),
 ]
 
 if settings.DEBUG:
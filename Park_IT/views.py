@@ -1,31 +1,56 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.views import View
-from django.views.decorators.http import require_POST
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from django.utils import timezone
 from django.urls import reverse
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.conf import settings
 from .forms import RegisterForm, LoginForm, ChangePasswordForm, AdminPasswordResetForm
 from utils import supabase
+from utils.concurrency import fan_out
+from utils.resilience import run_query, is_unavailable
+from utils.reference_cache import get_lots, get_lot, get_lot_names
+from utils.occupancy import engine as occupancy, FILLED_STATUSES, parking_of, set_slot_statuses, transition_slot
+from utils.provisioning import provision
+from utils.idempotency import idempotent_view
+from utils import attendant_sync, gate_events, history_outbox, metrics, profiling, slow_queries
+from utils import slot_events  # noqa: F401 - publishes engine changes to the live grids
+import hmac
+import logging
 import time
 from datetime import datetime, timedelta, timezone as dt_timezone
 from collections import defaultdict
 
-def fetch_parking_data():
+logger = logging.getLogger('parkit.views')
+# High-volume debug output of the dashboard (sampled, see settings.LOGGING)
+dashboard_logger = logging.getLogger('parkit.views.dashboard')
+
+# Available roles (only "user" and "admin") - fixed, so never queried or cached
+AVAILABLE_ROLES = (
+    {'role': 'user', 'role_name': 'User'},
+    {'role': 'admin', 'role_name': 'Admin'},
+)
+
+
+def fetch_parking_lots():
     try:
-        lots_resp = supabase.table('parking_lot').select('id, code, name, capacity').order('code').execute()
-        lots = lots_resp.data or []
+        # Lots change about once a semester - served from the reference cache
+        return get_lots()
     except Exception:
-        lots = []
+        return []
+
 
+def fetch_parking_slots():
     try:
         # Try to include extended columns; fall back to base columns if they don't exist yet
         try:
-            slots_resp = supabase.table('parking_slot').select(
+            slots_resp = run_query(supabase.table('parking_slot').select(
                 'id, lot_id, slot_number, status, license_plate, check_in_time'
-            ).execute()
+            ), 'slots.list')
         except Exception:
-            slots_resp = supabase.table('parking_slot').select('id, lot_id, slot_number, status').execute()
+            slots_resp = run_query(supabase.table('parking_slot').select('id, lot_id, slot_number, status'), 'slots.list')
         slots = slots_resp.data or []
         # Add default values for new columns if they don't exist in the response
         for slot in slots:
@@ -35,23 +60,33 @@ def fetch_parking_data():
                 slot['check_in_time'] = None
     except Exception:
         slots = []
+    return slots
 
-    return lots, slots
 
+def occupancy_grid(selected_lot_id=None):
+    """Slot grid of the selected lot, falling back to a full read if the engine can't load."""
+    lots = fetch_parking_lots()
+    try:
+        return build_occupancy_display(lots, selected_lot_id)
+    except Exception:
+        return build_lot_display(lots, fetch_parking_slots(), selected_lot_id)
 
-def build_lot_display(lots, slots, selected_lot_id=None):
-    slots_by_lot = defaultdict(list)
-    for slot in slots:
-        lot_id = slot.get('lot_id')
-        if lot_id is None:
-            continue
-        # Ensure lot_id is stored as int for consistent lookup
-        try:
-            lot_id = int(lot_id)
-        except (TypeError, ValueError):
-            pass
-        slots_by_lot[lot_id].append(slot)
 
+def fetch_parking_data():
+    # Lots and slots are independent - fetch them concurrently
+    results = fan_out(
+        {'lots': fetch_parking_lots, 'slots': fetch_parking_slots},
+        defaults={'lots': [], 'slots': []},
+    )
+    return results['lots'], results['slots']
+
+
+def resolve_lot_options(lots, selected_lot_id=None, lot_totals=None):
+    """Lot dropdown entries and the selected lot (first lot when none/unknown is selected).
+
+    lot_totals maps lot id -> slot count, used when a lot has no capacity set.
+    """
+    lot_totals = lot_totals or {}
     lot_options = []
     current_lot = None
 
@@ -72,7 +107,7 @@ def build_lot_display(lots, slots, selected_lot_id=None):
             'id': lot_id,
             'code': lot.get('code') or lot.get('name') or f'Lot {lot_id}',
             'name': lot.get('name') or lot.get('code') or 'Parking Lot',
-            'capacity': lot.get('capacity') or len(slots_by_lot.get(lot_id, [])),
+            'capacity': lot.get('capacity') or lot_totals.get(lot_id, 0),
         }
         entry['is_active'] = (selected_lot_id == lot_id)
         lot_options.append(entry)
@@ -85,7 +120,11 @@ def build_lot_display(lots, slots, selected_lot_id=None):
         selected_lot_id = current_lot['id']
         current_lot['is_active'] = True
 
-    current_slots_raw = slots_by_lot.get(selected_lot_id, [])
+    return lot_options, current_lot, selected_lot_id
+
+
+def build_slot_display(current_slots_raw):
+    """Grid entries and filled/available counts for one lot's slots."""
     # Sort numerically - convert slot_number to int for proper ordering
     def get_slot_sort_key(s):
         slot_num = s.get('slot_number')
@@ -95,7 +134,7 @@ def build_lot_display(lots, slots, selected_lot_id=None):
             return (False, int(slot_num))
         except (ValueError, TypeError):
             return (False, 0)
-    current_slots_raw.sort(key=get_slot_sort_key)
+    current_slots_raw = sorted(current_slots_raw, key=get_slot_sort_key)
 
     counts = {'available': 0, 'occupied': 0, 'reserved': 0, 'unavailable': 0}
     slots_display = []
@@ -121,21 +160,46 @@ def build_lot_display(lots, slots, selected_lot_id=None):
     available_count = counts.get('available', 0)
     filled_count = total_slots - available_count
 
+    return slots_display, filled_count, available_count
+
+
+def build_lot_display(lots, slots, selected_lot_id=None):
+    # Per-request rows: plain grouping; compact LotSnapshots are for the state the engine keeps
+    slots_by_lot = defaultdict(list)
+    for slot in slots:
+        lot_id = slot.get('lot_id')
+        if lot_id is None:
+            continue
+        # Ensure lot_id is stored as int for consistent lookup
+        try:
+            lot_id = int(lot_id)
+        except (TypeError, ValueError):
+            pass
+        slots_by_lot[lot_id].append(slot)
+
+    lot_options, current_lot, selected_lot_id = resolve_lot_options(
+        lots, selected_lot_id, {lot_id: len(lot_slots) for lot_id, lot_slots in slots_by_lot.items()}
+    )
+    slots_display, filled_count, available_count = build_slot_display(slots_by_lot.get(selected_lot_id, []))
     return lot_options, current_lot, slots_display, filled_count, available_count, selected_lot_id
 
 
-def summarize_lot_status(lots, slots):
-    lot_map = {lot['id']: lot for lot in lots if lot.get('id') is not None}
-    counts = defaultdict(lambda: {'occupied': 0, 'available': 0, 'total': 0})
-    overall_total = 0
-    overall_occupied = 0
+def build_occupancy_display(lots, selected_lot_id=None):
+    """build_lot_display() from the occupancy engine.
 
-    def pct(part, total):
-        try:
-            return round((part / total) * 100) if total else 0
-        except ZeroDivisionError:
-            return 0
+    Totals come from the per-lot aggregate; only the selected lot's slots are
+    read, after the default lot has been resolved from the cached lot list.
+    """
+    lot_counts = occupancy.lot_counts()
+    lot_options, current_lot, selected_lot_id = resolve_lot_options(
+        lots, selected_lot_id, {lot_id: counts['total'] for lot_id, counts in lot_counts.items()}
+    )
+    slots_display, filled_count, available_count = build_slot_display(occupancy.lot_slots(selected_lot_id))
+    return lot_options, current_lot, slots_display, filled_count, available_count, selected_lot_id
 
+
+def summarize_lot_status(lots, slots):
+    counts = defaultdict(lambda: {'occupied': 0, 'available': 0, 'total': 0})
     for slot in slots:
         lot_id = slot.get('lot_id')
         if lot_id is None:
@@ -143,14 +207,28 @@ def summarize_lot_status(lots, slots):
         status = (slot.get('status') or 'available').lower()
         counts[lot_id]['total'] += 1
         # Count occupied, reserved, unavailable all as "occupied" (filled)
-        if status in ('occupied', 'taken', 'full', 'in_use', 'busy', 'reserved', 'hold', 'pending', 'unavailable'):
+        if status in FILLED_STATUSES:
             counts[lot_id]['occupied'] += 1
         else:
             counts[lot_id]['available'] += 1
+    return summarize_lot_counts(lots, counts)
+
+
+def summarize_lot_counts(lots, counts):
+    """Occupancy bars per lot from {lot_id: {'occupied', 'available', 'total'}}."""
+    lot_map = {lot['id']: lot for lot in lots if lot.get('id') is not None}
+    overall_total = 0
+    overall_occupied = 0
+
+    def pct(part, total):
+        try:
+            return round((part / total) * 100) if total else 0
+        except ZeroDivisionError:
+            return 0
 
     lot_status = []
     for lot_id, lot in lot_map.items():
-        stats = counts.get(lot_id, {'occupied': 0, 'available': 0, 'total': 0})
+        stats = dict(counts.get(lot_id) or {'occupied': 0, 'available': 0, 'total': 0})
         total_slots = stats['total'] or lot.get('capacity') or 0
         occupied = stats['occupied']
 
@@ -178,6 +256,187 @@ def summarize_lot_status(lots, slots):
     overall_pct = pct(overall_occupied, overall_total)
     return lot_status, overall_pct
 
+
+def dashboard_window(local_now):
+    """Local-time bounds used by the admin dashboard queries."""
+    # Use local timezone for all date calculations
+    start_of_day = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_of_day = start_of_day + timedelta(days=1)
+
+    # Weekly Peak Parking Times - range is the last 7 days ending with TODAY (local date)
+    today_midnight = start_of_day
+    week_start_date = today_midnight - timedelta(days=6)  # 7 days ago at midnight
+    week_end_date = local_now  # Current local time (today)
+
+    # Convert week_start_date to UTC for comparison (Supabase stores in UTC)
+    # Query from 7 days ago at midnight (local time) converted to UTC
+    if week_start_date.tzinfo is None:
+        week_start_utc = week_start_date.replace(tzinfo=dt_timezone.utc)
+    else:
+        week_start_utc = week_start_date.astimezone(dt_timezone.utc)
+
+    # Also get end of today in UTC for the query range
+    end_of_today_local = local_now.replace(hour=23, minute=59, second=59, microsecond=999999)
+    if end_of_today_local.tzinfo is None:
+        end_of_today_utc = end_of_today_local.replace(tzinfo=dt_timezone.utc)
+    else:
+        end_of_today_utc = end_of_today_local.astimezone(dt_timezone.utc)
+
+    return {
+        'local_now': local_now,
+        'start_of_day': start_of_day,
+        'end_of_day': end_of_day,
+        'summary_date': local_now.strftime('%m/%d/%Y'),
+        'today_midnight': today_midnight,
+        'week_start_date': week_start_date,
+        'week_end_date': week_end_date,
+        'week_start_iso': week_start_utc.isoformat(),
+        'week_end_iso': end_of_today_utc.isoformat(),
+    }
+
+
+def weekly_peak_counts(entry_records):
+    """Entries per local date ('Dec 03') for the dashboard's weekly peak chart."""
+    peak_times_data = defaultdict(int)
+    for row in entry_records:
+        time_str = row.get('time')
+        if not time_str:
+            continue
+        try:
+            # Parse timestamptz from time column
+            # Handle both 'Z' and timezone offset formats
+            if time_str.endswith('Z'):
+                time_str_clean = time_str.replace('Z', '+00:00')
+            else:
+                time_str_clean = time_str
+            
+            entry_dt = datetime.fromisoformat(time_str_clean)
+            
+            # Ensure timezone-aware datetime
+            if entry_dt.tzinfo is None:
+                entry_dt = entry_dt.replace(tzinfo=dt_timezone.utc)
+            
+            # Convert to local timezone for date grouping
+            local_dt = entry_dt.astimezone(timezone.get_current_timezone())
+            
+            # Get date string in format "Dec 03" for the label
+            date_key = local_dt.strftime('%b %d')
+            # Count total entries for this date
+            peak_times_data[date_key] += 1
+        except Exception:
+            dashboard_logger.warning("Error parsing entries_exits time '%s'", time_str, exc_info=True)
+            continue
+    return peak_times_data
+
+
+def build_dashboard_context(user_data, role_name, window, lots, lot_counts, entry_rows, vehicle_map,
+                            weekly_records, weekly_error=None):
+    """Template context for dashboard.html from the already-fetched query results."""
+    import json
+
+    def parse_timestamp(ts_value):
+        if not ts_value:
+            return '—'
+        try:
+            ts_clean = ts_value.replace('Z', '+00:00')
+            dt_obj = datetime.fromisoformat(ts_clean)
+            if dt_obj.tzinfo is None:
+                dt_obj = dt_obj.replace(tzinfo=dt_timezone.utc)
+            local_dt = dt_obj.astimezone(timezone.get_current_timezone())
+            return local_dt.strftime('%H:%M')
+        except Exception:
+            return ts_value[:5]
+
+    lot_status, overall_occupancy_pct = summarize_lot_counts(lots, lot_counts)
+    lot_map = {lot['id']: lot for lot in lots if lot.get('id') is not None}
+
+    total_entries = 0
+    total_exits = 0
+    recent_activity = []
+
+    for row in entry_rows:
+        action = (row.get('action') or '').lower()
+        if action == 'entry' or action.startswith('enter'):
+            total_entries += 1
+        elif action == 'exit' or action.startswith('exit'):
+            total_exits += 1
+
+    for row in entry_rows[:6]:
+        action_raw = (row.get('action') or '—').title()
+        lot = lot_map.get(row.get('lot_id'))
+        zone = row.get('zone') or (lot.get('code') if lot else '—')
+        recent_activity.append({
+            'time': parse_timestamp(row.get('time')),
+            'plate': vehicle_map.get(row.get('vehicle_id'), '—'),
+            'action': action_raw,
+            'zone': zone,
+        })
+
+    # Weekly Peak Parking Times - Calculate total entries per actual date
+    # Entries from the last 7 days (one week) come from entries_exits
+    # Always use current local date - this ensures dashboard updates when date changes
+    local_now = window['local_now']
+    today_midnight = window['today_midnight']
+    week_start_date = window['week_start_date']
+    peak_times_data = {}  # date_string -> total count
+    week_period = f"{week_start_date.strftime('%m/%d/%Y')} - {window['week_end_date'].strftime('%m/%d/%Y')}"
+    
+    try:
+        dashboard_logger.debug(
+            'Weekly entries_exits range %s to %s (local: %s to %s)', window['week_start_iso'], window['week_end_iso'],
+            week_start_date.strftime('%Y-%m-%d'), local_now.strftime('%Y-%m-%d'),
+        )
+        if weekly_error is not None:
+            raise weekly_error
+        entry_records = weekly_records
+        
+        dashboard_logger.debug('Found %d entry records from entries_exits table for weekly peak', len(entry_records))
+        
+        # Count total entries per day of week using the time column (timestamptz)
+        peak_times_data = weekly_peak_counts(entry_records)
+        
+        dashboard_logger.debug('Peak times data (date -> count): %s', dict(peak_times_data))
+    except Exception:
+        dashboard_logger.exception('Error fetching weekly entries from entries_exits')
+    
+    # Generate labels and values for the last 7 days (actual dates)
+    # Use local timezone for date labels
+    peak_labels = []
+    peak_values = []
+    
+    # Create date range for last 7 days using local timezone
+    # Always generate labels for the last 7 days ending with TODAY
+    for i in range(7):
+        # Calculate date: 6 days ago, 5 days ago, ..., today
+        date = today_midnight - timedelta(days=(6 - i))
+        # Format as "Dec 04" etc.
+        date_label = date.strftime('%b %d')
+        peak_labels.append(date_label)
+        # Get count for this date, or 0 if no entries
+        count = peak_times_data.get(date_label, 0)
+        peak_values.append(count)
+    
+    dashboard_logger.debug('Peak labels: %s, peak values: %s', peak_labels, peak_values)
+
+    return {
+        'role': role_name,
+        'full_name': f"{user_data['first_name']} {user_data['last_name']}",
+        'first_name': user_data['first_name'],
+        'last_name': user_data['last_name'],
+        'email': user_data['email'],
+        'username': user_data['student_employee_id'],
+        'lot_status': lot_status,
+        'summary_date': window['summary_date'],
+        'total_entries': total_entries,
+        'total_exits': total_exits,
+        'overall_occupancy_pct': overall_occupancy_pct,
+        'recent_activity': recent_activity,
+        'peak_labels': json.dumps(peak_labels),
+        'peak_values': json.dumps(peak_values),
+        'week_period': week_period,
+    }
+
+
 class HomeView(View):
     def get(self, request):
         return render(request, 'home.html')
@@ -403,45 +662,50 @@ class DashboardView(View):
         # Get current time and convert to local timezone (GMT+8) for all date calculations
         now = timezone.now()  # This is UTC
         local_now = timezone.localtime(now)  # Convert to TIME_ZONE (GMT+8/Asia/Singapore)
-        # Use local timezone for all date calculations
-        start_of_day = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_of_day = start_of_day + timedelta(days=1)
-        summary_date = local_now.strftime('%m/%d/%Y')
+        window = dashboard_window(local_now)
         
-        print(f"DEBUG Dashboard: UTC time: {now}, Local time (GMT+8): {local_now}, Date: {summary_date}")
-
-        def parse_timestamp(ts_value):
-            if not ts_value:
-                return '—'
-            try:
-                ts_clean = ts_value.replace('Z', '+00:00')
-                dt_obj = datetime.fromisoformat(ts_clean)
-                if dt_obj.tzinfo is None:
-                    dt_obj = dt_obj.replace(tzinfo=dt_timezone.utc)
-                local_dt = dt_obj.astimezone(timezone.get_current_timezone())
-                return local_dt.strftime('%H:%M')
-            except Exception:
-                return ts_value[:5]
-
-        lots, slots = fetch_parking_data()
-        lot_status, overall_occupancy_pct = summarize_lot_status(lots, slots)
-        lot_map = {lot['id']: lot for lot in lots if lot.get('id') is not None}
+        dashboard_logger.debug('UTC time: %s, local time (GMT+8): %s, date: %s', now, local_now, window['summary_date'])
 
-        # Entries and exits for the day
-        try:
+        def load_today_entries():
+            # Entries and exits for the day
             entries_resp = (
                 supabase.table('entries_exits')
                 .select('id, time, vehicle_id, action, zone, lot_id')
-                .gte('time', start_of_day.isoformat())
-                .lt('time', end_of_day.isoformat())
+                .gte('time', window['start_of_day'].isoformat())
+                .lt('time', window['end_of_day'].isoformat())
                 .order('time', desc=True)
                 .limit(50)
                 .execute()
             )
-            entry_rows = entries_resp.data or []
-        except Exception:
-            entry_rows = []
+            return entries_resp.data or []
+
+        def load_weekly_entries():
+            # Get all entry records for the last week - filter by action='entry' directly in query
+            # Query from 7 days ago to end of today (in UTC)
+            weekly_entries_resp = (
+                supabase.table('entries_exits')
+                .select('time, action')
+                .eq('action', 'entry')  # Filter for entry actions only
+                .gte('time', window['week_start_iso'])
+                .lte('time', window['week_end_iso'])  # Up to end of today
+                .order('time')  # Ascending order (default)
+                .execute()
+            )
+            return weekly_entries_resp.data or []
+
+        # Lots, occupancy counts, today's entries and the weekly entries don't depend on each other,
+        # so the page waits for the slowest query instead of the sum of all four.
+        results = fan_out(
+            {
+                'lots': fetch_parking_lots,
+                'lot_counts': occupancy.lot_counts,
+                'entries': load_today_entries,
+                'weekly': load_weekly_entries,
+            },
+            defaults={'lots': [], 'lot_counts': {}, 'entries': [], 'weekly': []},
+        )
 
+        entry_rows = results['entries']
         vehicle_ids = {row.get('vehicle_id') for row in entry_rows if row.get('vehicle_id')}
         vehicle_map = {}
         if vehicle_ids:
@@ -456,158 +720,25 @@ class DashboardView(View):
             except Exception:
                 vehicle_map = {}
 
-        total_entries = 0
-        total_exits = 0
-        recent_activity = []
-
-        for row in entry_rows:
-            action = (row.get('action') or '').lower()
-            if action == 'entry' or action.startswith('enter'):
-                total_entries += 1
-            elif action == 'exit' or action.startswith('exit'):
-                total_exits += 1
-
-        for row in entry_rows[:6]:
-            action_raw = (row.get('action') or '—').title()
-            lot = lot_map.get(row.get('lot_id'))
-            zone = row.get('zone') or (lot.get('code') if lot else '—')
-            recent_activity.append({
-                'time': parse_timestamp(row.get('time')),
-                'plate': vehicle_map.get(row.get('vehicle_id'), '—'),
-                'action': action_raw,
-                'zone': zone,
-            })
-
-        # Weekly Peak Parking Times - Calculate total entries per actual date
-        # Get entries from the last 7 days (one week) from entries_exits table
-        # Always use current local date - this ensures dashboard updates when date changes
-        import json
-        # Use local_now that was already calculated above
-        # Calculate week range: last 7 days ending with TODAY (local date)
-        # Get today's date at midnight in local timezone
-        today_midnight = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_start_date = today_midnight - timedelta(days=6)  # 7 days ago at midnight
-        week_end_date = local_now  # Current local time (today)
-        
-        peak_times_data = defaultdict(int)  # date_string -> total count
-        week_period = f"{week_start_date.strftime('%m/%d/%Y')} - {week_end_date.strftime('%m/%d/%Y')}"
-        
-        try:
-            # Convert week_start_date to UTC for comparison (Supabase stores in UTC)
-            # Query from 7 days ago at midnight (local time) converted to UTC
-            if week_start_date.tzinfo is None:
-                week_start_utc = week_start_date.replace(tzinfo=dt_timezone.utc)
-            else:
-                week_start_utc = week_start_date.astimezone(dt_timezone.utc)
-            
-            # Also get end of today in UTC for the query range
-            end_of_today_local = local_now.replace(hour=23, minute=59, second=59, microsecond=999999)
-            if end_of_today_local.tzinfo is None:
-                end_of_today_utc = end_of_today_local.replace(tzinfo=dt_timezone.utc)
-            else:
-                end_of_today_utc = end_of_today_local.astimezone(dt_timezone.utc)
-            
-            week_start_iso = week_start_utc.isoformat()
-            week_end_iso = end_of_today_utc.isoformat()
-            print(f"DEBUG Dashboard: Querying entries_exits from {week_start_iso} to {week_end_iso} (local: {week_start_date.strftime('%Y-%m-%d')} to {local_now.strftime('%Y-%m-%d')})")
-            
-            # Get all entry records for the last week - filter by action='entry' directly in query
-            # Query from 7 days ago to end of today (in UTC)
-            weekly_entries_resp = (
-                supabase.table('entries_exits')
-                .select('time, action')
-                .eq('action', 'entry')  # Filter for entry actions only
-                .gte('time', week_start_iso)
-                .lte('time', week_end_iso)  # Up to end of today
-                .order('time')  # Ascending order (default)
-                .execute()
-            )
-            entry_records = weekly_entries_resp.data or []
-            
-            print(f"DEBUG Dashboard: Found {len(entry_records)} entry records from entries_exits table for weekly peak")
-            
-            # If no records in last 7 days, try getting all entries to test the query
-            if len(entry_records) == 0:
-                print("DEBUG Dashboard: No entries in last 7 days, checking if there are any entries at all...")
+        # If no records in last 7 days, try getting all entries to test the query (debug only: an extra round trip)
+        if 'weekly' not in results.errors and not results['weekly'] and dashboard_logger.isEnabledFor(logging.DEBUG):
+            try:
                 all_entries_test = supabase.table('entries_exits').select('time, action').eq('action', 'entry').limit(10).execute()
-                print(f"DEBUG Dashboard: Total entries in table (sample): {len(all_entries_test.data or [])}")
-            
-            # Count total entries per day of week using the time column (timestamptz)
-            for row in entry_records:
-                time_str = row.get('time')
-                if not time_str:
-                    continue
-                try:
-                    # Parse timestamptz from time column
-                    # Handle both 'Z' and timezone offset formats
-                    if time_str.endswith('Z'):
-                        time_str_clean = time_str.replace('Z', '+00:00')
-                    else:
-                        time_str_clean = time_str
-                    
-                    entry_dt = datetime.fromisoformat(time_str_clean)
-                    
-                    # Ensure timezone-aware datetime
-                    if entry_dt.tzinfo is None:
-                        entry_dt = entry_dt.replace(tzinfo=dt_timezone.utc)
-                    
-                    # Convert to local timezone for date grouping
-                    local_dt = entry_dt.astimezone(timezone.get_current_timezone())
-                    
-                    # Get date string in format "Dec 03" for the label
-                    date_key = local_dt.strftime('%b %d')
-                    # Count total entries for this date
-                    peak_times_data[date_key] += 1
-                    print(f"DEBUG Dashboard: Entry on date {date_key} (time: {time_str})")
-                except Exception as e:
-                    print(f"DEBUG Dashboard: Error parsing time '{time_str}': {e}")
-                    import traceback
-                    print(traceback.format_exc())
-                    continue
-            
-            print(f"DEBUG Dashboard: Peak times data (date -> count): {dict(peak_times_data)}")
-        except Exception as e:
-            print(f"DEBUG Dashboard: Error fetching weekly entries from entries_exits: {e}")
-            import traceback
-            print(traceback.format_exc())
-        
-        # Generate labels and values for the last 7 days (actual dates)
-        # Use local timezone for date labels
-        peak_labels = []
-        peak_values = []
-        
-        # Create date range for last 7 days using local timezone
-        # Always generate labels for the last 7 days ending with TODAY
-        for i in range(7):
-            # Calculate date: 6 days ago, 5 days ago, ..., today
-            date = today_midnight - timedelta(days=(6 - i))
-            # Format as "Dec 04" etc.
-            date_label = date.strftime('%b %d')
-            peak_labels.append(date_label)
-            # Get count for this date, or 0 if no entries
-            count = peak_times_data.get(date_label, 0)
-            peak_values.append(count)
-            print(f"DEBUG Dashboard: {date_label}: {count} entries (date: {date.strftime('%Y-%m-%d')})")
-        
-        print(f"DEBUG Dashboard: Final - Peak labels: {peak_labels}, Peak values: {peak_values}")
+                dashboard_logger.debug(
+                    'No entries in last 7 days; entries in table (sample): %d', len(all_entries_test.data or [])
+                )
+            except Exception:
+                pass
 
-        context = {
-            'role': role_name,
-            'full_name': f"{user_data['first_name']} {user_data['last_name']}",
-            'first_name': user_data['first_name'],
-            'last_name': user_data['last_name'],
-            'email': user_data['email'],
-            'username': user_data['student_employee_id'],
-            'lot_status': lot_status,
-            'summary_date': summary_date,
-            'total_entries': total_entries,
-            'total_exits': total_exits,
-            'overall_occupancy_pct': overall_occupancy_pct,
-            'recent_activity': recent_activity,
-            'peak_labels': json.dumps(peak_labels),
-            'peak_values': json.dumps(peak_values),
-            'week_period': week_period,
-        }
+        context = build_dashboard_context(
+            user_data, role_name, window,
+            lots=results['lots'],
+            lot_counts=results['lot_counts'],
+            entry_rows=entry_rows,
+            vehicle_map=vehicle_map,
+            weekly_records=results['weekly'],
+            weekly_error=results.errors.get('weekly'),
+        )
         return render(request, 'dashboard.html', context)
 
 class UserDashboardView(View):
@@ -641,8 +772,11 @@ class UserDashboardView(View):
             messages.error(request, f'Error loading dashboard: {str(e)}')
             return redirect('home')
 
-        lots, slots = fetch_parking_data()
-        lot_status, overall_occupancy_pct = summarize_lot_status(lots, slots)
+        try:
+            lot_counts = occupancy.lot_counts()
+        except Exception:
+            lot_counts = {}
+        lot_status, overall_occupancy_pct = summarize_lot_counts(fetch_parking_lots(), lot_counts)
         summary_date = timezone.now().strftime('%m/%d/%Y')
         recommended_lot = next((lot for lot in lot_status if lot['occupancy_percent'] < 85), lot_status[0] if lot_status else None)
 
@@ -862,66 +996,24 @@ class ParkingSpacesView(View):
         return 'reserved'
 
     def _seed_default_layout(self):
-        layout = self.DEFAULT_LAYOUT
+        # Create the missing lots/slots of DEFAULT_LAYOUT (existing ones are left as they are)
+        lots = [
+            {
+                'code': code,
+                'name': config.get('name', code),
+                'capacity': config.get('capacity', len(config.get('slots', []))),
+                'slots': {
+                    slot.get('slot_number'): self._derive_seed_status(slot.get('left'), slot.get('right'))
+                    for slot in config.get('slots', [])
+                },
+            }
+            for code, config in self.DEFAULT_LAYOUT.items()
+        ]
         try:
-            lots_resp = supabase.table('parking_lot').select('id, code').execute()
-            existing_lots = {lot['code']: lot for lot in (lots_resp.data or []) if lot.get('code')}
+            plan, _, _ = provision(lots)
         except Exception:
             return False
-
-        created_any = False
-
-        for code, config in layout.items():
-            lot_entry = existing_lots.get(code)
-            if not lot_entry:
-                try:
-                    insert_resp = supabase.table('parking_lot').insert({
-                        'code': code,
-                        'name': config.get('name', code),
-                        'capacity': config.get('capacity', len(config.get('slots', []))),
-                    }).execute()
-                except Exception:
-                    continue
-                if not insert_resp.data:
-                    continue
-                lot_entry = insert_resp.data[0]
-                existing_lots[code] = lot_entry
-                created_any = True
-
-            lot_id = lot_entry.get('id')
-            if lot_id is None:
-                continue
-
-            try:
-                slots_resp = supabase.table('parking_slot').select('slot_number').eq('lot_id', lot_id).execute()
-                existing_numbers = {
-                    row['slot_number']
-                    for row in (slots_resp.data or [])
-                    if row.get('slot_number') is not None
-                }
-            except Exception:
-                existing_numbers = set()
-
-            new_slots = []
-            for slot in config.get('slots', []):
-                num = slot.get('slot_number')
-                if num in existing_numbers:
-                    continue
-                status = self._derive_seed_status(slot.get('left'), slot.get('right'))
-                new_slots.append({
-                    'lot_id': lot_id,
-                    'slot_number': num,
-                    'status': status,
-                })
-
-            if new_slots:
-                try:
-                    supabase.table('parking_slot').insert(new_slots).execute()
-                    created_any = True
-                except Exception:
-                    pass
-
-        return created_any
+        return bool(plan.new_lots or plan.new_slots)
 
     def get(self, request):
         if 'access_token' not in request.session:
@@ -956,11 +1048,9 @@ class ParkingSpacesView(View):
             messages.error(request, 'Access denied. Admins only.')
             return redirect('user_dashboard')
 
-        lots, all_slots = fetch_parking_data()
         # Use only existing slots from database - do not auto-create
-
-        lot_options, current_lot, slots_display, filled_count, available_count, selected_lot_id = build_lot_display(
-            lots, all_slots, request.GET.get('lot')
+        lot_options, current_lot, slots_display, filled_count, available_count, selected_lot_id = occupancy_grid(
+            request.GET.get('lot')
         )
 
         context = {
@@ -1010,9 +1100,8 @@ class UserParkingSpacesView(View):
         if role_name == 'admin':
             return redirect('parking_spaces')
 
-        lots, slots = fetch_parking_data()
-        lot_options, current_lot, slots_display, filled_count, available_count, selected_lot_id = build_lot_display(
-            lots, slots, request.GET.get('lot')
+        lot_options, current_lot, slots_display, filled_count, available_count, selected_lot_id = occupancy_grid(
+            request.GET.get('lot')
         )
 
         context = {
@@ -1194,11 +1283,7 @@ class EditUserView(View):
 
         target = user_resp.data[0]
 
-        # Available roles (only "user" and "admin")
-        roles = [
-            {'role': 'user', 'role_name': 'User'},
-            {'role': 'admin', 'role_name': 'Admin'}
-        ]
+        roles = list(AVAILABLE_ROLES)
 
         return target, roles
 
@@ -1342,11 +1427,7 @@ class AddUserView(View):
     """Create a new user account (admin only)."""
 
     def _load_roles(self):
-        # Available roles (only "user" and "admin")
-        return [
-            {'role': 'user', 'role_name': 'User'},
-            {'role': 'admin', 'role_name': 'Admin'}
-        ]
+        return list(AVAILABLE_ROLES)
 
     def _render_form(self, request, template_user, role_name, roles, form_values=None):
         form_values = form_values or {}
@@ -1599,6 +1680,7 @@ def update_parking_slot_status(request, slot_id):
     else:
         try:
             supabase.table('parking_slot').update({'status': status}).eq('id', slot_id).execute()
+            occupancy.set_status(slot_id, status, redirect_lot)
             messages.success(request, 'Parking slot updated.')
         except Exception as e:
             messages.error(request, f'Failed to update slot: {str(e)}')
@@ -1609,56 +1691,379 @@ def update_parking_slot_status(request, slot_id):
     return redirect(redirect_url)
 
 
-class AdminParkingHistoryView(View):
-    """Admin view for parking history with search, filter, and pagination"""
-    def get(self, request):
-        if 'access_token' not in request.session:
-            messages.error(request, 'Please log in first.')
-            return redirect('login')
-
-        try:
-            user_id = request.session.get('user_id')
-            user_response = supabase.table('users').select('first_name, last_name, email, student_employee_id, role').eq('id', user_id).execute()
-
-            if not user_response.data:
-                messages.error(request, 'User not found.')
-                return redirect('home')
+SLOT_STATUSES = ('available', 'occupied', 'reserved', 'unavailable')
+# 'occupied' needs a plate and check-in time, so only check-in sets it
+BULK_STATUSES = ('available', 'reserved', 'unavailable')
+BULK_STATUS_LIMIT = 500
 
-            user_data = user_response.data[0]
-            # Normalize role: convert to lowercase, handle NULL/empty, default to 'user'
-            raw_role = user_data.get('role') or 'user'
-            role_name = str(raw_role).strip().lower() if raw_role else 'user'
-            if role_name not in ['admin', 'user']:
-                role_name = 'user'
-        except ValueError:
-            messages.error(request, 'Server configuration error. Please contact administrator.')
-            return redirect('home')
-        except Exception as e:
-            messages.error(request, f'Database error: {str(e)}')
-            return redirect('home')
 
-        # Only allow admins to access this page
-        if role_name != 'admin':
-            messages.error(request, 'Access denied. Admins only.')
-            return redirect('user_dashboard')
+def _bulk_status_changes(data):
+    """Requested {slot_id: status} and the lot of a range, from a bulk-status body."""
+    requested = {}
+    errors = []
+    for index, change in enumerate(data.get('changes') or []):
+        try:
+            slot_id = int(change.get('slot_id'))
+        except (AttributeError, TypeError, ValueError):
+            errors.append(f'changes[{index}]: slot_id must be an integer')
+            continue
+        status = str(change.get('status') or '').strip().lower()
+        if status not in BULK_STATUSES:
+            errors.append(f'changes[{index}]: invalid status "{change.get("status")}"')
+        elif requested.get(slot_id, status) != status:
+            errors.append(f'changes[{index}]: slot {slot_id} is given two different statuses')
+        else:
+            requested[slot_id] = status
 
-        # Fetch parking lots for the filter dropdown
+    slot_range = None
+    if data.get('range') is not None:
+        spec = data['range']
         try:
-            lots_resp = supabase.table('parking_lot').select('name').order('name').execute()
-            parking_lots = [lot.get('name') for lot in (lots_resp.data or []) if lot.get('name')]
-        except Exception:
-            parking_lots = []
+            slot_range = (int(spec['lot_id']), int(spec['from']), int(spec['to']))
+        except (TypeError, KeyError, ValueError):
+            errors.append('range: lot_id, from and to must be integers')
+        else:
+            range_status = str(spec.get('status') or '').strip().lower()
+            if range_status not in BULK_STATUSES:
+                errors.append(f'range: invalid status "{spec.get("status")}"')
+            elif slot_range[1] > slot_range[2]:
+                errors.append('range: from must not be greater than to')
+            slot_range += (range_status,)
+    return requested, slot_range, errors
 
-        context = {
-            'role': role_name,
-            'full_name': f"{user_data['first_name']} {user_data['last_name']}",
-            'first_name': user_data['first_name'],
-            'last_name': user_data['last_name'],
-            'email': user_data['email'],
-            'username': user_data['student_employee_id'],
-            'parking_lots': parking_lots,
-        }
-        return render(request, 'admin_parking_history.html', context)
+
+@require_POST
+def bulk_update_slot_status(request):
+    """
+    API Endpoint: POST /api/parking-slots/bulk-status/ - set the status of many slots.
+
+    Body (JSON), either or both of:
+        {"changes": [{"slot_id": 12, "status": "unavailable"}, ...],
+         "range": {"lot_id": 3, "from": 1, "to": 24, "status": "unavailable"}}
+
+    The whole request is validated first and applied in one statement; on any
+    error nothing is changed. Statuses are available, reserved or unavailable;
+    occupied slots are left alone (kept_occupied), as provisioning does, since
+    check-out is what frees them. A slot whose status changed after it was read
+    is not updated either and is listed in conflicts. Returns the updated count
+    and the new counts of the affected lots.
+    """
+    if 'access_token' not in request.session:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    try:
+        user_id = request.session.get('user_id')
+        user_resp = supabase.table('users').select('role').eq('id', user_id).execute()
+        if not user_resp.data:
+            return JsonResponse({'error': 'User not found'}, status=404)
+        raw_role = user_resp.data[0].get('role') or 'user'
+        if str(raw_role).strip().lower() != 'admin':
+            return JsonResponse({'error': 'Admin privileges required'}, status=403)
+    except Exception as e:
+        return JsonResponse({'error': f'Authentication error: {str(e)}'}, status=500)
+
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    requested, slot_range, errors = _bulk_status_changes(data)
+    if errors:
+        return JsonResponse({'error': 'Invalid changes', 'details': errors}, status=400)
+    if not requested and slot_range is None:
+        return JsonResponse({'error': 'No changes given'}, status=400)
+    if len(requested) > BULK_STATUS_LIMIT:
+        return JsonResponse({'error': f'At most {BULK_STATUS_LIMIT} slots per request'}, status=400)
+
+    try:
+        slots = {}
+        if requested:
+            slot_resp = run_query(supabase.table('parking_slot').select(
+                'id, lot_id, slot_number, status'
+            ).in_('id', list(requested)), 'slots.bulk_lookup')
+            slots.update((row['id'], row) for row in slot_resp.data or [])
+            missing = sorted(set(requested) - set(slots))
+            if missing:
+                return JsonResponse({'error': 'Slots not found', 'slot_ids': missing}, status=404)
+        if slot_range is not None:
+            lot_id, first, last, range_status = slot_range
+            range_resp = run_query(supabase.table('parking_slot').select(
+                'id, lot_id, slot_number, status'
+            ).eq('lot_id', lot_id).gte('slot_number', first).lte('slot_number', last), 'slots.bulk_lookup')
+            for row in range_resp.data or []:
+                if requested.get(row['id'], range_status) != range_status:
+                    return JsonResponse({
+                        'error': f"Slot {row['id']} is given two different statuses",
+                    }, status=400)
+                requested[row['id']] = range_status
+                slots[row['id']] = row
+
+        if len(requested) > BULK_STATUS_LIMIT:
+            return JsonResponse({'error': f'At most {BULK_STATUS_LIMIT} slots per request'}, status=400)
+
+        kept_occupied = sorted(
+            slot_id for slot_id in requested if (slots[slot_id].get('status') or '').lower() == 'occupied'
+        )
+        changes = [
+            {'id': slot_id, 'status': status, 'expected': slots[slot_id].get('status')}
+            for slot_id, status in requested.items()
+            if (slots[slot_id].get('status') or 'available').lower() not in (status, 'occupied')
+        ]
+        # Only where the status is still the one read above
+        updated = set_slot_statuses(changes) if changes else set()
+        for change in changes:
+            if change['id'] in updated:
+                occupancy.set_status(change['id'], change['status'], slots[change['id']].get('lot_id'))
+
+        lot_ids = {row.get('lot_id') for row in slots.values()}
+        lot_counts = occupancy.lot_counts()
+        return JsonResponse({
+            'success': True,
+            'updated': len(updated),
+            'unchanged': len(requested) - len(changes) - len(kept_occupied),
+            'kept_occupied': kept_occupied,
+            'conflicts': sorted(change['id'] for change in changes if change['id'] not in updated),
+            'counts': {
+                str(lot_id): lot_counts.get(lot_id, {'total': 0, 'occupied': 0, 'available': 0})
+                for lot_id in lot_ids if lot_id is not None
+            },
+        })
+    except Exception as e:
+        if is_unavailable(e):
+            return JsonResponse({'error': 'The parking database is temporarily unavailable.', 'retryable': True}, status=503)
+        return JsonResponse({'error': f'Failed to update slots: {str(e)}'}, status=500)
+
+
+
+def _bearer_token_valid(request, expected, fallback_header=None):
+    if not expected:
+        return False
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if header.startswith('Bearer '):
+        given = header[len('Bearer '):]
+    else:
+        given = request.META.get(fallback_header, '') if fallback_header else ''
+    return hmac.compare_digest(given.encode(), expected.encode())
+
+
+def _gate_key_valid(request):
+    return _bearer_token_valid(request, getattr(settings, 'GATE_API_KEY', None), 'HTTP_X_GATE_KEY')
+
+
+@csrf_exempt
+@require_POST
+@idempotent_view('gate_events')
+def ingest_gate_events(request):
+    """
+    API Endpoint: POST /api/gate-events/ - batched plate reads from the gate cameras.
+
+    Authenticated with settings.GATE_API_KEY (Authorization: Bearer <key> or
+    X-Gate-Key); no session or CSRF token. Body (JSON), a list or {"events": [...]}:
+        [{"plate": "ABC1234", "lot_code": "NGE", "slot": 12, "action": "entry",
+          "timestamp": "2025-05-01T08:00:03Z"}, ...]
+
+    slot is optional. Invalid events are reported by index and the rest are
+    applied; see utils/gate_events.py for deduplication and conflicts.
+    """
+    if not _gate_key_valid(request):
+        return JsonResponse({'error': 'A valid gate API key is required'}, status=401)
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    events = data.get('events') if isinstance(data, dict) else data
+    if not isinstance(events, list) or not events:
+        return JsonResponse({'error': 'Expected a non-empty list of events'}, status=400)
+    if len(events) > gate_events.MAX_EVENTS:
+        return JsonResponse({'error': f'At most {gate_events.MAX_EVENTS} events per request'}, status=400)
+
+    try:
+        summary = gate_events.ingest(events)
+    except Exception as e:
+        if is_unavailable(e):
+            return JsonResponse({'error': 'The parking database is temporarily unavailable.', 'retryable': True}, status=503)
+        return JsonResponse({'error': f'Failed to ingest gate events: {str(e)}'}, status=500)
+    return JsonResponse(dict(summary, success=True))
+
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint: GET /metrics, with Authorization: Bearer <settings.METRICS_TOKEN>.
+
+    Request latency per URL name, Supabase calls per table/operation, cache
+    lookups and check-in/out outcomes, summed over all workers (utils/metrics.py).
+    """
+    if not getattr(settings, 'METRICS_TOKEN', None):
+        return HttpResponse(status=404)
+    if not _bearer_token_valid(request, settings.METRICS_TOKEN):
+        return HttpResponse(status=401)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+
+def _admin_api_error(request):
+    """JSON error response unless the session belongs to an admin; None for admins."""
+    if 'access_token' not in request.session:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    try:
+        user_response = run_query(
+            supabase.table('users').select('role').eq('id', request.session.get('user_id')), 'users.role'
+        )
+    except Exception as e:
+        if is_unavailable(e):
+            return JsonResponse({'error': 'The parking database is temporarily unavailable.', 'retryable': True}, status=503)
+        return JsonResponse({'error': f'Database error: {str(e)}'}, status=500)
+    if not user_response.data:
+        return JsonResponse({'error': 'User not found'}, status=404)
+    if str(user_response.data[0].get('role') or '').strip().lower() != 'admin':
+        return JsonResponse({'error': 'Admin access required'}, status=403)
+    return None
+
+
+@require_GET
+def profile_link_api(request):
+    """
+    API Endpoint: GET /api/admin/profile-link/?path=/admin/reports/&mode=sample|cprofile&download=1
+
+    Admin-only. Returns a signed link to `path` that runs that one request under
+    the profiler (Park_IT.middleware.ProfilingMiddleware, utils/profiling.py).
+    """
+    error = _admin_api_error(request)
+    if error is not None:
+        return error
+
+    user_id = request.session.get('user_id')
+    path = request.GET.get('path') or reverse('advanced_reports')
+    if not path.startswith('/') or path.startswith('//'):
+        return JsonResponse({'error': 'path must be a path on this site'}, status=400)
+    mode = request.GET.get('mode') or 'sample'
+    if mode not in profiling.MODES:
+        return JsonResponse({'error': f'mode must be one of {", ".join(profiling.MODES)}'}, status=400)
+    link = profiling.profile_link(path, user_id, mode, download=request.GET.get('download') == '1')
+    return JsonResponse({
+        'success': True,
+        'url': link,
+        'expires_in': settings.PROFILE_TOKEN_MAX_AGE,
+    })
+
+
+@require_GET
+def slow_queries_api(request):
+    """
+    API Endpoint: GET /api/admin/slow-queries/?top=20
+
+    Admin-only. The call sites with the most time spent in Supabase calls slower
+    than settings.SLOW_QUERY_MS over the last SLOW_QUERY_WINDOW_SECONDS, in the
+    worker that answers (utils/slow_queries.py).
+    """
+    error = _admin_api_error(request)
+    if error is not None:
+        return error
+    try:
+        top = max(1, min(int(request.GET.get('top', 20)), 200))
+    except ValueError:
+        return JsonResponse({'error': 'top must be an integer'}, status=400)
+    return JsonResponse(dict(slow_queries.report(top), success=True))
+
+
+
+@require_POST
+def sync_attendant_actions(request):
+    """
+    API Endpoint: POST /api/parking-slots/sync/ - check-ins/outs queued offline.
+
+    Body (JSON): {"actions": [{"id": "<client uuid>", "action": "check_in" | "check_out",
+    "slot_id": 12, "license_plate": "ABC1234", "timestamp": "<ISO 8601>"}, ...]}
+
+    Applied in timestamp order against the current slot state; returns one
+    outcome per action (applied / conflict / rejected). See utils/attendant_sync.py.
+    """
+    if 'access_token' not in request.session:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    actions = data.get('actions') if isinstance(data, dict) else None
+    if not isinstance(actions, list) or not actions:
+        return JsonResponse({'error': 'Expected a non-empty "actions" list'}, status=400)
+    if len(actions) > attendant_sync.MAX_ACTIONS:
+        return JsonResponse({'error': f'At most {attendant_sync.MAX_ACTIONS} actions per request'}, status=400)
+
+    try:
+        results = attendant_sync.apply_actions(actions, owner=request.session.get('user_id'))
+    except Exception as e:
+        if is_unavailable(e):
+            return JsonResponse({'error': 'The parking database is temporarily unavailable.', 'retryable': True}, status=503)
+        return JsonResponse({'error': f'Failed to sync actions: {str(e)}'}, status=500)
+
+    totals = defaultdict(int)
+    for result in results:
+        totals[result['status']] += 1
+    return JsonResponse({
+        'success': True,
+        'results': results,
+        'applied': totals['applied'],
+        'conflicts': totals['conflict'],
+        'rejected': totals['rejected'],
+    })
+
+
+class AdminParkingHistoryView(View):
+    """Admin view for parking history with search, filter, and pagination"""
+    def get(self, request):
+        if 'access_token' not in request.session:
+            messages.error(request, 'Please log in first.')
+            return redirect('login')
+
+        try:
+            user_id = request.session.get('user_id')
+            user_response = supabase.table('users').select('first_name, last_name, email, student_employee_id, role').eq('id', user_id).execute()
+
+            if not user_response.data:
+                messages.error(request, 'User not found.')
+                return redirect('home')
+
+            user_data = user_response.data[0]
+            # Normalize role: convert to lowercase, handle NULL/empty, default to 'user'
+            raw_role = user_data.get('role') or 'user'
+            role_name = str(raw_role).strip().lower() if raw_role else 'user'
+            if role_name not in ['admin', 'user']:
+                role_name = 'user'
+        except ValueError:
+            messages.error(request, 'Server configuration error. Please contact administrator.')
+            return redirect('home')
+        except Exception as e:
+            messages.error(request, f'Database error: {str(e)}')
+            return redirect('home')
+
+        # Only allow admins to access this page
+        if role_name != 'admin':
+            messages.error(request, 'Access denied. Admins only.')
+            return redirect('user_dashboard')
+
+        # Fetch parking lots for the filter dropdown
+        try:
+            parking_lots = sorted(lot.get('name') for lot in get_lots() if lot.get('name'))
+        except Exception:
+            parking_lots = []
+
+        context = {
+            'role': role_name,
+            'full_name': f"{user_data['first_name']} {user_data['last_name']}",
+            'first_name': user_data['first_name'],
+            'last_name': user_data['last_name'],
+            'email': user_data['email'],
+            'username': user_data['student_employee_id'],
+            'parking_lots': parking_lots,
+        }
+        return render(request, 'admin_parking_history.html', context)
 
 
 def calculate_duration(entry_time, exit_time):
@@ -1686,6 +2091,86 @@ def calculate_duration(entry_time, exit_time):
         return '0h 0m'
 
 
+def history_query_params(request):
+    """Filters and pagination of the parking history API (see parking_history_api)."""
+    return {
+        'search_plate': request.GET.get('search_plate', '').strip(),
+        'date_from': request.GET.get('date_from', '').strip(),
+        'date_to': request.GET.get('date_to', '').strip(),
+        'lot_name': request.GET.get('lot_name', '').strip(),
+        'status': request.GET.get('status', '').strip(),
+        'page': int(request.GET.get('page', 1)),
+        'page_size': min(int(request.GET.get('page_size', 10)), 100),
+    }
+
+
+def history_lots_map(lot_names, lot_name=''):
+    """{lot id: name} of the entries' lots, narrowed to the lot_name filter if given."""
+    if not lot_name:
+        return lot_names
+    return {lot_id: name for lot_id, name in lot_names.items() if name == lot_name}
+
+
+def history_candidates(entry_records, vehicles_map, lots_map):
+    """Entries whose vehicle and lot passed the plate / lot name filters."""
+    return [
+        entry for entry in entry_records
+        if entry.get('vehicle_id') in vehicles_map and entry.get('lot_id') in lots_map
+    ]
+
+
+def build_history_page(entry_records, vehicles_map, lots_map, exit_times, params):
+    """Match entries with their exit times, apply the status filter and paginate."""
+    status_filter = params['status']
+    page, page_size = params['page'], params['page_size']
+
+    # Build sessions by matching entries with exits
+    sessions = []
+    
+    for entry in history_candidates(entry_records, vehicles_map, lots_map):
+        entry_time = entry.get('time')
+        exit_time = exit_times.get(entry.get('id'))
+        
+        # Determine status - "Incomplete" for sessions without exit, "Completed" for sessions with exit
+        session_status = 'Incomplete' if exit_time is None else 'Completed'
+        
+        # Apply status filter (handle both old "Active" and new "Incomplete" for backward compatibility)
+        if status_filter:
+            if status_filter == 'Active':
+                # Map old "Active" filter to "Incomplete"
+                if session_status != 'Incomplete':
+                    continue
+            elif session_status != status_filter:
+                continue
+        
+        sessions.append({
+            'session_id': entry.get('id'),
+            'plate_number': vehicles_map[entry.get('vehicle_id')],
+            'lot_name': lots_map.get(entry.get('lot_id'), ''),
+            'entry_time': entry_time,
+            'exit_time': exit_time,
+            'duration': calculate_duration(entry_time, exit_time),
+            'status': session_status
+        })
+    
+    # Sort sessions by entry_time (most recent first)
+    sessions.sort(key=lambda x: x['entry_time'] or '', reverse=True)
+    
+    # Pagination
+    total_count = len(sessions)
+    total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 0
+    start_index = (page - 1) * page_size
+    end_index = start_index + page_size
+    
+    return {
+        'results': sessions[start_index:end_index],
+        'count': total_count,
+        'page': page,
+        'page_size': page_size,
+        'total_pages': total_pages
+    }
+
+
 def parking_history_api(request):
     """
     API Endpoint: GET /api/admin/parking/history/
@@ -1724,14 +2209,8 @@ def parking_history_api(request):
     except Exception as e:
         return JsonResponse({'error': f'Authentication error: {str(e)}'}, status=500)
     
-    # Get query parameters
-    search_plate = request.GET.get('search_plate', '').strip()
-    date_from = request.GET.get('date_from', '').strip()
-    date_to = request.GET.get('date_to', '').strip()
-    lot_name = request.GET.get('lot_name', '').strip()
-    status_filter = request.GET.get('status', '').strip()
-    page = int(request.GET.get('page', 1))
-    page_size = min(int(request.GET.get('page_size', 10)), 100)
+    params = history_query_params(request)
+    page, page_size = params['page'], params['page_size']
     
     try:
         # Build base query for entries
@@ -1740,10 +2219,10 @@ def parking_history_api(request):
         ).eq('action', 'entry').order('time', desc=True)
         
         # Apply date filters
-        if date_from:
-            entries_query = entries_query.gte('time', f'{date_from}T00:00:00')
-        if date_to:
-            entries_query = entries_query.lte('time', f'{date_to}T23:59:59')
+        if params['date_from']:
+            entries_query = entries_query.gte('time', f"{params['date_from']}T00:00:00")
+        if params['date_to']:
+            entries_query = entries_query.lte('time', f"{params['date_to']}T23:59:59")
         
         # Get all entry records
         entries_response = entries_query.execute()
@@ -1766,96 +2245,31 @@ def parking_history_api(request):
         vehicles_query = supabase.table('vehicle').select('id, plate')
         if vehicle_ids:
             vehicles_query = vehicles_query.in_('id', vehicle_ids)
-        if search_plate:
+        if params['search_plate']:
             # Use ILIKE for case-insensitive partial match
-            vehicles_query = vehicles_query.ilike('plate', f'%{search_plate}%')
+            vehicles_query = vehicles_query.ilike('plate', f"%{params['search_plate']}%")
         
         vehicles_response = vehicles_query.execute()
         vehicles_map = {v['id']: v.get('plate', '') for v in (vehicles_response.data or [])}
         
         # Filter by lot name if provided
-        lots_query = supabase.table('parking_lot').select('id, name')
-        if lot_ids:
-            lots_query = lots_query.in_('id', lot_ids)
-        if lot_name:
-            lots_query = lots_query.eq('name', lot_name)
-        
-        lots_response = lots_query.execute()
-        lots_map = {l['id']: l.get('name', '') for l in (lots_response.data or [])}
-        valid_lot_ids = set(lots_map.keys())
+        lots_map = history_lots_map(get_lot_names(lot_ids or None), params['lot_name'])
         
-        # Build sessions by matching entries with exits
-        sessions = []
-        
-        for entry in entry_records:
-            vehicle_id = entry.get('vehicle_id')
-            lot_id = entry.get('lot_id')
-            entry_time = entry.get('time')
-            
-            # Skip if vehicle or lot doesn't match filters
-            if vehicle_id not in vehicles_map:
-                continue
-            if lot_id not in valid_lot_ids:
-                continue
-            
-            plate_number = vehicles_map[vehicle_id]
-            lot_name_value = lots_map.get(lot_id, '')
-            
-            # Find corresponding exit record
-            exit_time = None
+        # Find the corresponding exit record of every entry that passed the filters
+        exit_times = {}
+        for entry in history_candidates(entry_records, vehicles_map, lots_map):
             try:
                 exit_query = supabase.table('entries_exits').select('time').eq(
-                    'vehicle_id', vehicle_id
-                ).eq('action', 'exit').gte('time', entry_time).order('time', desc=True).limit(1)
+                    'vehicle_id', entry.get('vehicle_id')
+                ).eq('action', 'exit').gte('time', entry.get('time')).order('time', desc=True).limit(1)
                 
                 exit_response = exit_query.execute()
                 if exit_response.data:
-                    exit_time = exit_response.data[0].get('time')
+                    exit_times[entry.get('id')] = exit_response.data[0].get('time')
             except Exception:
                 pass
-            
-            # Determine status - "Incomplete" for sessions without exit, "Completed" for sessions with exit
-            session_status = 'Incomplete' if exit_time is None else 'Completed'
-            
-            # Apply status filter (handle both old "Active" and new "Incomplete" for backward compatibility)
-            if status_filter:
-                if status_filter == 'Active':
-                    # Map old "Active" filter to "Incomplete"
-                    if session_status != 'Incomplete':
-                        continue
-                elif session_status != status_filter:
-                    continue
-            
-            # Calculate duration
-            duration = calculate_duration(entry_time, exit_time)
-            
-            sessions.append({
-                'session_id': entry.get('id'),
-                'plate_number': plate_number,
-                'lot_name': lot_name_value,
-                'entry_time': entry_time,
-                'exit_time': exit_time,
-                'duration': duration,
-                'status': session_status
-            })
-        
-        # Sort sessions by entry_time (most recent first)
-        sessions.sort(key=lambda x: x['entry_time'] or '', reverse=True)
         
-        # Pagination
-        total_count = len(sessions)
-        total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 0
-        start_index = (page - 1) * page_size
-        end_index = start_index + page_size
-        paginated_sessions = sessions[start_index:end_index]
-        
-        return JsonResponse({
-            'results': paginated_sessions,
-            'count': total_count,
-            'page': page,
-            'page_size': page_size,
-            'total_pages': total_pages
-        })
+        return JsonResponse(build_history_page(entry_records, vehicles_map, lots_map, exit_times, params))
         
     except Exception as e:
         return JsonResponse({'error': f'Database error: {str(e)}'}, status=500)
@@ -2342,301 +2756,336 @@ def reset_user_password(request):
     return redirect('manage_users')
 
 
+def posted_plate(request):
+    """The license_plate of a check-in/out POST (JSON or form), stripped and upper-cased."""
+    if request.content_type and 'application/json' in request.content_type:
+        plate = json.loads(request.body).get('license_plate')
+    else:
+        plate = request.POST.get('license_plate')
+    return (plate or '').strip().upper()
+
+
+# -- check-in/out rules, shared with async_views.py -----------------------------
+# The queries are built here for either Supabase client (sync or async) and what
+# they return is judged here, so both check-in/out views validate the same way
+# and only differ in how they run a query.
+
+def vehicle_queries(client, plate):
+    """Queries for a plate's vehicle, tried in order: exact match, then case-insensitive."""
+    return [
+        client.table('vehicle').select('id, plate').eq('plate', plate),
+        client.table('vehicle').select('id, plate').ilike('plate', plate),
+    ]
+
+
+def vehicle_insert_query(client, plate):
+    return client.table('vehicle').insert({'plate': plate})
+
+
+def entries_query(client, vehicle_id):
+    """A vehicle's entries, newest first."""
+    return client.table('entries_exits').select('id, time, action').eq(
+        'vehicle_id', vehicle_id
+    ).eq('action', 'entry').order('time', desc=True)
+
+
+def exit_after_query(client, vehicle_id, entry_time):
+    """The first exit of a vehicle since an entry; none means that parking is still going on."""
+    return client.table('entries_exits').select('id').eq(
+        'vehicle_id', vehicle_id
+    ).eq('action', 'exit').gte('time', entry_time).order('time').limit(1)
+
+
+def occupied_slots_query(client):
+    return client.table('parking_slot').select('id, slot_number, lot_id, license_plate').eq('status', 'occupied')
+
+
+def check_in_slot_query(client, slot_id):
+    return client.table('parking_slot').select('id, status, lot_id').eq('id', slot_id)
+
+
+def check_out_slot_query(client, slot_id):
+    return client.table('parking_slot').select(
+        'id, status, license_plate, check_in_time, slot_number, lot_id'
+    ).eq('id', slot_id)
+
+
+def lot_code_query(client, lot_id):
+    # Lot created since the reference cache was filled
+    return client.table('parking_lot').select('code').eq('id', lot_id)
+
+
+def active_session_error(license_plate):
+    return (f'License plate {license_plate} is already in an active parking session. '
+            'Please check out the vehicle first.')
+
+
+def parked_slot_error(license_plate, occupied_slots):
+    """The duplicate-plate message when an occupied slot holds the plate (any case), else None."""
+    for slot in occupied_slots:
+        if (slot.get('license_plate') or '').strip().upper() == license_plate:
+            return (f"License plate {license_plate} is already checked in at slot {slot.get('slot_number', 'N/A')}. "
+                    'Please check out the vehicle first.')
+    return None
+
+
+def slot_refusal(slot_rows, action):
+    """The 4xx response when the slot read for a check_in/check_out rules it out, else None."""
+    if not slot_rows:
+        return JsonResponse({'error': 'Slot not found'}, status=404)
+    occupied = (slot_rows[0].get('status') or 'available').lower() == 'occupied'
+    if action == 'check_in' and occupied:
+        return JsonResponse({'error': 'Slot is already occupied'}, status=400)
+    if action == 'check_out' and not occupied:
+        return JsonResponse({'error': 'Slot is not currently occupied'}, status=400)
+    if not slot_rows[0].get('lot_id'):
+        return JsonResponse({'error': 'Slot does not have an associated parking lot'}, status=400)
+    return None
+
+
+def slot_conflict(action):
+    """The 409 response when the slot changed between the read and the compare-and-set."""
+    if action == 'check_in':
+        message = 'This slot was just taken by another check-in. Please refresh and choose another slot.'
+    else:
+        message = 'This slot was just checked out by someone else. Please refresh the page.'
+    return JsonResponse({'error': message, 'conflict': True}, status=409)
+
+
+def slot_action_failed(exc, action):
+    """The 503 (Supabase unavailable) or 500 response of a check-in/out that raised."""
+    name = 'check-in' if action == 'check_in' else 'check-out'
+    if is_unavailable(exc):
+        return JsonResponse({
+            'error': f'The parking database is temporarily unavailable. Please try the {name} again.',
+            'retryable': True,
+        }, status=503)
+    return JsonResponse({'error': f'{name.capitalize()} failed: {str(exc)}'}, status=500)
+
+
+def vehicle_not_created(license_plate, insert_error):
+    """Log that a check-in found no vehicle even after inserting one; returns the warning text."""
+    if insert_error is None:
+        vehicle_error = 'Vehicle insert succeeded but vehicle not found after insert'
+    else:
+        vehicle_error = f'Failed to create vehicle and vehicle not found after insert. Error: {insert_error}'
+    logger.error('%s (plate %s)', vehicle_error, license_plate)
+    return vehicle_error
+
+
+def vehicle_not_found(license_plate):
+    """Log that a check-out's plate has no vehicle; returns the warning text."""
+    # Shouldn't happen on check-out, but the slot is freed all the same
+    vehicle_error = f"Vehicle with plate {license_plate} not found in database"
+    logger.warning('%s', vehicle_error)
+    return vehicle_error
+
+
+def history_row(time, vehicle_id, action, lot_id, lot_code=None):
+    """The entries_exits row of a check-in ('entry') or check-out ('exit')."""
+    row = {'time': time, 'vehicle_id': vehicle_id, 'action': action, 'lot_id': lot_id}
+    # Include zone (lot code) if we retrieved it
+    if lot_code:
+        row['zone'] = lot_code
+    return row
+
+
+def history_unconfirmed(row, slot_id):
+    """Log an entries_exits insert that returned no row; returns the warning text."""
+    # Only without the outbox: the direct insert returned no row
+    history_error = f"Supabase did not confirm the {row['action']} record"
+    logger.warning('%s (slot %s)', history_error, slot_id)
+    return history_error
+
+
+def history_failure(exc, slot_id, action):
+    """Log why the entries_exits row of a check-in/out failed; returns the warning text."""
+    error_str = str(exc)
+    error_code = ''
+    error_message = error_str
+    # Parse error - check if it's a duplicate key error on the id column
+    if exc.args and isinstance(exc.args[0], dict):
+        error_code = exc.args[0].get('code', '')
+        error_message = exc.args[0].get('message', error_str)
+
+    # Check if it's a sequence/duplicate key issue on the id column
+    is_sequence_error = (
+        error_code == '23505' and
+        ('entries_exits_pkey' in error_message or 'id' in error_message.lower())
+    )
+    if is_sequence_error:
+        logger.error(
+            'Sequence error on entries_exits (run fix_entries_exits_sequence.sql in Supabase): %s',
+            error_message, extra={'slot_id': slot_id},
+        )
+        return f"Database sequence issue: {error_message}. Please run fix_entries_exits_sequence.sql in Supabase SQL Editor."
+    logger.exception('Error creating parking history %s', action, extra={'slot_id': slot_id})
+    return error_str
+
+
+def missing_history_data(slot_id, vehicle_id, lot_id, action):
+    """Log that the entries_exits row of a check-in/out can't be written; returns the warning text."""
+    missing = []
+    if not vehicle_id:
+        missing.append('vehicle_id')
+    if not lot_id:
+        missing.append('lot_id')
+    history_error = f"Missing required data: {', '.join(missing)}"
+    logger.warning(
+        'Cannot create parking history %s: %s', action, history_error,
+        extra={'slot_id': slot_id, 'vehicle_id': vehicle_id, 'lot_id': lot_id},
+    )
+    return history_error
+
+
+def with_warnings(response_data, history_error, vehicle_error):
+    """Add the history/vehicle warnings to a successful check-in/out response."""
+    if history_error:
+        response_data['warning'] = f"Parking history may not have been updated: {history_error}"
+    if vehicle_error:
+        response_data['vehicle_warning'] = f"Vehicle record issue: {vehicle_error}"
+    return response_data
+
+
+# -- sync check-in/out steps (async_views.py has the awaited twins) -------------
+
+def _find_vehicle(license_plate, site):
+    for query in vehicle_queries(supabase, license_plate):
+        vehicle_resp = run_query(query, site)
+        if vehicle_resp.data:
+            return vehicle_resp.data[0]['id']
+    return None
+
+
+def _duplicate_plate_error(license_plate):
+    """The 400 message when the plate is already parked: an entry without an exit, or an occupied slot."""
+    vehicle_id = _find_vehicle(license_plate, 'checkin.vehicle')
+    if vehicle_id is not None:
+        entries = run_query(entries_query(supabase, vehicle_id), 'checkin.active_entries')
+        for entry in entries.data or []:
+            if not run_query(exit_after_query(supabase, vehicle_id, entry.get('time')), 'checkin.active_exit').data:
+                return active_session_error(license_plate)
+    occupied = run_query(occupied_slots_query(supabase), 'checkin.plate_slot')
+    return parked_slot_error(license_plate, occupied.data or [])
+
+
+def _vehicle_for_check_in(license_plate):
+    """(vehicle_id, vehicle_error): the plate's vehicle, created when it has none yet."""
+    try:
+        vehicle_id = _find_vehicle(license_plate, 'checkin.vehicle')
+        if vehicle_id is not None:
+            return vehicle_id, None
+        try:
+            vehicle_insert = run_query(
+                vehicle_insert_query(supabase, license_plate), 'checkin.vehicle_insert', idempotent=False
+            )
+            if vehicle_insert.data:
+                logger.info('Created vehicle %s for plate %s', vehicle_insert.data[0]['id'], license_plate)
+                return vehicle_insert.data[0]['id'], None
+            insert_error = None
+        except Exception as e:
+            # Duplicate key and the like: another check-in may have created it meanwhile
+            insert_error = e
+            logger.info('Vehicle insert failed (%s), fetching existing vehicle by plate', e)
+        vehicle_id = _find_vehicle(license_plate, 'checkin.vehicle')
+        if vehicle_id is not None:
+            return vehicle_id, None
+        return None, vehicle_not_created(license_plate, insert_error)
+    except Exception as e:
+        logger.exception('Error creating/finding vehicle for plate %s', license_plate)
+        return None, str(e)
+
+
+def _vehicle_for_check_out(license_plate):
+    """(vehicle_id, vehicle_error): the vehicle the exit row is recorded for."""
+    if not license_plate:
+        return None, None
+    try:
+        vehicle_id = _find_vehicle(license_plate, 'checkout.vehicle')
+        return vehicle_id, None if vehicle_id is not None else vehicle_not_found(license_plate)
+    except Exception as e:
+        logger.exception('Error finding vehicle for plate %s', license_plate)
+        return None, str(e)
+
+
+def _lot_code(lot_id):
+    # Zone (lot code) for the history row; the check-in/out goes on without it
+    try:
+        lot = get_lot(lot_id)
+        if lot is None:
+            lot_resp = run_query(lot_code_query(supabase, lot_id), 'lots.code')
+            lot = lot_resp.data[0] if lot_resp.data else None
+        return lot.get('code') if lot else None
+    except Exception as e:
+        logger.warning('Failed to retrieve lot code for lot_id %s: %s', lot_id, e)
+        return None
+
+
+def _record_history(row, site, slot_id):
+    """(created, history_error) for an entries_exits row."""
+    try:
+        # Journaled and sent to Supabase in the background (utils/history_outbox.py)
+        if history_outbox.record(row, site):
+            logger.debug('Recorded parking history %s', row['action'], extra={'history': row})
+            return True, None
+        return False, history_unconfirmed(row, slot_id)
+    except Exception as e:
+        # Still a success: the slot update went through
+        return False, history_failure(e, slot_id, row['action'])
+
+
 @require_POST
+@idempotent_view('checkin')
+@metrics.track_slot_action('check_in')
 def handle_check_in(request, slot_id):
     """
     API Endpoint: Vehicle Check-In
     Updates the slot's status to 'occupied', stores license plate, and sets check_in_time.
+    Retries sent with the same Idempotency-Key header replay the first response.
     """
     if 'access_token' not in request.session:
         return JsonResponse({'error': 'Authentication required'}, status=401)
-    
+
     try:
-        # Get license plate from request
-        if request.content_type and 'application/json' in request.content_type:
-            import json
-            data = json.loads(request.body)
-            license_plate = data.get('license_plate', '').strip()
-        else:
-            license_plate = request.POST.get('license_plate', '').strip()
-        
+        license_plate = posted_plate(request)
         if not license_plate:
             return JsonResponse({'error': 'License plate is required'}, status=400)
-        # Normalize formatting for consistency
-        license_plate = license_plate.strip().upper()
-        
+
         # Validation: Check if this license plate is already in an active parking session
         try:
-            # First, find the vehicle by license plate (case-insensitive)
-            vehicle_check = supabase.table('vehicle').select('id').ilike('plate', license_plate).execute()
-            
-            # If not found with ilike, try exact match
-            if not vehicle_check.data or len(vehicle_check.data) == 0:
-                vehicle_check = supabase.table('vehicle').select('id').eq('plate', license_plate).execute()
-            
-            if vehicle_check.data and len(vehicle_check.data) > 0:
-                vehicle_id_check = vehicle_check.data[0]['id']
-                
-                # Check if there's an active entry without a corresponding exit
-                # Get all entry records for this vehicle
-                entry_records = supabase.table('entries_exits').select(
-                    'id, time, action'
-                ).eq('vehicle_id', vehicle_id_check).eq('action', 'entry').order('time', desc=True).execute()
-                
-                if entry_records.data:
-                    # For each entry, check if there's a corresponding exit
-                    for entry in entry_records.data:
-                        entry_time = entry.get('time')
-                        entry_id = entry.get('id')
-                        
-                        # Check if there's an exit record after this entry
-                        exit_check = supabase.table('entries_exits').select('id').eq(
-                            'vehicle_id', vehicle_id_check
-                        ).eq('action', 'exit').gte('time', entry_time).order('time').limit(1).execute()
-                        
-                        # If no exit found, this is an active session
-                        if not exit_check.data or len(exit_check.data) == 0:
-                            return JsonResponse({
-                                'error': f'License plate {license_plate} is already in an active parking session. Please check out the vehicle first.'
-                            }, status=400)
-            
-            # Also check if any slot is currently occupied with this license plate (case-insensitive)
-            # Try exact match first
-            occupied_slot_check = supabase.table('parking_slot').select(
-                'id, slot_number, lot_id'
-            ).eq('license_plate', license_plate).eq('status', 'occupied').execute()
-            
-            # If not found, try case-insensitive (if Supabase supports it for this column)
-            if not occupied_slot_check.data or len(occupied_slot_check.data) == 0:
-                try:
-                    # Try to get all occupied slots and filter in Python for case-insensitive match
-                    all_occupied = supabase.table('parking_slot').select(
-                        'id, slot_number, lot_id, license_plate'
-                    ).eq('status', 'occupied').execute()
-                    
-                    if all_occupied.data:
-                        for slot in all_occupied.data:
-                            slot_plate = (slot.get('license_plate') or '').strip().upper()
-                            if slot_plate == license_plate:
-                                occupied_slot_check.data = [slot]
-                                break
-                except Exception:
-                    pass  # If this fails, continue with the original check
-            
-            if occupied_slot_check.data and len(occupied_slot_check.data) > 0:
-                occupied_slot = occupied_slot_check.data[0]
-                slot_num = occupied_slot.get('slot_number', 'N/A')
-                return JsonResponse({
-                    'error': f'License plate {license_plate} is already checked in at slot {slot_num}. Please check out the vehicle first.'
-                }, status=400)
-                
+            duplicate = _duplicate_plate_error(license_plate)
         except Exception as check_error:
             # If check fails, log but don't block - might be a database issue
-            print(f"Warning: Could not verify duplicate license plate: {str(check_error)}")
-        
-        # Get current slot status and lot_id in one query
-        slot_resp = supabase.table('parking_slot').select('id, status, lot_id').eq('id', slot_id).execute()
-        
-        if not slot_resp.data or len(slot_resp.data) == 0:
-            return JsonResponse({'error': 'Slot not found'}, status=404)
-        
-        current_slot = slot_resp.data[0]
-        current_status = (current_slot.get('status') or 'available').lower()
+            logger.warning('Could not verify duplicate license plate: %s', check_error)
+            duplicate = None
+        if duplicate:
+            return JsonResponse({'error': duplicate}, status=400)
+
+        slot_rows = run_query(check_in_slot_query(supabase, slot_id), 'checkin.slot').data
+        refusal = slot_refusal(slot_rows, 'check_in')
+        if refusal is not None:
+            return refusal
+        current_slot = slot_rows[0]
         lot_id = current_slot.get('lot_id')
-        
-        # Validation: Check if slot is already occupied
-        if current_status == 'occupied':
-            return JsonResponse({'error': 'Slot is already occupied'}, status=400)
-        
-        # Validate lot_id exists
-        if not lot_id:
-            return JsonResponse({'error': 'Slot does not have an associated parking lot'}, status=400)
-        
-        if not license_plate:
-            return JsonResponse({'error': 'No license plate recorded for this slot. Please enter the plate number before checking out.'}, status=400)
-        
-        # Get lot code from parking_lot table for zone field
-        lot_code = None
-        try:
-            lot_resp = supabase.table('parking_lot').select('code').eq('id', lot_id).execute()
-            if lot_resp.data and len(lot_resp.data) > 0:
-                lot_code = lot_resp.data[0].get('code')
-                print(f"Retrieved lot code: {lot_code} for lot_id: {lot_id}")
-        except Exception as e:
-            print(f"Warning: Failed to retrieve lot code: {str(e)}")
-            # Continue without zone if we can't get the code
-        
-        # Update slot with check-in information
-        from datetime import datetime
+        lot_code = _lot_code(lot_id)
+
         check_in_time = datetime.now(dt_timezone.utc).isoformat()
-        
-        # First update status (this column definitely exists)
-        update_data = {
-            'status': 'occupied',
-        }
-        supabase.table('parking_slot').update(update_data).eq('id', slot_id).execute()
-        
-        # Try to update license_plate and check_in_time if columns exist
-        try:
-            update_data_extended = {
-                'license_plate': license_plate,
-                'check_in_time': check_in_time
-            }
-            supabase.table('parking_slot').update(update_data_extended).eq('id', slot_id).execute()
-        except Exception:
-            # Columns don't exist yet - that's okay, status was updated
-            pass
-        
-        # Create or get vehicle record - always fetch by plate first, then insert if needed
-        vehicle_id = None
-        vehicle_error = None
-        
-        try:
-            # ALWAYS try to find existing vehicle by plate first (case-insensitive search)
-            # Try exact match first
-            vehicle_resp = supabase.table('vehicle').select('id, plate').eq('plate', license_plate).execute()
-            
-            # If not found, try case-insensitive search using ilike
-            if not vehicle_resp.data or len(vehicle_resp.data) == 0:
-                vehicle_resp = supabase.table('vehicle').select('id, plate').ilike('plate', license_plate).execute()
-            
-            if vehicle_resp.data and len(vehicle_resp.data) > 0:
-                vehicle_id = vehicle_resp.data[0]['id']
-                actual_plate = vehicle_resp.data[0].get('plate', license_plate)
-                print(f"Found existing vehicle with id: {vehicle_id} for plate: {actual_plate} (searched for: {license_plate})")
-            else:
-                # Vehicle doesn't exist, try to create it with normalized plate
-                print(f"Vehicle with plate '{license_plate}' not found, creating new vehicle...")
-                try:
-                    vehicle_insert = supabase.table('vehicle').insert({'plate': license_plate}).execute()
-                    if vehicle_insert.data and len(vehicle_insert.data) > 0:
-                        vehicle_id = vehicle_insert.data[0]['id']
-                        print(f"Created new vehicle with id: {vehicle_id} for plate: {license_plate}")
-                    else:
-                        # Insert succeeded but no data returned, fetch it
-                        vehicle_resp_after_insert = supabase.table('vehicle').select('id').eq('plate', license_plate).execute()
-                        if vehicle_resp_after_insert.data and len(vehicle_resp_after_insert.data) > 0:
-                            vehicle_id = vehicle_resp_after_insert.data[0]['id']
-                            print(f"Retrieved vehicle id: {vehicle_id} after insert")
-                        else:
-                            vehicle_error = "Vehicle insert succeeded but vehicle not found after insert"
-                            print(f"Error: {vehicle_error}")
-                except Exception as insert_error:
-                    # If insert fails for ANY reason (duplicate key, constraint violation, etc.), fetch by plate
-                    error_str = str(insert_error)
-                    error_dict = {}
-                    error_code = ''
-                    error_message = error_str
-                    
-                    # Parse error - could be dict or string
-                    if hasattr(insert_error, 'args') and insert_error.args:
-                        if isinstance(insert_error.args[0], dict):
-                            error_dict = insert_error.args[0]
-                            error_code = error_dict.get('code', '')
-                            error_message = error_dict.get('message', error_str)
-                        elif isinstance(insert_error.args[0], str):
-                            error_message = insert_error.args[0]
-                    
-                    print(f"Vehicle insert failed (code: {error_code}, message: {error_message}), fetching existing vehicle by plate...")
-                    
-                    # ALWAYS try to fetch by plate after insert error - vehicle might already exist
-                    # Try multiple search methods to be sure
-                    vehicle_found = False
-                    for search_plate in [license_plate, license_plate.strip()]:
-                        try:
-                            vehicle_resp_retry = supabase.table('vehicle').select('id, plate').eq('plate', search_plate).execute()
-                            if not vehicle_resp_retry.data or len(vehicle_resp_retry.data) == 0:
-                                vehicle_resp_retry = supabase.table('vehicle').select('id, plate').ilike('plate', search_plate).execute()
-                            
-                            if vehicle_resp_retry.data and len(vehicle_resp_retry.data) > 0:
-                                vehicle_id = vehicle_resp_retry.data[0]['id']
-                                actual_plate = vehicle_resp_retry.data[0].get('plate', search_plate)
-                                print(f"Successfully retrieved existing vehicle with id: {vehicle_id} for plate: {actual_plate} (searched: {search_plate})")
-                                vehicle_found = True
-                                break
-                        except Exception as fetch_error:
-                            print(f"Fetch attempt failed for '{search_plate}': {str(fetch_error)}")
-                            continue
-                    
-                    if not vehicle_found:
-                        # Vehicle truly doesn't exist and insert failed
-                        vehicle_error = f"Failed to create vehicle and vehicle not found after multiple search attempts. Error: {error_message}"
-                        print(f"Error: {vehicle_error}")
-        except Exception as e:
-            vehicle_error = str(e)
-            print(f"Error creating/finding vehicle: {vehicle_error}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
-        
-        # Create entry record in entries_exits (parking history)
-        history_error = None
-        entry_created = False
-        if vehicle_id and lot_id:
-            try:
-                # Ensure lot_id and vehicle_id are the correct type (int/str as needed by Supabase)
-                entry_data = {
-                    'time': check_in_time,
-                    'vehicle_id': vehicle_id,
-                    'action': 'entry',
-                    'lot_id': lot_id
-                }
-                # Include zone (lot code) if we retrieved it
-                if lot_code:
-                    entry_data['zone'] = lot_code
-                
-                entry_result = supabase.table('entries_exits').insert(entry_data).execute()
-                
-                # Verify the entry was created
-                if entry_result.data and len(entry_result.data) > 0:
-                    entry_created = True
-                    print(f"Successfully created parking history entry: {entry_result.data[0]}")
-                else:
-                    history_error = "Entry record created but no data returned"
-                    print(f"Warning: {history_error}")
-            except Exception as e:
-                history_error = str(e)
-                error_str = str(e)
-                error_dict = {}
-                error_code = ''
-                
-                # Parse error - check if it's a duplicate key error on the id column
-                if hasattr(e, 'args') and e.args:
-                    if isinstance(e.args[0], dict):
-                        error_dict = e.args[0]
-                        error_code = error_dict.get('code', '')
-                        error_message = error_dict.get('message', error_str)
-                    else:
-                        error_message = error_str
-                else:
-                    error_message = error_str
-                
-                # Check if it's a sequence/duplicate key issue on the id column
-                is_sequence_error = (
-                    error_code == '23505' and 
-                    ('entries_exits_pkey' in error_message or 'id' in error_message.lower())
-                )
-                
-                if is_sequence_error:
-                    print(f"Sequence error detected on entries_exits table. Error: {error_message}")
-                    print("NOTE: You need to run the SQL script 'fix_entries_exits_sequence.sql' in Supabase to fix this.")
-                    history_error = f"Database sequence issue: {error_message}. Please run fix_entries_exits_sequence.sql in Supabase SQL Editor."
-                else:
-                    import traceback
-                    print(f"Error creating parking history entry: {history_error}")
-                    print(f"Traceback: {traceback.format_exc()}")
-                # Still continue - slot update was successful
+        # Status, plate and check-in time in one statement, only if nobody took the slot since we read it
+        if not transition_slot(slot_id, current_slot.get('status'), 'occupied', 'checkin.slot_update',
+                               fields={'license_plate': license_plate, 'check_in_time': check_in_time}):
+            return slot_conflict('check_in')
+        occupancy.check_in(slot_id, license_plate, check_in_time, lot_id)
+
+        vehicle_id, vehicle_error = _vehicle_for_check_in(license_plate)
+        if vehicle_id:
+            entry_created, history_error = _record_history(
+                history_row(check_in_time, vehicle_id, 'entry', lot_id, lot_code), 'checkin.entry', slot_id
+            )
         else:
-            missing = []
-            if not vehicle_id:
-                missing.append('vehicle_id')
-            if not lot_id:
-                missing.append('lot_id')
-            history_error = f"Missing required data: {', '.join(missing)}"
-            print(f"Warning: Cannot create parking history entry - {history_error}")
-            print(f"Debug - vehicle_id: {vehicle_id}, lot_id: {lot_id}")
-        
-        # Return success response (slot update succeeded even if history creation had issues)
-        response_data = {
+            entry_created, history_error = False, missing_history_data(slot_id, vehicle_id, lot_id, 'entry')
+
+        # Success even if the history row had issues: the slot update went through
+        return JsonResponse(with_warnings({
             'success': True,
             'message': 'Vehicle checked in successfully',
             'slot_id': slot_id,
@@ -2644,202 +3093,71 @@ def handle_check_in(request, slot_id):
             'check_in_time': check_in_time,
             'history_created': entry_created,
             'vehicle_id': vehicle_id,
-            'lot_id': lot_id
-        }
-        
-        # Include warnings if history creation had issues
-        if history_error:
-            response_data['warning'] = f"Parking history may not have been updated: {history_error}"
-        if vehicle_error:
-            response_data['vehicle_warning'] = f"Vehicle record issue: {vehicle_error}"
-        
-        return JsonResponse(response_data)
-        
+            'lot_id': lot_id,
+        }, history_error, vehicle_error))
+
     except Exception as e:
-        return JsonResponse({'error': f'Check-in failed: {str(e)}'}, status=500)
+        return slot_action_failed(e, 'check_in')
 
 
 @require_POST
+@idempotent_view('checkout')
+@metrics.track_slot_action('check_out')
 def handle_check_out(request, slot_id):
     """
     API Endpoint: Vehicle Check-Out
     Updates the slot's status to 'available' and clears license_plate and check_in_time.
+    Retries sent with the same Idempotency-Key header replay the first response.
     """
     if 'access_token' not in request.session:
         return JsonResponse({'error': 'Authentication required'}, status=401)
-    
+
     try:
-        provided_plate = ''
         try:
-            if request.content_type and 'application/json' in request.content_type:
-                import json
-                body = json.loads(request.body)
-                provided_plate = (body.get('license_plate') or '').strip().upper()
-            else:
-                provided_plate = (request.POST.get('license_plate') or '').strip().upper()
+            provided_plate = posted_plate(request)
         except Exception:
             provided_plate = ''
-        
-        # Get current slot information
-        slot_resp = supabase.table('parking_slot').select('id, status, license_plate, slot_number, lot_id').eq('id', slot_id).execute()
-        
-        if not slot_resp.data or len(slot_resp.data) == 0:
-            return JsonResponse({'error': 'Slot not found'}, status=404)
-        
-        current_slot = slot_resp.data[0]
-        current_status = (current_slot.get('status') or 'available').lower()
+
+        slot_rows = run_query(check_out_slot_query(supabase, slot_id), 'checkout.slot').data
+        refusal = slot_refusal(slot_rows, 'check_out')
+        if refusal is not None:
+            return refusal
+        current_slot = slot_rows[0]
         license_plate = (provided_plate or current_slot.get('license_plate') or '').strip().upper()
-        slot_number = current_slot.get('slot_number', '')
         lot_id = current_slot.get('lot_id')
-        
-        # Validation: Check if slot is actually occupied
-        if current_status != 'occupied':
-            return JsonResponse({'error': 'Slot is not currently occupied'}, status=400)
-        
-        # Validate lot_id exists
-        if not lot_id:
-            return JsonResponse({'error': 'Slot does not have an associated parking lot'}, status=400)
-        
-        # Get lot code from parking_lot table for zone field
-        lot_code = None
-        try:
-            lot_resp = supabase.table('parking_lot').select('code').eq('id', lot_id).execute()
-            if lot_resp.data and len(lot_resp.data) > 0:
-                lot_code = lot_resp.data[0].get('code')
-                print(f"Retrieved lot code: {lot_code} for lot_id: {lot_id}")
-        except Exception as e:
-            print(f"Warning: Failed to retrieve lot code: {str(e)}")
-            # Continue without zone if we can't get the code
-        
-        # Get vehicle_id for exit record
-        vehicle_id = None
-        vehicle_error = None
-        if license_plate:
-            try:
-                vehicle_resp = supabase.table('vehicle').select('id').eq('plate', license_plate).execute()
-                if vehicle_resp.data and len(vehicle_resp.data) > 0:
-                    vehicle_id = vehicle_resp.data[0]['id']
-                    print(f"Found vehicle with id: {vehicle_id} for plate: {license_plate}")
-                else:
-                    # Vehicle doesn't exist - this shouldn't happen on check-out, but handle it gracefully
-                    vehicle_error = f"Vehicle with plate {license_plate} not found in database"
-                    print(f"Warning: {vehicle_error}")
-            except Exception as e:
-                vehicle_error = str(e)
-                print(f"Error finding vehicle: {vehicle_error}")
-                import traceback
-                print(f"Traceback: {traceback.format_exc()}")
-        
-        # Update slot - clear check-out information
-        from datetime import datetime
+        lot_code = _lot_code(lot_id)
+        vehicle_id, vehicle_error = _vehicle_for_check_out(license_plate)
+
         check_out_time = datetime.now(dt_timezone.utc).isoformat()
-        
-        # First update status (this column definitely exists)
-        update_data = {
-            'status': 'available',
-        }
-        supabase.table('parking_slot').update(update_data).eq('id', slot_id).execute()
-        
-        # Try to clear license_plate and check_in_time if columns exist
-        try:
-            update_data_extended = {
-                'license_plate': None,
-                'check_in_time': None
-            }
-            supabase.table('parking_slot').update(update_data_extended).eq('id', slot_id).execute()
-        except Exception:
-            # Columns don't exist yet - that's okay, status was updated
-            pass
-        
-        # Create exit record in entries_exits (parking history)
-        history_error = None
-        exit_created = False
-        if vehicle_id and lot_id:
-            try:
-                # Ensure lot_id and vehicle_id are the correct type (int/str as needed by Supabase)
-                exit_data = {
-                    'time': check_out_time,
-                    'vehicle_id': vehicle_id,
-                    'action': 'exit',
-                    'lot_id': lot_id
-                }
-                # Include zone (lot code) if we retrieved it
-                if lot_code:
-                    exit_data['zone'] = lot_code
-                
-                exit_result = supabase.table('entries_exits').insert(exit_data).execute()
-                
-                # Verify the exit was created
-                if exit_result.data and len(exit_result.data) > 0:
-                    exit_created = True
-                    print(f"Successfully created parking history exit: {exit_result.data[0]}")
-                else:
-                    history_error = "Exit record created but no data returned"
-                    print(f"Warning: {history_error}")
-            except Exception as e:
-                history_error = str(e)
-                error_str = str(e)
-                error_dict = {}
-                error_code = ''
-                
-                # Parse error - check if it's a duplicate key error on the id column
-                if hasattr(e, 'args') and e.args:
-                    if isinstance(e.args[0], dict):
-                        error_dict = e.args[0]
-                        error_code = error_dict.get('code', '')
-                        error_message = error_dict.get('message', error_str)
-                    else:
-                        error_message = error_str
-                else:
-                    error_message = error_str
-                
-                # Check if it's a sequence/duplicate key issue on the id column
-                is_sequence_error = (
-                    error_code == '23505' and 
-                    ('entries_exits_pkey' in error_message or 'id' in error_message.lower())
-                )
-                
-                if is_sequence_error:
-                    print(f"Sequence error detected on entries_exits table. Error: {error_message}")
-                    print("NOTE: You need to run the SQL script 'fix_entries_exits_sequence.sql' in Supabase to fix this.")
-                    history_error = f"Database sequence issue: {error_message}. Please run fix_entries_exits_sequence.sql in Supabase SQL Editor."
-                else:
-                    import traceback
-                    print(f"Error creating parking history exit: {history_error}")
-                    print(f"Traceback: {traceback.format_exc()}")
-                # Still continue - slot update was successful
+        # Status cleared with the plate and check-in time in one statement, only if the slot still
+        # holds the parking read above (not a later one by another vehicle)
+        if not transition_slot(slot_id, current_slot.get('status'), 'available', 'checkout.slot_update',
+                               fields={'license_plate': None, 'check_in_time': None},
+                               expected=parking_of(current_slot)):
+            return slot_conflict('check_out')
+        occupancy.check_out(slot_id, lot_id)
+
+        if vehicle_id:
+            exit_created, history_error = _record_history(
+                history_row(check_out_time, vehicle_id, 'exit', lot_id, lot_code), 'checkout.exit', slot_id
+            )
         else:
-            missing = []
-            if not vehicle_id:
-                missing.append('vehicle_id')
-            if not lot_id:
-                missing.append('lot_id')
-            history_error = f"Missing required data: {', '.join(missing)}"
-            print(f"Warning: Cannot create parking history exit - {history_error}")
-            print(f"Debug - vehicle_id: {vehicle_id}, lot_id: {lot_id}")
-        
-        # Return success response (slot update succeeded even if history creation had issues)
-        response_data = {
+            exit_created, history_error = False, missing_history_data(slot_id, vehicle_id, lot_id, 'exit')
+
+        # Success even if the history row had issues: the slot update went through
+        return JsonResponse(with_warnings({
             'success': True,
             'message': 'Vehicle checked out successfully',
             'slot_id': slot_id,
-            'slot_number': slot_number,
+            'slot_number': current_slot.get('slot_number', ''),
             'license_plate': license_plate,
             'history_created': exit_created,
             'vehicle_id': vehicle_id,
-            'lot_id': lot_id
-        }
-        
-        # Include warnings if history creation had issues
-        if history_error:
-            response_data['warning'] = f"Parking history may not have been updated: {history_error}"
-        if vehicle_error:
-            response_data['vehicle_warning'] = f"Vehicle record issue: {vehicle_error}"
-        
-        return JsonResponse(response_data)
-        
+            'lot_id': lot_id,
+        }, history_error, vehicle_error))
+
     except Exception as e:
-        return JsonResponse({'error': f'Check-out failed: {str(e)}'}, status=500)
+        return slot_action_failed(e, 'check_out')
 
 
 def get_slot_details(request, slot_id):
@@ -2878,6 +3196,86 @@ def get_slot_details(request, slot_id):
         return JsonResponse({'error': f'Failed to get slot details: {str(e)}'}, status=500)
 
 
+def grid_since(request):
+    """The ?since= version of a slot-grid request, if it can be answered as a delta.
+
+    Versions count per worker process, so since is only honoured together with
+    the epoch of the response it came from.
+    """
+    try:
+        since = int(request.GET.get('since', ''))
+    except ValueError:
+        return None
+    return since if request.GET.get('epoch') == occupancy.epoch else None
+
+
+def lot_grid_response(request, lot_id, grid):
+    """JSON (or 304) for occupancy.lot_grid() output."""
+    etag = f'"{occupancy.epoch}-{lot_id}-{grid["version"]}"'
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponse(status=304)
+    else:
+        response = JsonResponse({
+            'lot_id': lot_id,
+            'epoch': occupancy.epoch,
+            'version': grid['version'],
+            'full': grid['full'],
+            'slots': [
+                {
+                    'id': slot['id'],
+                    'slot_number': slot['slot_number'],
+                    'status': slot['status'],
+                    'license_plate': slot['license_plate'],
+                    'check_in_time': slot['check_in_time'],
+                }
+                for slot in grid['slots']
+            ],
+            'removed': grid['removed'],
+            'counts': {
+                'total': grid['total'],
+                'occupied': grid['filled'],
+                'available': grid['total'] - grid['filled'],
+            },
+        })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@require_GET
+def lot_slots_api(request, lot_id):
+    """
+    API Endpoint: GET /api/lots/<lot_id>/slots/ - a lot's slot grid as JSON.
+
+    Every response carries the lot's version (and ETag). Send If-None-Match to
+    get 304 while nothing changed, or ?since=<version>&epoch=<epoch> to get only
+    the slots changed or removed since then ("full": false).
+    """
+    if 'access_token' not in request.session:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    try:
+        if get_lot(lot_id) is None:
+            return JsonResponse({'error': 'Parking lot not found'}, status=404)
+        grid = occupancy.lot_grid(lot_id, grid_since(request))
+    except Exception as e:
+        if is_unavailable(e):
+            return JsonResponse({'error': 'The parking database is temporarily unavailable.', 'retryable': True}, status=503)
+        return JsonResponse({'error': f'Failed to load slots: {str(e)}'}, status=500)
+    return lot_grid_response(request, lot_id, grid)
+
+
+def lot_slot_events(request, lot_id):
+    """
+    API Endpoint: live slot changes of a lot (Server-Sent Events).
+
+    Streams are only served by the async version under ASGI; a sync worker
+    would be held for the whole connection. 204 tells EventSource not to
+    reconnect, and the page falls back to reloading after its own changes.
+    """
+    return HttpResponse(status=204)
+
+
 @require_POST
 @require_POST
 def delete_parking_slot(request, slot_id):
@@ -2913,6 +3311,7 @@ def delete_parking_slot(request, slot_id):
         
         # Delete the slot
         delete_resp = supabase.table('parking_slot').delete().eq('id', slot_id).execute()
+        occupancy.remove_slot(slot_id, slot_info.get('lot_id'))
         
         return JsonResponse({
             'success': True,
@@ -2925,6 +3324,164 @@ def delete_parking_slot(request, slot_id):
         return JsonResponse({'error': f'Failed to delete slot: {str(e)}'}, status=500)
 
 
+def build_report_sessions(entry_records, vehicles_map, lots_map, vehicle_exits, vehicle_search=''):
+    """Sessions of the advanced reports page: each entry paired with the vehicle's next exit.
+
+    vehicle_exits maps a vehicle id to its sorted exit times. Returns the session
+    rows, the number of completed sessions and their total duration in minutes.
+    """
+    # Build sessions with exit data - optimized single loop
+    parking_logs = []
+    total_duration_minutes = 0
+    completed_count = 0
+
+    # Process entries and find matching exits efficiently
+    for entry in entry_records:
+        vehicle_id = entry.get('vehicle_id')
+        lot_id = entry.get('lot_id')
+        entry_time = entry.get('time')
+
+        if vehicle_search and vehicle_id not in vehicles_map:
+            continue
+
+        plate_number = vehicles_map.get(vehicle_id, 'Unknown')
+        lot_name_value = lots_map.get(lot_id, 'Unknown')
+
+        # Find exit using pre-fetched data (optimized binary search)
+        exit_time = None
+        if vehicle_id in vehicle_exits and vehicle_exits[vehicle_id]:
+            # Use binary search for O(log n) instead of O(n) linear search
+            exits_list = vehicle_exits[vehicle_id]
+            left, right = 0, len(exits_list) - 1
+            while left <= right:
+                mid = (left + right) // 2
+                if exits_list[mid] < entry_time:
+                    left = mid + 1
+                else:
+                    exit_time = exits_list[mid]
+                    right = mid - 1
+
+        status = 'Completed' if exit_time else 'Active'
+        status_class = 'completed' if exit_time else 'active'
+        duration = calculate_duration(entry_time, exit_time)
+
+        # Convert ISO strings to datetime objects for template rendering
+        entry_dt = None
+        exit_dt = None
+        try:
+            if entry_time:
+                entry_clean = entry_time.replace('Z', '+00:00')
+                entry_dt = datetime.fromisoformat(entry_clean)
+                if entry_dt.tzinfo is None:
+                    entry_dt = entry_dt.replace(tzinfo=dt_timezone.utc)
+                # Convert to local timezone
+                entry_dt = timezone.localtime(entry_dt)
+        except Exception:
+            pass
+        
+        try:
+            if exit_time:
+                exit_clean = exit_time.replace('Z', '+00:00')
+                exit_dt = datetime.fromisoformat(exit_clean)
+                if exit_dt.tzinfo is None:
+                    exit_dt = exit_dt.replace(tzinfo=dt_timezone.utc)
+                # Convert to local timezone
+                exit_dt = timezone.localtime(exit_dt)
+        except Exception:
+            pass
+
+        # Track stats
+        if exit_time and entry_dt and exit_dt:
+            completed_count += 1
+            try:
+                total_duration_minutes += (exit_dt - entry_dt).total_seconds() / 60
+            except Exception:
+                pass
+
+        parking_logs.append({
+            'id': entry.get('id'),
+            'vehicle_plate': plate_number,
+            'lot_name': lot_name_value,
+            'entry_time': entry_dt,  # Now a datetime object
+            'exit_time': exit_dt,  # Now a datetime object (or None)
+            'duration': duration,
+            'status': status,
+            'status_class': status_class,
+        })
+
+    return parking_logs, completed_count, total_duration_minutes
+
+
+def build_report_charts(parking_logs):
+    """Monthly, daily, peak-hour and per-lot series of the advanced reports charts."""
+    # OPTIMIZATION: Process all chart data in a single loop instead of multiple loops
+    # Limit processing to improve performance
+    monthly_data = defaultdict(int)
+    daily_data = defaultdict(int)
+    hourly_data = defaultdict(int)
+    lot_usage = defaultdict(int)
+    
+    # Process logs for charts (limit to prevent excessive processing)
+    chart_logs = parking_logs[:1000] if len(parking_logs) > 1000 else parking_logs
+    
+    for log in chart_logs:
+        try:
+            # entry_time is now a datetime object (or None), not a string
+            entry_dt = log.get('entry_time')
+            if not entry_dt:
+                continue  # Skip if no entry time
+            
+            # entry_dt is already a datetime object, use it directly
+            # Monthly data
+            month_key = entry_dt.strftime('%b %Y')
+            monthly_data[month_key] += 1
+            
+            # Daily data - limit to last 60 days for performance
+            day_key = entry_dt.strftime('%b %d')
+            daily_data[day_key] += 1
+            
+            # Hourly data
+            hour = entry_dt.hour
+            hourly_data[hour] += 1
+            
+            # Lot usage
+            lot_usage[log['lot_name']] += 1
+        except Exception:
+            pass
+
+    # Sort by date and prepare for chart
+    sorted_months = sorted(monthly_data.items(), 
+                           key=lambda x: datetime.strptime(x[0], '%b %Y'))
+    monthly_labels = [m[0] for m in sorted_months[-12:]]  # Last 12 months
+    monthly_usage = [m[1] for m in sorted_months[-12:]]
+    
+    # Limit daily data to last 30 days for performance
+    sorted_daily = sorted(daily_data.items(), 
+                         key=lambda x: datetime.strptime(x[0], '%b %d'))
+    daily_labels_limited = [d[0] for d in sorted_daily[-30:]]
+    daily_usage_limited = [d[1] for d in sorted_daily[-30:]]
+
+    # Peak hours analysis
+    peak_hours = sorted(hourly_data.items(), key=lambda x: x[1], reverse=True)[:5]
+    peak_hour_labels = [f"{h[0]:02d}:00" for h in peak_hours]
+    peak_hour_values = [h[1] for h in peak_hours]
+
+    # Lot usage breakdown
+    lot_labels = list(lot_usage.keys())
+    lot_values = list(lot_usage.values())
+
+    return {
+        'monthly_labels': monthly_labels,
+        'monthly_usage': monthly_usage,
+        'daily_labels': daily_labels_limited,
+        'daily_usage': daily_usage_limited,
+        'peak_hour_labels': peak_hour_labels,
+        'peak_hour_values': peak_hour_values,
+        'lot_labels': lot_labels,
+        'lot_values': lot_values,
+    }
+
+
 class AdvancedReportsView(View):
     """Advanced Reports page for admin - shows analytics, charts, and export options"""
     
@@ -2939,9 +3496,9 @@ class AdvancedReportsView(View):
                 messages.error(request, 'Please log in first.')
                 return redirect('login')
             
-            user_response = supabase.table('users').select(
+            user_response = run_query(supabase.table('users').select(
                 'first_name, last_name, email, student_employee_id, role'
-            ).eq('id', user_id).execute()
+            ).eq('id', user_id), 'users.profile')
 
             if not user_response.data:
                 messages.error(request, 'User not found.')
@@ -2963,9 +3520,9 @@ class AdvancedReportsView(View):
             messages.error(request, 'Server configuration error. Please contact administrator.')
             return redirect('home')
         except Exception as e:
-            error_msg = str(e).lower()
-            if 'disconnect' in error_msg or 'connection' in error_msg or 'timeout' in error_msg or 'network' in error_msg:
-                messages.error(request, 'Connection error. Please refresh the page and try again.')
+            # Transient errors were already retried, so the database is degraded right now
+            if is_unavailable(e):
+                messages.error(request, 'The parking database is temporarily unavailable. Please try again in a moment.')
             else:
                 messages.error(request, f'Error loading user: {str(e)}')
             return redirect('home')
@@ -2986,64 +3543,63 @@ class AdvancedReportsView(View):
         start_date = now - timedelta(days=days_back)
 
         # Fetch parking lots for filter dropdown
-        try:
-            lots_resp = supabase.table('parking_lot').select('id, name, code').order('code').execute()
-            parking_lots = lots_resp.data or []
-        except Exception:
-            parking_lots = []
+        def load_parking_lots():
+            return get_lots()
 
         # Fetch parking sessions data with optimized limit for performance
         # Reduced from 5000 to 2000 to prevent timeouts and connection issues
         # Charts use all data, table shows first 100
         MAX_ENTRIES = 2000
-        entry_records = []
-        
-        try:
+
+        def load_entry_records():
             # Apply vehicle search filter early if provided to reduce data processing
             if vehicle_search:
                 # First, find matching vehicles
                 try:
-                    vehicle_search_resp = supabase.table('vehicle').select('id').ilike('plate', f'%{vehicle_search}%').limit(1000).execute()
+                    vehicle_search_resp = run_query(
+                        supabase.table('vehicle').select('id').ilike('plate', f'%{vehicle_search}%').limit(1000),
+                        'reports.vehicle_search',
+                    )
                     matching_vehicle_ids = [v['id'] for v in (vehicle_search_resp.data or [])]
                     if not matching_vehicle_ids:
                         # No matching vehicles, skip entry fetch
-                        entry_records = []
-                    else:
-                        # Fetch entries only for matching vehicles
-                        entries_query = supabase.table('entries_exits').select(
-                            'id, time, vehicle_id, action, lot_id'
-                        ).eq('action', 'entry').gte('time', start_date.isoformat()).in_('vehicle_id', matching_vehicle_ids).order('time', desc=True).limit(MAX_ENTRIES)
-                        
-                        if selected_lot:
-                            entries_query = entries_query.eq('lot_id', int(selected_lot))
-                        
-                        entries_response = entries_query.execute()
-                        entry_records = entries_response.data or []
-                except Exception as ve:
-                    # If vehicle search fails, fall back to regular query
+                        return []
+                    # Fetch entries only for matching vehicles
                     entries_query = supabase.table('entries_exits').select(
                         'id, time, vehicle_id, action, lot_id'
-                    ).eq('action', 'entry').gte('time', start_date.isoformat()).order('time', desc=True).limit(MAX_ENTRIES)
+                    ).eq('action', 'entry').gte('time', start_date.isoformat()).in_('vehicle_id', matching_vehicle_ids).order('time', desc=True).limit(MAX_ENTRIES)
                     
                     if selected_lot:
                         entries_query = entries_query.eq('lot_id', int(selected_lot))
                     
-                    entries_response = entries_query.execute()
-                    entry_records = entries_response.data or []
-            else:
-                # No vehicle search, fetch normally
-                entries_query = supabase.table('entries_exits').select(
-                    'id, time, vehicle_id, action, lot_id'
-                ).eq('action', 'entry').gte('time', start_date.isoformat()).order('time', desc=True).limit(MAX_ENTRIES)
-                
-                if selected_lot:
-                    entries_query = entries_query.eq('lot_id', int(selected_lot))
-                
-                entries_response = entries_query.execute()
-                entry_records = entries_response.data or []
-        except Exception as e:
-            error_msg = str(e).lower()
-            if 'timeout' in error_msg or 'connection' in error_msg or 'network' in error_msg:
+                    entries_response = run_query(entries_query, 'reports.entries')
+                    return entries_response.data or []
+                except Exception as ve:
+                    # If vehicle search fails, fall back to regular query
+                    pass
+
+            # No vehicle search (or it failed), fetch normally
+            entries_query = supabase.table('entries_exits').select(
+                'id, time, vehicle_id, action, lot_id'
+            ).eq('action', 'entry').gte('time', start_date.isoformat()).order('time', desc=True).limit(MAX_ENTRIES)
+            
+            if selected_lot:
+                entries_query = entries_query.eq('lot_id', int(selected_lot))
+            
+            entries_response = run_query(entries_query, 'reports.entries')
+            return entries_response.data or []
+
+        # The dropdown lots and the entries don't depend on each other - fetch concurrently
+        results = fan_out(
+            {'parking_lots': load_parking_lots, 'entries': load_entry_records},
+            defaults={'parking_lots': [], 'entries': []},
+        )
+        parking_lots = results['parking_lots']
+        entry_records = results['entries']
+
+        if 'entries' in results.errors:
+            e = results.errors['entries']
+            if is_unavailable(e):
                 messages.error(request, 'Database connection timeout. Please try again with a shorter date range.')
             else:
                 messages.error(request, f'Error loading parking data: {str(e)}')
@@ -3082,160 +3638,80 @@ class AdvancedReportsView(View):
             }
             return render(request, 'advanced_reports.html', context)
 
-        # Fetch vehicle data - optimized batch query
+        # Vehicle plates, lot names and exit records all depend only on the entries,
+        # so every chunked query below is fetched concurrently in one fan-out.
         vehicle_ids = list(set([e['vehicle_id'] for e in entry_records if e.get('vehicle_id')]))
+        lot_ids = list(set([e['lot_id'] for e in entry_records if e.get('lot_id')]))
+        chunk_size = 500  # Supabase IN clause limit
+
+        def load_vehicle_chunk(chunk):
+            vehicles_query = supabase.table('vehicle').select('id, plate').in_('id', chunk)
+            if vehicle_search:
+                vehicles_query = vehicles_query.ilike('plate', f'%{vehicle_search}%')
+            vehicles_response = run_query(vehicles_query, 'reports.vehicles')
+            return {v['id']: v.get('plate', '') for v in (vehicles_response.data or [])}
+
+        def load_exit_chunk(chunk):
+            exits_query = supabase.table('entries_exits').select(
+                'vehicle_id, time, action'
+            ).eq('action', 'exit').in_('vehicle_id', chunk).gte('time', start_date.isoformat()).order('time')
+            
+            if selected_lot:
+                exits_query = exits_query.eq('lot_id', int(selected_lot))
+            
+            exits_response = run_query(exits_query, 'reports.exits')
+            return exits_response.data or []
+
+        def load_lots_map():
+            # Reference cache - no query unless the lots were invalidated
+            return get_lot_names(lot_ids)
+
+        queries = {}
+        vehicle_chunks = [vehicle_ids[i:i + chunk_size] for i in range(0, len(vehicle_ids), chunk_size)]
+        for index, chunk in enumerate(vehicle_chunks):
+            queries[f'vehicles:{index}'] = lambda chunk=chunk: load_vehicle_chunk(chunk)
+            # OPTIMIZATION: Batch fetch all exit records for the entries (no N+1 queries)
+            queries[f'exits:{index}'] = lambda chunk=chunk: load_exit_chunk(chunk)
+        if lot_ids:
+            queries['lots_map'] = load_lots_map
+        results = fan_out(queries)
+
+        # Fetch vehicle data - optimized batch query
         vehicles_map = {}
         if vehicle_ids:
-            try:
-                # Batch fetch vehicles in chunks to avoid query size limits
-                vehicles_map = {}
-                chunk_size = 500  # Supabase IN clause limit
-                for i in range(0, len(vehicle_ids), chunk_size):
-                    chunk = vehicle_ids[i:i + chunk_size]
-                    vehicles_query = supabase.table('vehicle').select('id, plate').in_('id', chunk)
-                    if vehicle_search:
-                        vehicles_query = vehicles_query.ilike('plate', f'%{vehicle_search}%')
-                    vehicles_response = vehicles_query.execute()
-                    chunk_map = {v['id']: v.get('plate', '') for v in (vehicles_response.data or [])}
-                    vehicles_map.update(chunk_map)
-            except Exception as e:
+            if not any(key.startswith('vehicles:') for key in results.errors):
+                for index in range(len(vehicle_chunks)):
+                    vehicles_map.update(results[f'vehicles:{index}'])
+            else:
                 # If batch fails, try single query
                 try:
-                    vehicles_query = supabase.table('vehicle').select('id, plate').in_('id', vehicle_ids[:500])
-                    if vehicle_search:
-                        vehicles_query = vehicles_query.ilike('plate', f'%{vehicle_search}%')
-                    vehicles_response = vehicles_query.execute()
-                    vehicles_map = {v['id']: v.get('plate', '') for v in (vehicles_response.data or [])}
+                    vehicles_map = load_vehicle_chunk(vehicle_ids[:500])
                 except Exception:
                     vehicles_map = {}
 
         # Fetch lots mapping - optimized
-        lot_ids = list(set([e['lot_id'] for e in entry_records if e.get('lot_id')]))
-        lots_map = {}
-        if lot_ids:
-            try:
-                # Fetch all lots at once (usually small number)
-                lots_data = supabase.table('parking_lot').select('id, name').in_('id', lot_ids).execute()
-                lots_map = {l['id']: l.get('name', '') for l in (lots_data.data or [])}
-            except Exception as e:
-                # If fetch fails, continue with empty map (will show 'Unknown')
-                lots_map = {}
+        # If fetch fails, continue with empty map (will show 'Unknown')
+        lots_map = results.get('lots_map') or {}
 
-        # OPTIMIZATION: Batch fetch all exit records for the entries in one query
-        # This eliminates N+1 query problem
         vehicle_exits = {}  # Maps vehicle_id -> list of exit times
-        if entry_records and vehicle_ids:
-            try:
-                # Batch fetch exits in chunks to avoid query size limits
-                exit_records = []
-                chunk_size = 500  # Supabase IN clause limit
-                for i in range(0, len(vehicle_ids), chunk_size):
-                    chunk = vehicle_ids[i:i + chunk_size]
-                    exits_query = supabase.table('entries_exits').select(
-                        'vehicle_id, time, action'
-                    ).eq('action', 'exit').in_('vehicle_id', chunk).gte('time', start_date.isoformat()).order('time')
-                    
-                    if selected_lot:
-                        exits_query = exits_query.eq('lot_id', int(selected_lot))
-                    
-                    exits_response = exits_query.execute()
-                    exit_records.extend(exits_response.data or [])
-                
-                # Group exits by vehicle_id and find the first exit after each entry
-                # Create a sorted list of exits per vehicle for efficient lookup
-                vehicle_exits = defaultdict(list)
-                for exit_rec in exit_records:
+        if entry_records and vehicle_ids and not any(key.startswith('exits:') for key in results.errors):
+            # Group exits by vehicle_id and find the first exit after each entry
+            # Create a sorted list of exits per vehicle for efficient lookup
+            vehicle_exits = defaultdict(list)
+            for index in range(len(vehicle_chunks)):
+                for exit_rec in results[f'exits:{index}']:
                     vid = exit_rec.get('vehicle_id')
                     if vid:
                         vehicle_exits[vid].append(exit_rec.get('time'))
-                
-                # Sort exits per vehicle for binary search
-                for vid in vehicle_exits:
-                    vehicle_exits[vid].sort()
-            except Exception as e:
-                # If batch fetch fails, continue without exits (sessions will show as Active)
-                vehicle_exits = {}
-        else:
-            vehicle_exits = {}
-
-        # Build sessions with exit data - optimized single loop
-        parking_logs = []
-        total_duration_minutes = 0
-        completed_count = 0
-
-        # Process entries and find matching exits efficiently
-        for entry in entry_records:
-            vehicle_id = entry.get('vehicle_id')
-            lot_id = entry.get('lot_id')
-            entry_time = entry.get('time')
-
-            if vehicle_search and vehicle_id not in vehicles_map:
-                continue
-
-            plate_number = vehicles_map.get(vehicle_id, 'Unknown')
-            lot_name_value = lots_map.get(lot_id, 'Unknown')
-
-            # Find exit using pre-fetched data (optimized binary search)
-            exit_time = None
-            if vehicle_id in vehicle_exits and vehicle_exits[vehicle_id]:
-                # Use binary search for O(log n) instead of O(n) linear search
-                exits_list = vehicle_exits[vehicle_id]
-                left, right = 0, len(exits_list) - 1
-                while left <= right:
-                    mid = (left + right) // 2
-                    if exits_list[mid] < entry_time:
-                        left = mid + 1
-                    else:
-                        exit_time = exits_list[mid]
-                        right = mid - 1
-
-            status = 'Completed' if exit_time else 'Active'
-            status_class = 'completed' if exit_time else 'active'
-            duration = calculate_duration(entry_time, exit_time)
-
-            # Convert ISO strings to datetime objects for template rendering
-            entry_dt = None
-            exit_dt = None
-            try:
-                if entry_time:
-                    entry_clean = entry_time.replace('Z', '+00:00')
-                    entry_dt = datetime.fromisoformat(entry_clean)
-                    if entry_dt.tzinfo is None:
-                        entry_dt = entry_dt.replace(tzinfo=dt_timezone.utc)
-                    # Convert to local timezone
-                    entry_dt = timezone.localtime(entry_dt)
-            except Exception:
-                pass
             
-            try:
-                if exit_time:
-                    exit_clean = exit_time.replace('Z', '+00:00')
-                    exit_dt = datetime.fromisoformat(exit_clean)
-                    if exit_dt.tzinfo is None:
-                        exit_dt = exit_dt.replace(tzinfo=dt_timezone.utc)
-                    # Convert to local timezone
-                    exit_dt = timezone.localtime(exit_dt)
-            except Exception:
-                pass
-
-            # Track stats
-            if exit_time and entry_dt and exit_dt:
-                completed_count += 1
-                try:
-                    total_duration_minutes += (exit_dt - entry_dt).total_seconds() / 60
-                except Exception:
-                    pass
+            # Sort exits per vehicle for binary search
+            for vid in vehicle_exits:
+                vehicle_exits[vid].sort()
+        # If the batch fetch failed, continue without exits (sessions will show as Active)
 
-            parking_logs.append({
-                'id': entry.get('id'),
-                'vehicle_plate': plate_number,
-                'lot_name': lot_name_value,
-                'entry_time': entry_dt,  # Now a datetime object
-                'exit_time': exit_dt,  # Now a datetime object (or None)
-                'duration': duration,
-                'status': status,
-                'status_class': status_class,
-            })
+        parking_logs, completed_count, total_duration_minutes = build_report_sessions(
+            entry_records, vehicles_map, lots_map, vehicle_exits, vehicle_search
+        )
 
         # Calculate statistics
         total_sessions = len(parking_logs)
@@ -3246,61 +3722,7 @@ class AdvancedReportsView(View):
         else:
             avg_duration = f"{int(avg_duration_minutes)}m"
 
-        # OPTIMIZATION: Process all chart data in a single loop instead of multiple loops
-        # Limit processing to improve performance
-        monthly_data = defaultdict(int)
-        daily_data = defaultdict(int)
-        hourly_data = defaultdict(int)
-        lot_usage = defaultdict(int)
-        
-        # Process logs for charts (limit to prevent excessive processing)
-        chart_logs = parking_logs[:1000] if len(parking_logs) > 1000 else parking_logs
-        
-        for log in chart_logs:
-            try:
-                # entry_time is now a datetime object (or None), not a string
-                entry_dt = log.get('entry_time')
-                if not entry_dt:
-                    continue  # Skip if no entry time
-                
-                # entry_dt is already a datetime object, use it directly
-                # Monthly data
-                month_key = entry_dt.strftime('%b %Y')
-                monthly_data[month_key] += 1
-                
-                # Daily data - limit to last 60 days for performance
-                day_key = entry_dt.strftime('%b %d')
-                daily_data[day_key] += 1
-                
-                # Hourly data
-                hour = entry_dt.hour
-                hourly_data[hour] += 1
-                
-                # Lot usage
-                lot_usage[log['lot_name']] += 1
-            except Exception:
-                pass
-
-        # Sort by date and prepare for chart
-        sorted_months = sorted(monthly_data.items(), 
-                               key=lambda x: datetime.strptime(x[0], '%b %Y'))
-        monthly_labels = [m[0] for m in sorted_months[-12:]]  # Last 12 months
-        monthly_usage = [m[1] for m in sorted_months[-12:]]
-        
-        # Limit daily data to last 30 days for performance
-        sorted_daily = sorted(daily_data.items(), 
-                             key=lambda x: datetime.strptime(x[0], '%b %d'))
-        daily_labels_limited = [d[0] for d in sorted_daily[-30:]]
-        daily_usage_limited = [d[1] for d in sorted_daily[-30:]]
-
-        # Peak hours analysis
-        peak_hours = sorted(hourly_data.items(), key=lambda x: x[1], reverse=True)[:5]
-        peak_hour_labels = [f"{h[0]:02d}:00" for h in peak_hours]
-        peak_hour_values = [h[1] for h in peak_hours]
-
-        # Lot usage breakdown
-        lot_labels = list(lot_usage.keys())
-        lot_values = list(lot_usage.values())
+        charts = build_report_charts(parking_logs)
 
         import json
 
@@ -3323,14 +3745,14 @@ class AdvancedReportsView(View):
             # Data - limit table display to 50 for better performance
             'parking_logs': parking_logs[:50],  # Limit for display (reduced from 100)
             # Chart data (JSON encoded)
-            'monthly_labels': json.dumps(monthly_labels if monthly_labels else ['No Data']),
-            'monthly_usage': json.dumps(monthly_usage if monthly_usage else [0]),
-            'daily_labels': json.dumps(daily_labels_limited if daily_labels_limited else []),
-            'daily_usage': json.dumps(daily_usage_limited if daily_usage_limited else []),
-            'peak_hour_labels': json.dumps(peak_hour_labels if peak_hour_labels else ['No Data']),
-            'peak_hour_values': json.dumps(peak_hour_values if peak_hour_values else [0]),
-            'lot_labels': json.dumps(lot_labels if lot_labels else ['No Data']),
-            'lot_values': json.dumps(lot_values if lot_values else [0]),
+            'monthly_labels': json.dumps(charts['monthly_labels'] or ['No Data']),
+            'monthly_usage': json.dumps(charts['monthly_usage'] or [0]),
+            'daily_labels': json.dumps(charts['daily_labels']),
+            'daily_usage': json.dumps(charts['daily_usage']),
+            'peak_hour_labels': json.dumps(charts['peak_hour_labels'] or ['No Data']),
+            'peak_hour_values': json.dumps(charts['peak_hour_values'] or [0]),
+            'lot_labels': json.dumps(charts['lot_labels'] or ['No Data']),
+            'lot_values': json.dumps(charts['lot_values'] or [0]),
         }
 
         return render(request, 'advanced_reports.html', context)
@@ -3416,8 +3838,7 @@ def export_parking_csv(request):
         lot_ids = list(set([e['lot_id'] for e in entry_records if e.get('lot_id')]))
         lots_map = {}
         if lot_ids:
-            lots_data = supabase.table('parking_lot').select('id, name').in_('id', lot_ids).execute()
-            lots_map = {l['id']: l.get('name', '') for l in (lots_data.data or [])}
+            lots_map = get_lot_names(lot_ids)
 
         # Build CSV data
         csv_data = []
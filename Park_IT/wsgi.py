@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Park_IT.settings')
 
 application = get_wsgi_application()
+
+# Serving process: send the history rows an earlier run left in the journal
+from utils import history_outbox  # noqa: E402
+
+history_outbox.start()
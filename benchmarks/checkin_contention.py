@@ -0,0 +1,137 @@
+"""
+Stress test: concurrent check-ins and check-outs of the same slots.
+
+Seeds one lot in the in-memory backend (SUPABASE_BACKEND=local) and, for every
+slot, releases --contenders threads at once that each try to check a different
+vehicle in through views.handle_check_in; then the same for check-out. Checks:
+
+    - exactly one check-in (and one check-out) per slot succeeds; the others get
+      409, or 400 when they read the slot after the winner's write
+    - the slot holds the winner's plate
+    - one entry and one exit row per slot in entries_exits (no double occupancy)
+
+Exits non-zero if any check fails.
+
+Usage:
+    python -m benchmarks.checkin_contention --slots 20 --contenders 8 --latency-ms 5
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def _setup(latency_ms):
+    os.environ['SUPABASE_BACKEND'] = 'local'
+    os.environ['SUPABASE_LOCAL_LATENCY_MS'] = str(latency_ms)
+    os.environ['HISTORY_OUTBOX_PATH'] = os.path.join(tempfile.mkdtemp(), 'history_outbox.sqlite3')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Park_IT.settings')
+    import django
+    django.setup()
+
+
+def _seed(store, slot_count):
+    lot = store.insert('parking_lot', {'code': 'STRESS', 'name': 'Stress Lot', 'capacity': slot_count})[0]
+    rows = [{'lot_id': lot['id'], 'slot_number': number, 'status': 'available'} for number in range(1, slot_count + 1)]
+    return lot['id'], [row['id'] for row in store.insert('parking_slot', rows)]
+
+
+def _race(view, slot_ids, contenders, body_for):
+    """Call view for every (slot, contender) at once; {slot_id: [(contender, status code)]}."""
+    from django.test import RequestFactory
+
+    factory = RequestFactory()
+    barrier = threading.Barrier(len(slot_ids) * contenders)
+
+    def attempt(slot_id, contender):
+        request = factory.post('/', data=json.dumps(body_for(slot_id, contender)), content_type='application/json')
+        request.session = {'access_token': 'stress'}
+        barrier.wait()
+        return slot_id, contender, view(request, slot_id).status_code
+
+    outcomes = defaultdict(list)
+    with ThreadPoolExecutor(max_workers=len(slot_ids) * contenders) as pool:
+        futures = [pool.submit(attempt, slot_id, contender) for slot_id in slot_ids for contender in range(contenders)]
+        for future in futures:
+            slot_id, contender, status = future.result()
+            outcomes[slot_id].append((contender, status))
+    return outcomes
+
+
+def _plate(slot_id, contender):
+    return f'S{slot_id}C{contender}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--slots', type=int, default=20)
+    parser.add_argument('--contenders', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    _setup(args.latency_ms)
+    from Park_IT import views
+    from utils.history_outbox import get_outbox
+    from utils.supabase_client import get_client
+
+    store = get_client().store
+    lot_id, slot_ids = _seed(store, args.slots)
+    failures = []
+
+    started = time.perf_counter()
+    check_ins = _race(views.handle_check_in, slot_ids, args.contenders,
+                      lambda slot_id, contender: {'license_plate': _plate(slot_id, contender)})
+    check_in_seconds = time.perf_counter() - started
+
+    for slot_id, results in check_ins.items():
+        winners = [contender for contender, status in results if status == 200]
+        losers = Counter(status for _, status in results if status != 200)
+        if len(winners) != 1 or set(losers) - {400, 409}:
+            failures.append(f'check-in slot {slot_id}: {len(winners)} succeeded, others {dict(losers)}')
+            continue
+        slot = store.tables['parking_slot'][slot_id]
+        if slot['status'] != 'occupied' or slot['license_plate'] != _plate(slot_id, winners[0]):
+            failures.append(f"check-in slot {slot_id}: holds {slot['license_plate']!r}, winner was contender {winners[0]}")
+
+    started = time.perf_counter()
+    check_outs = _race(views.handle_check_out, slot_ids, args.contenders, lambda slot_id, contender: {})
+    check_out_seconds = time.perf_counter() - started
+
+    for slot_id, results in check_outs.items():
+        winners = sum(status == 200 for _, status in results)
+        if winners != 1:
+            failures.append(f'check-out slot {slot_id}: {winners} succeeded')
+        if store.tables['parking_slot'][slot_id]['status'] != 'available':
+            failures.append(f'check-out slot {slot_id}: still {store.tables["parking_slot"][slot_id]["status"]}')
+
+    outbox = get_outbox()
+    if outbox is not None and not outbox.flush():
+        failures.append(f'history outbox: {outbox.pending()[0]} rows not delivered')
+    actions = Counter(
+        row['action'] for row in store.tables['entries_exits'].values() if row.get('lot_id') == lot_id
+    )
+    if actions['entry'] != len(slot_ids) or actions['exit'] != len(slot_ids):
+        failures.append(f"history: {actions['entry']} entries and {actions['exit']} exits for {len(slot_ids)} slots")
+
+    attempts = len(slot_ids) * args.contenders
+    print(f'{len(slot_ids)} slots x {args.contenders} contenders ({attempts} requests per phase)')
+    print(f'  check-in   {check_in_seconds:6.2f}s')
+    print(f'  check-out  {check_out_seconds:6.2f}s')
+    if failures:
+        print(f'FAILED ({len(failures)}):')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print('OK: one check-in and one check-out per slot, no double occupancy')
+
+
+if __name__ == '__main__':
+    main()
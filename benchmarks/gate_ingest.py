@@ -0,0 +1,118 @@
+"""
+Throughput benchmark: gate camera events ingested one by one vs in batches.
+
+Seeds the in-memory backend (SUPABASE_BACKEND=local, --latency-ms per round
+trip) with lots and slots, generates a stream of ANPR reads (entries then
+exits, each read repeated 1-3 times as cameras do) and feeds it to
+utils.gate_events.ingest:
+
+    single    one event per call, like a camera calling the API per read
+    batch N   N events per call, like POST /api/gate-events/
+
+and reports events/sec including the history outbox flush.
+
+Usage:
+    python -m benchmarks.gate_ingest --events 5000 --batch 100 1000 --latency-ms 20
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+LOT_CODES = ('NGE', 'RTL', 'SCI', 'LIB')
+
+
+def make_events(count, slots_per_lot, seed=7):
+    """count reads: vehicles entering a free slot, some later leaving, with repeated reads."""
+    rng = random.Random(seed)
+    start = datetime(2025, 5, 1, 7, 0, tzinfo=timezone.utc)
+    events, parked, vehicle = [], {}, 0
+    clock = start
+    while len(events) < count:
+        clock += timedelta(seconds=rng.uniform(0.5, 3))
+        if parked and rng.random() < 0.4:
+            key = rng.choice(list(parked))
+            plate = parked.pop(key)
+            event = {'plate': plate, 'lot_code': key[0], 'slot': key[1], 'action': 'exit'}
+        else:
+            lot_code = rng.choice(LOT_CODES)
+            slot = rng.randint(1, slots_per_lot)
+            if (lot_code, slot) in parked:
+                continue
+            vehicle += 1
+            plate = f'GT{vehicle:05d}'
+            parked[(lot_code, slot)] = plate
+            event = {'plate': plate, 'lot_code': lot_code, 'slot': slot, 'action': 'entry'}
+        for repeat in range(rng.randint(1, 3)):
+            events.append(dict(event, timestamp=(clock + timedelta(milliseconds=200 * repeat)).isoformat()))
+    return events[:count]
+
+
+def fresh_backend(slots_per_lot, latency_ms):
+    from utils import history_outbox, supabase_client
+    from utils.local_backend import create_local_client
+    from utils.reference_cache import lots_cache
+
+    client = create_local_client(latency_ms=latency_ms, jitter=0)
+    supabase_client._supabase_client = client
+    lots = client.store.insert('parking_lot', [
+        {'code': code, 'name': code, 'capacity': slots_per_lot} for code in LOT_CODES
+    ])
+    client.store.insert('parking_slot', [
+        {'lot_id': lot['id'], 'slot_number': number} for lot in lots for number in range(1, slots_per_lot + 1)
+    ])
+    lots_cache.invalidate()
+    history_outbox._outbox = history_outbox.HistoryOutbox(os.path.join(tempfile.mkdtemp(), 'outbox.sqlite3'))
+    return client.store
+
+
+def run(name, events, batch_size, slots_per_lot, latency_ms):
+    from utils import gate_events, history_outbox
+
+    store = fresh_backend(slots_per_lot, latency_ms)
+    gate_events._recent_reads.clear()
+    gate_events.ingest(events[:1])  # warm the lot cache
+    history_outbox.get_outbox().flush()
+    store.tables['entries_exits'].clear()
+
+    started = time.perf_counter()
+    accepted = 0
+    for start in range(1, len(events), batch_size):
+        accepted += gate_events.ingest(events[start:start + batch_size])['accepted']
+    ingest_seconds = time.perf_counter() - started
+    history_outbox.get_outbox().flush(timeout=120)
+    total_seconds = time.perf_counter() - started
+
+    events_count = len(events) - 1
+    print(
+        f'  {name:<10} {events_count / ingest_seconds:9.0f} events/s '
+        f'({events_count / total_seconds:9.0f} incl. history flush), '
+        f'{accepted} kept, {len(store.tables["entries_exits"])} history rows'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--batch', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--slots', type=int, default=500, help='slots per lot')
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--single', type=int, default=200, help='events for the one-by-one run')
+    args = parser.parse_args()
+
+    os.environ['SUPABASE_BACKEND'] = 'local'
+    events = make_events(args.events, args.slots)
+    print(f'{args.events} reads over {len(LOT_CODES)} lots x {args.slots} slots, {args.latency_ms}ms per round trip')
+    run('single', events[:args.single + 1], 1, args.slots, args.latency_ms)
+    for batch_size in args.batch:
+        run(f'batch {batch_size}', events, batch_size, args.slots, args.latency_ms)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+"""
+Micro-benchmarks of the pure-Python hot paths of the views, with baselines.
+
+Times, on synthetic rows from fixed seeds (so every run sees the same data):
+
+    calculate_duration      one call per finished session
+    summarize_lot_status    occupancy bars from parking_slot rows (50 lots)
+    build_lot_display       slot grid of the first lot + per-lot totals
+    occupancy_display       the same from a warm occupancy engine (build_occupancy_display),
+                            as the parking-spaces views serve it
+    engine_updates          one check-in/out per slot through the engine
+    group_rows              parking_slot rows into per-lot LotSnapshots (an engine load)
+    lot_snapshot            totals and slot dicts of every LotSnapshot
+    dashboard_weekly        DashboardView's weekly peak bucketing (weekly_peak_counts)
+    reports_aggregation     AdvancedReportsView's session pairing and chart series
+                            (build_report_sessions + build_report_charts)
+
+at each --sizes row count (default 100 to 100k; add 1000000 for the 1M run,
+which needs a few GB of memory). Each case is timed with timeit: enough loops
+for a repeat to take ~0.2s, --repeat repeats, and the best repeat is kept, as
+the other repeats only add noise from the machine.
+
+    run      time the cases; --output writes the results as JSON (a baseline),
+             --baseline compares with one right away
+    compare  compare two result files; exits 1 when a case got slower than the
+             baseline by more than --threshold percent
+
+Baselines are only comparable on the same machine and Python; compare warns
+when the environments differ.
+
+Usage:
+    python -m benchmarks.hot_paths run --output benchmarks/baselines/main.json
+    python -m benchmarks.hot_paths run --baseline benchmarks/baselines/main.json --threshold 10
+    python -m benchmarks.hot_paths run --sizes 100 1000000 --cases reports_aggregation
+    python -m benchmarks.hot_paths compare benchmarks/baselines/main.json current.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.slot_snapshot import make_rows  # noqa: E402
+from utils.occupancy import OccupancyEngine  # noqa: E402
+from utils.slot_snapshot import FILLED_STATUSES, group_rows  # noqa: E402
+
+DEFAULT_SIZES = (100, 1_000, 10_000, 100_000)
+LOT_COUNT = 50
+MIN_REPEAT_SECONDS = 0.2
+DEFAULT_THRESHOLD = 10.0
+START = datetime(2025, 5, 1, tzinfo=timezone.utc)
+
+
+def _setup():
+    # The views read the time zone and settings through Django
+    os.environ.setdefault('SUPABASE_BACKEND', 'local')
+    os.environ.setdefault('HISTORY_OUTBOX_PATH', os.path.join(tempfile.mkdtemp(), 'history_outbox.sqlite3'))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Park_IT.settings')
+    import django
+    django.setup()
+
+
+# -- synthetic data -------------------------------------------------------------
+
+def make_lots(count=LOT_COUNT):
+    return [
+        {'id': lot_id, 'code': f'L{lot_id:03d}', 'name': f'Lot {lot_id}', 'capacity': 200}
+        for lot_id in range(1, count + 1)
+    ]
+
+
+def _iso(moment, rng):
+    # PostgREST returns both spellings of UTC
+    text = moment.isoformat()
+    return text.replace('+00:00', 'Z') if rng.random() < 0.5 else text
+
+
+def make_sessions(count, days=30, seed=3):
+    """count entry rows over `days` (newest first, as the queries order them) and
+    the exits of ~80% of them, as entries_exits rows."""
+    rng = random.Random(seed)
+    vehicles = max(1, count // 4)
+    entries, exits = [], []
+    for entry_id in range(1, count + 1):
+        vehicle_id = rng.randint(1, vehicles)
+        lot_id = rng.randint(1, LOT_COUNT)
+        entered = START + timedelta(seconds=rng.uniform(0, days * 86400))
+        entries.append({'id': entry_id, 'time': _iso(entered, rng), 'vehicle_id': vehicle_id,
+                        'action': 'entry', 'lot_id': lot_id})
+        if rng.random() < 0.8:
+            left = entered + timedelta(minutes=rng.uniform(10, 600))
+            exits.append({'vehicle_id': vehicle_id, 'time': _iso(left, rng), 'action': 'exit', 'lot_id': lot_id})
+    entries.sort(key=lambda row: row['time'], reverse=True)
+    return entries, exits
+
+
+# -- cases: size -> zero-argument callable over `size` rows ------------------------
+
+def case_calculate_duration(views, size):
+    rng = random.Random(5)
+    pairs = []
+    for _ in range(size):
+        entered = START + timedelta(seconds=rng.uniform(0, 30 * 86400))
+        left = entered + timedelta(minutes=rng.uniform(10, 600)) if rng.random() < 0.8 else None
+        pairs.append((_iso(entered, rng), _iso(left, rng) if left else None))
+    calculate_duration = views.calculate_duration
+
+    def run():
+        for entry_time, exit_time in pairs:
+            calculate_duration(entry_time, exit_time)
+    return run
+
+
+def case_summarize_lot_status(views, size):
+    lots, slots = make_lots(), make_rows(size, LOT_COUNT)
+    return lambda: views.summarize_lot_status(lots, slots)
+
+
+def case_build_lot_display(views, size):
+    lots, slots = make_lots(), make_rows(size, LOT_COUNT)
+    return lambda: views.build_lot_display(lots, slots)
+
+
+def _warm_engine(views, slots):
+    """Point the views at an engine holding `slots`, loaded as in a worker that already served them."""
+    slots_by_lot = defaultdict(list)
+    for row in slots:
+        slots_by_lot[row['lot_id']].append(row)
+    counts = {
+        lot_id: (len(rows), sum(row['status'] in FILLED_STATUSES for row in rows))
+        for lot_id, rows in slots_by_lot.items()
+    }
+    # Never stale and no shared cache: only the in-memory path is timed
+    engine = OccupancyEngine(
+        lambda lot_id: slots_by_lot.get(lot_id, []), lambda: counts,
+        reconcile_seconds=float('inf'), shared_cache=lambda: None,
+    )
+    views.occupancy = engine
+    for lot_id in slots_by_lot:
+        engine.ensure_lot(lot_id)
+    return engine
+
+
+def case_occupancy_display(views, size):
+    lots = make_lots()
+    _warm_engine(views, make_rows(size, LOT_COUNT))
+    return lambda: views.build_occupancy_display(lots)
+
+
+def case_engine_updates(views, size):
+    slots = make_rows(size, LOT_COUNT)
+    engine = _warm_engine(views, slots)
+
+    def run():
+        for row in slots:
+            if row['status'] == 'occupied':
+                engine.check_out(row['id'], row['lot_id'])
+            else:
+                engine.check_in(row['id'], 'SG0000001', '2025-05-01T08:00:00+00:00', row['lot_id'])
+    return run
+
+
+def case_group_rows(views, size):
+    slots = make_rows(size, LOT_COUNT)
+    return lambda: group_rows(slots)
+
+
+def case_lot_snapshot(views, size):
+    snapshots = group_rows(make_rows(size, LOT_COUNT))
+
+    def run():
+        return [(snapshot.total, snapshot.filled, list(snapshot.iter_slots())) for snapshot in snapshots.values()]
+    return run
+
+
+def case_dashboard_weekly(views, size):
+    entries, _ = make_sessions(size, days=7)
+    return lambda: views.weekly_peak_counts(entries)
+
+
+def case_reports_aggregation(views, size):
+    entries, exits = make_sessions(size)
+    vehicles_map = {vehicle_id: f'SG{vehicle_id:06d}' for vehicle_id in {row['vehicle_id'] for row in entries}}
+    lots_map = {lot['id']: lot['name'] for lot in make_lots()}
+    vehicle_exits = defaultdict(list)
+    for row in exits:
+        vehicle_exits[row['vehicle_id']].append(row['time'])
+    for times in vehicle_exits.values():
+        times.sort()
+
+    def run():
+        parking_logs, _, _ = views.build_report_sessions(entries, vehicles_map, lots_map, vehicle_exits)
+        views.build_report_charts(parking_logs)
+    return run
+
+
+CASES = {
+    'calculate_duration': case_calculate_duration,
+    'summarize_lot_status': case_summarize_lot_status,
+    'build_lot_display': case_build_lot_display,
+    'occupancy_display': case_occupancy_display,
+    'engine_updates': case_engine_updates,
+    'group_rows': case_group_rows,
+    'lot_snapshot': case_lot_snapshot,
+    'dashboard_weekly': case_dashboard_weekly,
+    'reports_aggregation': case_reports_aggregation,
+}
+
+
+# -- timing and comparison --------------------------------------------------------
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'system': platform.system(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def measure(func, repeat):
+    timer = timeit.Timer(func)
+    loops, total = timer.autorange()
+    if total < MIN_REPEAT_SECONDS:
+        loops = max(loops, int(loops * MIN_REPEAT_SECONDS / max(total, 1e-9)))
+    samples = sorted(seconds / loops for seconds in timer.repeat(repeat=repeat, number=loops))
+    return {'best_s': samples[0], 'median_s': samples[len(samples) // 2], 'loops': loops, 'repeat': repeat}
+
+
+def run(cases, sizes, repeat):
+    _setup()
+    from Park_IT import views
+
+    results = {}
+    for name in cases:
+        for size in sizes:
+            timing = measure(CASES[name](views, size), repeat)
+            timing['per_row_ns'] = round(timing['best_s'] / size * 1e9, 1)
+            results.setdefault(name, {})[str(size)] = timing
+            print(f'{name:<22} {size:>9} rows  best {timing["best_s"] * 1000:10.3f}ms  '
+                  f'median {timing["median_s"] * 1000:10.3f}ms  {timing["per_row_ns"]:9.1f}ns/row', flush=True)
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': environment(),
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Print the change of every case in both files; returns the regressions."""
+    if baseline.get('environment') != current.get('environment'):
+        print('warning: the results come from different environments; the comparison may not mean much')
+    regressions = []
+    print(f'{"case":<22} {"rows":>9} {"baseline":>12} {"current":>12} {"change":>8}')
+    for name, sizes in current['results'].items():
+        for size, timing in sizes.items():
+            before = baseline['results'].get(name, {}).get(size)
+            if before is None:
+                print(f'{name:<22} {size:>9} {"-":>12} {timing["best_s"] * 1000:10.3f}ms   (new)')
+                continue
+            change = (timing['best_s'] / before['best_s'] - 1) * 100
+            regressed = change > threshold
+            if regressed:
+                regressions.append((name, size, change))
+            print(f'{name:<22} {size:>9} {before["best_s"] * 1000:10.3f}ms {timing["best_s"] * 1000:10.3f}ms '
+                  f'{change:+7.1f}%{"  REGRESSION" if regressed else ""}')
+    return regressions
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def _finish(regressions, threshold):
+    if regressions:
+        print(f'{len(regressions)} case(s) slower than the baseline by more than {threshold:g}%')
+        sys.exit(1)
+    print(f'No case slower than the baseline by more than {threshold:g}%')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Time the cases')
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    run_parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--output', '-o', help='Write the results here (JSON)')
+    run_parser.add_argument('--baseline', help='Compare with this results file; exit 1 on a regression')
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Percent slower than the baseline that counts as a regression')
+
+    compare_parser = commands.add_parser('compare', help='Compare two results files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help='Percent slower than the baseline that counts as a regression')
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        _finish(compare(_load(args.baseline), _load(args.current), args.threshold), args.threshold)
+        return
+
+    baseline = _load(args.baseline) if args.baseline else None
+    results = run(args.cases, args.sizes, args.repeat)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(results, handle, indent=2)
+            handle.write('\n')
+        print(f'Wrote {args.output}')
+    if baseline is not None:
+        _finish(compare(baseline, results, args.threshold), args.threshold)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Micro-benchmark: list-of-dicts slot grid vs the compact LotSnapshot.
+
+Builds synthetic parking_slot rows (default 10k and 100k slots over 50 lots)
+and times, for each representation:
+
+    build   group the rows per lot (dicts: lists of row dicts; compact: group_rows)
+    grid    lot totals + the selected lot's sorted slot rows, as build_lot_display
+    counts  total/filled per lot, as the occupancy summaries
+    memory  bytes held by the grouped state (tracemalloc)
+
+No Supabase or Django needed.
+
+Usage:
+    python -m benchmarks.slot_snapshot --slots 10000 100000 --lots 50
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.slot_snapshot import FILLED_STATUSES, group_rows  # noqa: E402
+
+STATUS_WEIGHTS = (('available', 55), ('occupied', 35), ('reserved', 5), ('unavailable', 5))
+
+
+def make_rows(slot_count, lot_count, seed=1):
+    rng = random.Random(seed)
+    statuses = [status for status, weight in STATUS_WEIGHTS for _ in range(weight)]
+    rows = []
+    per_lot = -(-slot_count // lot_count)
+    for slot_id in range(1, slot_count + 1):
+        status = rng.choice(statuses)
+        occupied = status == 'occupied'
+        rows.append({
+            'id': slot_id,
+            'lot_id': (slot_id - 1) // per_lot + 1,
+            'slot_number': (slot_id - 1) % per_lot + 1,
+            'status': status,
+            'license_plate': f'ABC{slot_id:05d}' if occupied else None,
+            'check_in_time': '2025-01-01T08:00:00+00:00' if occupied else None,
+        })
+    rng.shuffle(rows)
+    return rows
+
+
+def _sort_key(slot):
+    slot_num = slot.get('slot_number')
+    if slot_num is None:
+        return (True, 0)
+    try:
+        return (False, int(slot_num))
+    except (ValueError, TypeError):
+        return (False, 0)
+
+
+# The list-of-dicts path build_lot_display used before the snapshots
+def dict_build(rows):
+    slots_by_lot = defaultdict(list)
+    for slot in rows:
+        slots_by_lot[int(slot['lot_id'])].append(slot)
+    return slots_by_lot
+
+
+def dict_grid(slots_by_lot, selected):
+    totals = {lot_id: len(slots) for lot_id, slots in slots_by_lot.items()}
+    return totals, sorted(slots_by_lot.get(selected, []), key=_sort_key)
+
+
+def dict_counts(slots_by_lot):
+    return {
+        lot_id: (len(slots), sum((slot.get('status') or 'available').lower() in FILLED_STATUSES for slot in slots))
+        for lot_id, slots in slots_by_lot.items()
+    }
+
+
+def compact_grid(snapshots, selected):
+    totals = {lot_id: snapshot.total for lot_id, snapshot in snapshots.items()}
+    snapshot = snapshots.get(selected)
+    return totals, list(snapshot.iter_slots()) if snapshot else []
+
+
+def compact_counts(snapshots):
+    return {lot_id: (snapshot.total, snapshot.filled) for lot_id, snapshot in snapshots.items()}
+
+
+def _time(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def _held_bytes(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    state = build()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return state, held
+
+
+def run(slot_count, lot_count, repeat):
+    rows = make_rows(slot_count, lot_count)
+    # Copies, so the dict path is charged for the row dicts it keeps alive
+    dict_state, dict_bytes = _held_bytes(lambda: dict_build([dict(row) for row in rows]))
+    compact_state, compact_bytes = _held_bytes(lambda: group_rows(rows))
+    assert compact_counts(compact_state) == dict_counts(dict_state)
+    assert [slot['id'] for slot in compact_grid(compact_state, 1)[1]] == [slot['id'] for slot in dict_grid(dict_state, 1)[1]]
+
+    results = (
+        ('build', _time(lambda: dict_build(rows), repeat), _time(lambda: group_rows(rows), repeat)),
+        ('grid', _time(lambda: dict_grid(dict_state, 1), repeat), _time(lambda: compact_grid(compact_state, 1), repeat)),
+        ('counts', _time(lambda: dict_counts(dict_state), repeat), _time(lambda: compact_counts(compact_state), repeat)),
+    )
+    print(f'{slot_count} slots in {lot_count} lots')
+    for name, dict_ms, compact_ms in results:
+        print(f'  {name:<7} dicts={dict_ms:8.2f}ms compact={compact_ms:8.2f}ms ({dict_ms / compact_ms:5.1f}x)')
+    print(f'  memory  dicts={dict_bytes / 1024:8.0f}KB compact={compact_bytes / 1024:8.0f}KB '
+          f'({dict_bytes / compact_bytes:5.1f}x)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--slots', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--lots', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for slot_count in args.slots:
+        run(slot_count, args.lots, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Micro-benchmark: Supabase query latency with cold vs pooled HTTP transports.
+
+Runs the same small PostgREST query (one parking_lot row) against the project in
+SUPABASE_URL using:
+
+    cold      a new httpx client per request (TCP + TLS setup every time)
+    default   one shared client with the library defaults
+    pooled    one shared client built from SUPABASE_HTTP, called sequentially
+    threaded  the pooled client called from several threads at once
+
+Usage:
+    python -m benchmarks.transport_latency --requests 50 --threads 8
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+from utils.supabase_client import build_http_client, get_transport_config  # noqa: E402
+
+
+def _credentials():
+    url = os.environ.get('SUPABASE_URL')
+    key = (
+        os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
+        or os.environ.get('SUPABASE_ANON_KEY')
+        or os.environ.get('SUPABASE_KEY')
+    )
+    if not url or not key:
+        sys.exit('SUPABASE_URL and a Supabase key must be set to run this benchmark.')
+    return url.rstrip('/') + '/rest/v1', {'apikey': key, 'Authorization': f'Bearer {key}'}
+
+
+def _query(client):
+    started = time.perf_counter()
+    response = client.get('/parking_lot', params={'select': 'id', 'limit': '1'})
+    response.raise_for_status()
+    return (time.perf_counter() - started) * 1000
+
+
+def _summary(name, samples):
+    samples = sorted(samples)
+    p95 = samples[max(0, int(len(samples) * 0.95) - 1)]
+    print(
+        f'{name:<10} n={len(samples):<4} mean={statistics.mean(samples):7.1f}ms '
+        f'p50={statistics.median(samples):7.1f}ms p95={p95:7.1f}ms'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    import httpx
+
+    base_url, headers = _credentials()
+    config = get_transport_config()
+
+    cold = []
+    for _ in range(args.requests):
+        with httpx.Client(base_url=base_url, headers=headers) as client:
+            cold.append(_query(client))
+    _summary('cold', cold)
+
+    with httpx.Client(base_url=base_url, headers=headers) as client:
+        _query(client)  # warm the connection
+        _summary('default', [_query(client) for _ in range(args.requests)])
+
+    with build_http_client(config, base_url, headers) as client:
+        _query(client)
+        _summary('pooled', [_query(client) for _ in range(args.requests)])
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            threaded = list(pool.map(lambda _: _query(client), range(args.requests)))
+        wall = (time.perf_counter() - started) * 1000
+        _summary('threaded', threaded)
+        print(f'threaded wall time for {args.requests} requests: {wall:.1f}ms ({args.threads} threads)')
+
+
+if __name__ == '__main__':
+    main()
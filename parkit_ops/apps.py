@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class ParkitOpsConfig(AppConfig):
+    """Operational management commands (provisioning, diagnostics); no models."""
+    name = 'parkit_ops'
+    verbose_name = 'ParkIT operations'
@@ -0,0 +1,100 @@
+import glob
+import os
+from collections import Counter
+from datetime import datetime, time as dt_time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from utils import flamegraph
+from utils.profiling import file_time, read_collapsed
+
+
+def _parse_datetime(value):
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise CommandError(f'Invalid date/time "{value}" (use ISO 8601, e.g. 2025-05-01 or 2025-05-01T07:00)')
+
+
+def _parse_hours(value):
+    try:
+        start, end = (dt_time.fromisoformat(part.strip()) for part in value.split('-', 1))
+    except ValueError:
+        raise CommandError(f'Invalid --hours "{value}" (use HH:MM-HH:MM, e.g. 07:00-09:00)')
+    return start, end
+
+
+class Command(BaseCommand):
+    help = (
+        'Merge the stacks written by the continuous profiler (PROFILER_DIR) over a time range '
+        'and write them as one collapsed-stack file or an SVG flamegraph.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', help='Collapsed-stack files (default: every file in --dir)')
+        parser.add_argument('--dir', default=None, help='Directory of the profiler files (default: PROFILER_DIR)')
+        parser.add_argument('--since', help='Only files written at or after this date/time (ISO 8601)')
+        parser.add_argument('--until', help='Only files written before this date/time (ISO 8601)')
+        parser.add_argument('--hours', help='Only files written in this daily window, e.g. 07:00-09:00')
+        parser.add_argument('--view', action='append', help='Only these views (URL names); repeatable')
+        parser.add_argument('--output', '-o', help='Write here; .svg renders a flamegraph, anything else collapsed stacks')
+        parser.add_argument('--title', default=None, help='Flamegraph title')
+        parser.add_argument('--top', type=int, default=15, help='Frames to list by self time (0: none)')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or getattr(settings, 'PROFILER_DIR', 'profiles/continuous')
+        paths = options['files'] or sorted(glob.glob(os.path.join(directory, '*.folded')))
+        since = _parse_datetime(options['since']) if options['since'] else None
+        until = _parse_datetime(options['until']) if options['until'] else None
+        hours = _parse_hours(options['hours']) if options['hours'] else None
+
+        selected = []
+        for path in paths:
+            written = file_time(path)
+            if written is None:
+                if options['files']:
+                    selected.append(path)  # named explicitly: no time filter
+                continue
+            if (since is not None and written < since) or (until is not None and written >= until):
+                continue
+            if hours is not None and not hours[0] <= datetime.fromtimestamp(written).time() < hours[1]:
+                continue
+            selected.append(path)
+        if not selected:
+            raise CommandError(f'No profiler files match in {directory}')
+
+        counts = Counter()
+        for path in selected:
+            try:
+                read_collapsed(path, counts)
+            except OSError as exc:
+                raise CommandError(f'Cannot read {path}: {exc}')
+        if options['view']:
+            roots = tuple(f'view:{view};' for view in options['view'])
+            counts = {stack: weight for stack, weight in counts.items() if stack.startswith(roots)}
+
+        total = sum(counts.values())
+        self.stdout.write(f'{len(selected)} files, {len(counts)} distinct stacks, {total / 1e6:.1f}s of request time')
+        if total and options['top']:
+            by_view = {}
+            for stack, weight in counts.items():
+                view = stack.split(';', 1)[0]
+                by_view[view] = by_view.get(view, 0) + weight
+            self.stdout.write('Views:')
+            for view, weight in sorted(by_view.items(), key=lambda item: -item[1])[:options['top']]:
+                self.stdout.write(f'  {100.0 * weight / total:6.2f}%  {view}')
+            self.stdout.write('Frames by self time:')
+            for frame, weight in flamegraph.self_weights(counts).most_common(options['top']):
+                self.stdout.write(f'  {100.0 * weight / total:6.2f}%  {frame}')
+
+        output = options['output']
+        if output:
+            if output.endswith('.svg'):
+                title = options['title'] or f'ParkIT workers, {len(selected)} profiler files'
+                content = flamegraph.render_svg(counts, title=title)
+            else:
+                content = ''.join(f'{stack} {weight}\n' for stack, weight in sorted(counts.items()))
+            with open(output, 'w', encoding='utf-8') as handle:
+                handle.write(content)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {output}'))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.provisioning import BATCH_SIZE, LayoutError, load_layout, provision
+
+
+class Command(BaseCommand):
+    help = (
+        'Create or update parking lots and slots from a JSON/YAML layout file. '
+        'Idempotent: prints the differences and applies them with batched upserts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('layout', help='Path to the layout file (.json, .yaml or .yml)')
+        parser.add_argument('--dry-run', action='store_true', help='Only print the differences')
+        parser.add_argument(
+            '--sync-status', action='store_true',
+            help="Reset existing slots to the layout's status (occupied slots are left alone)",
+        )
+        parser.add_argument(
+            '--prune', action='store_true',
+            help='Remove slots of the listed lots that the layout does not contain (never occupied ones)',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows per upsert request')
+
+    def handle(self, *args, **options):
+        try:
+            lots = load_layout(options['layout'])
+        except OSError as exc:
+            raise CommandError(f'Cannot read {options["layout"]}: {exc}')
+        except LayoutError as exc:
+            raise CommandError(str(exc))
+
+        try:
+            plan, requests, seconds = provision(
+                lots,
+                sync_status=options['sync_status'],
+                prune=options['prune'],
+                dry_run=options['dry_run'],
+                batch_size=max(1, options['batch_size']),
+            )
+        except Exception as exc:
+            raise CommandError(f'Provisioning failed: {exc}')
+
+        for line in plan.summary():
+            self.stdout.write(line)
+        slot_count = sum(len(lot['slots']) for lot in lots)
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run - nothing was written.'))
+        elif not plan.has_changes:
+            self.stdout.write(self.style.SUCCESS(f'Already up to date ({len(lots)} lots, {slot_count} slots).'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Provisioned {len(lots)} lots / {slot_count} slots in {seconds:.2f}s ({requests} write requests).'
+            ))
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.tracing import read_spans, render_waterfall, root_of, trace_files
+
+
+class Command(BaseCommand):
+    help = (
+        'Print the waterfall of a request traced to TRACE_DIR, by request id (X-Request-ID) or trace id; '
+        'without one, list the slowest recent traces.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('id', nargs='?', help='Request id or trace id')
+        parser.add_argument('--dir', default=None, help='Directory of the trace files (default: TRACE_DIR)')
+        parser.add_argument('--view', help='List only traces of this view (URL name)')
+        parser.add_argument('--top', type=int, default=20, help='Traces to list without an id')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or getattr(settings, 'TRACE_DIR', 'traces')
+        paths = trace_files(directory)
+        if not paths:
+            raise CommandError(f'No trace files in {directory}')
+        try:
+            traces = read_spans(paths)
+        except OSError as exc:
+            raise CommandError(f'Cannot read traces: {exc}')
+
+        roots = {trace_id: root_of(spans) for trace_id, spans in traces.items()}
+        wanted = options['id']
+        if wanted:
+            for trace_id, root in roots.items():
+                if wanted in (trace_id, root and root['attributes'].get('parkit.request_id')):
+                    self.stdout.write(f'trace {trace_id}, {len(traces[trace_id])} spans')
+                    self.stdout.write(render_waterfall(traces[trace_id]))
+                    return
+            raise CommandError(f'No trace with id {wanted} in {directory}')
+
+        rows = []
+        for trace_id, root in roots.items():
+            if root is None or (options['view'] and root['name'].split(' ', 1)[-1] != options['view']):
+                continue
+            duration = int(root['endTimeUnixNano']) - int(root['startTimeUnixNano'])
+            rows.append((duration, root, len(traces[trace_id])))
+        self.stdout.write(f'{len(rows)} traces')
+        for duration, root, count in sorted(rows, key=lambda row: -row[0])[:options['top']]:
+            started = datetime.fromtimestamp(int(root['startTimeUnixNano']) / 1e9)
+            self.stdout.write(
+                f'{duration / 1e6:9.1f}ms  {count:4} spans  {started:%Y-%m-%d %H:%M:%S}  '
+                f'{root["attributes"].get("parkit.request_id", root["traceId"])}  {root["name"]}'
+            )
@@ -0,0 +1,18 @@
+-- lot_occupancy(): slots and filled slots per lot in one query, for the
+-- occupancy totals (utils/occupancy.load_lot_counts). Run once in the Supabase
+-- SQL editor. Without it the app sends two count queries per lot instead.
+--
+-- The filled statuses are slot_snapshot.FILLED_STATUSES; keep the two in step.
+
+create or replace function public.lot_occupancy()
+returns table (lot_id bigint, total bigint, occupied bigint)
+language sql stable as $$
+    select lot_id,
+           count(*),
+           count(*) filter (where lower(coalesce(status, 'available')) in (
+               'occupied', 'taken', 'full', 'in_use', 'busy', 'reserved', 'hold', 'pending', 'unavailable'
+           ))
+    from public.parking_slot
+    where lot_id is not null
+    group by lot_id
+$$;
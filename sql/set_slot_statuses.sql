@@ -0,0 +1,20 @@
+-- set_slot_statuses(changes): bulk slot status change for
+-- POST /api/parking-slots/bulk-status/ (utils/occupancy.set_slot_statuses).
+-- Run once in the Supabase SQL editor. Without it the app sends one UPDATE per
+-- (expected, new) status pair instead.
+--
+-- changes: [{"id": 12, "status": "unavailable", "expected": "available"}, ...]
+-- A slot is only updated while its status is still "expected" (the value the
+-- request read), so a check-in that lands in between is never overwritten.
+-- Returns the rows that were updated.
+
+create or replace function public.set_slot_statuses(changes jsonb)
+returns setof public.parking_slot
+language sql as $$
+    update public.parking_slot s
+    set status = c.status
+    from jsonb_to_recordset(changes) as c(id bigint, status text, expected text)
+    where s.id = c.id
+      and s.status is not distinct from c.expected
+    returning s.*;
+$$;
@@ -0,0 +1,32 @@
+-- Unique constraints the app's upserts (INSERT ... ON CONFLICT) name as their
+-- conflict target. Run once in the Supabase SQL editor; each constraint is only
+-- added when it is missing. Without them those upserts fail with
+-- "there is no unique or exclusion constraint matching the ON CONFLICT specification".
+--
+-- Adding a constraint fails while duplicates exist; list them first with e.g.
+--     select code, count(*) from public.parking_lot group by code having count(*) > 1;
+--     select lot_id, slot_number, count(*) from public.parking_slot
+--     group by lot_id, slot_number having count(*) > 1;
+--     select plate, count(*) from public.vehicle group by plate having count(*) > 1;
+
+-- provision_lots / the default layout seeding (utils/provisioning.apply_plan)
+do $$
+begin
+    if not exists (select 1 from pg_constraint where conname = 'parking_lot_code_key') then
+        alter table public.parking_lot add constraint parking_lot_code_key unique (code);
+    end if;
+    if not exists (select 1 from pg_constraint where conname = 'parking_slot_lot_id_slot_number_key') then
+        alter table public.parking_slot
+            add constraint parking_slot_lot_id_slot_number_key unique (lot_id, slot_number);
+    end if;
+end $$;
+
+-- Gate camera ingest creating the vehicles it has not seen (utils/gate_events.resolve_vehicles).
+-- Plates are stored upper-case and trimmed by every writer, so this also keeps
+-- one vehicle per plate as the app compares them.
+do $$
+begin
+    if not exists (select 1 from pg_constraint where conname = 'vehicle_plate_key') then
+        alter table public.vehicle add constraint vehicle_plate_key unique (plate);
+    end if;
+end $$;
@@ -0,0 +1,70 @@
+/*
+ * Live parking grid: applies the slot changes streamed by
+ * /api/lots/<id>/events/ (Server-Sent Events) to the grid in place.
+ *
+ * window.liveSlots.connected tells the page scripts whether they can skip
+ * reloading after their own check-in/out; without a stream (sync server,
+ * old browser) they keep reloading as before.
+ */
+(function () {
+  const STATUS_LABELS = {
+    available: 'Available',
+    occupied: 'Occupied',
+    reserved: 'Reserved',
+    unavailable: 'Unavailable',
+  };
+
+  window.liveSlots = { connected: false };
+
+  const grid = document.querySelector('[data-events-url]');
+  if (!grid || !window.EventSource) return;
+
+  function updateCounters() {
+    const slots = grid.querySelectorAll('.parking-slot');
+    let available = 0;
+    slots.forEach(slot => { if (slot.dataset.slotStatus === 'available') available += 1; });
+    const filledCounter = document.querySelector('.counter.filled .counter-number');
+    const emptyCounter = document.querySelector('.counter.empty .counter-number');
+    if (filledCounter) filledCounter.textContent = slots.length - available;
+    if (emptyCounter) emptyCounter.textContent = available;
+  }
+
+  function applySlot(change) {
+    const slot = grid.querySelector(`.parking-slot[data-slot-id="${change.id}"]`);
+    if (!slot) return;
+    if ('status' in change) {
+      let status = (change.status || 'available').toLowerCase();
+      if (!(status in STATUS_LABELS)) status = 'available';
+      slot.classList.remove(`status-${slot.dataset.slotStatus}`);
+      slot.classList.add(`status-${status}`);
+      slot.dataset.slotStatus = status;
+      slot.querySelector('.slot-status').textContent = STATUS_LABELS[status];
+    }
+    if ('license_plate' in change) {
+      slot.dataset.licensePlate = change.license_plate || '';
+    }
+  }
+
+  let hadError = false;
+  const source = new EventSource(grid.dataset.eventsUrl);
+
+  source.addEventListener('open', () => {
+    // Changes made while disconnected were missed - start from a fresh page
+    if (hadError) window.location.reload();
+    window.liveSlots.connected = true;
+  });
+  source.addEventListener('error', () => {
+    hadError = true;
+    window.liveSlots.connected = source.readyState !== EventSource.CLOSED && window.liveSlots.connected;
+  });
+  source.addEventListener('slot', (e) => {
+    applySlot(JSON.parse(e.data).slot);
+    updateCounters();
+  });
+  source.addEventListener('removed', (e) => {
+    const slot = grid.querySelector(`.parking-slot[data-slot-id="${JSON.parse(e.data).slot_id}"]`);
+    if (slot) slot.remove();
+    updateCounters();
+  });
+  source.addEventListener('resync', () => window.location.reload());
+})();
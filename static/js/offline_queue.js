@@ -0,0 +1,113 @@
+/*
+ * Offline queue for the attendant's check-ins and check-outs.
+ *
+ * When a check-in/out request can't reach the server, the page hands it to
+ * offlineQueue.add() instead of losing it. Actions are kept in localStorage and
+ * posted together to /api/parking-slots/sync/ when the browser is back online
+ * (and on every page load). Each action carries a client id, so a batch that is
+ * sent twice is only applied once.
+ *
+ * The page gets an 'offlinequeue:synced' event with the server's per-action
+ * results ({id, status: applied | conflict | rejected, error}).
+ */
+(function () {
+  const STORAGE_KEY = 'parkit.offlineActions';
+  const SYNC_URL = '/api/parking-slots/sync/';
+  const RETRY_MS = 30000;
+  const MAX_BATCH = 200;
+  let syncing = false;
+
+  function load() {
+    try {
+      return JSON.parse(localStorage.getItem(STORAGE_KEY)) || [];
+    } catch (e) {
+      return [];
+    }
+  }
+
+  function save(actions) {
+    localStorage.setItem(STORAGE_KEY, JSON.stringify(actions));
+    updateBadge(actions.length);
+  }
+
+  function newId() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+  }
+
+  function csrfToken() {
+    const input = document.querySelector('[name=csrfmiddlewaretoken]');
+    if (input) return input.value;
+    const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+    return match ? decodeURIComponent(match[1]) : '';
+  }
+
+  function updateBadge(count) {
+    let badge = document.getElementById('offlineQueueBadge');
+    if (!count) {
+      if (badge) badge.remove();
+      return;
+    }
+    if (!badge) {
+      badge = document.createElement('div');
+      badge.id = 'offlineQueueBadge';
+      badge.style.cssText = 'position:fixed;left:16px;bottom:16px;z-index:1000;padding:8px 14px;'
+        + 'border-radius:8px;background:#92400e;color:#fff;font-size:14px;box-shadow:0 2px 8px rgba(0,0,0,.2);';
+      document.body.appendChild(badge);
+    }
+    badge.textContent = `${count} offline action${count === 1 ? '' : 's'} waiting to sync`;
+  }
+
+  // fetch() rejects with a TypeError when the request never reached the server
+  function isNetworkError(error) {
+    return error instanceof TypeError || !navigator.onLine;
+  }
+
+  function add(action, slotId, licensePlate) {
+    const actions = load();
+    actions.push({
+      id: newId(),
+      action: action,
+      slot_id: Number(slotId),
+      license_plate: licensePlate || null,
+      timestamp: new Date().toISOString(),
+    });
+    save(actions);
+  }
+
+  function sync() {
+    const actions = load();
+    if (syncing || !actions.length || !navigator.onLine) return Promise.resolve();
+    syncing = true;
+    let synced = false;
+    return fetch(SYNC_URL, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken() },
+      body: JSON.stringify({ actions: actions.slice(0, MAX_BATCH) }),
+    })
+      .then(r => (r.ok ? r.json() : null))
+      .then(data => {
+        if (!data || !data.success) return;  // server trouble: keep everything for the next try
+        const done = new Set(data.results.map(result => result.id));
+        save(load().filter(action => !done.has(action.id)));
+        synced = done.size > 0;
+        document.dispatchEvent(new CustomEvent('offlinequeue:synced', { detail: data }));
+      })
+      .catch(() => {})
+      .finally(() => {
+        syncing = false;
+        if (!load().length) return;
+        // More than one batch queued: go on; a failed attempt: try again later
+        if (synced) sync();
+        else setTimeout(sync, RETRY_MS);
+      });
+  }
+
+  window.offlineQueue = { add: add, sync: sync, isNetworkError: isNetworkError, pending: () => load().length };
+
+  window.addEventListener('online', sync);
+  document.addEventListener('DOMContentLoaded', () => {
+    updateBadge(load().length);
+    sync();
+  });
+})();
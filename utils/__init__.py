@@ -1,3 +1,3 @@
-from .supabase_client import supabase, get_client
+from .supabase_client import supabase, get_client, get_async_client
 
-__all__ = ['supabase', 'get_client']
+__all__ = ['supabase', 'get_client', 'get_async_client']
@@ -0,0 +1,239 @@
+"""
+Apply the check-ins/check-outs an attendant tablet queued while offline.
+
+static/js/offline_queue.js keeps the actions in localStorage while the tablet has
+no connection and posts them in one request when it is back:
+
+    outcomes = attendant_sync.apply_actions([
+        {'id': 'a1f3...', 'action': 'check_in', 'slot_id': 12,
+         'license_plate': 'ABC1234', 'timestamp': '2025-05-01T08:00:03Z'},
+        ...
+    ], owner=user_id)
+
+The actions are replayed in the order they happened against the current slot
+state, each getting an outcome: 'applied', 'conflict' (the slot changed in the
+meantime, e.g. someone else checked a car into it) or 'rejected' (invalid). The
+slot writes are compare-and-set, so a change made while the batch is applied
+also turns into a conflict rather than being overwritten. History rows carry
+the time of the action, not of the sync.
+
+Outcomes are remembered per action id for OUTCOME_TTL seconds, so a batch sent
+again after a lost response is not applied twice.
+"""
+from datetime import datetime, timedelta, timezone
+
+from . import history_outbox, metrics
+from .gate_events import normalize_plate, resolve_vehicles
+from .occupancy import engine as occupancy, parking_of, transition_slot
+from .reference_cache import get_lot
+from .resilience import is_transient, run_query
+from .supabase_client import supabase
+
+ACTIONS = ('check_in', 'check_out')
+# Outcome label of metrics.SLOT_ACTIONS for each sync outcome
+METRIC_OUTCOMES = {'applied': 'success', 'conflict': 'conflict', 'rejected': 'rejected'}
+MAX_ACTIONS = 200
+OUTCOME_TTL = 86400
+# Tablet clocks drift; anything later than this is rejected
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+KEY_PREFIX = 'parkit:sync'
+
+
+def _cache():
+    try:
+        from django.conf import settings
+        if settings.configured:
+            from django.core.cache import cache
+            return cache
+    except ImportError:
+        pass
+    return None
+
+
+def _parse(index, raw):
+    """(action dict, None) or (None, rejected outcome)."""
+    action_id = str(raw.get('id') or '').strip() if isinstance(raw, dict) else ''
+    if not action_id or len(action_id) > 64:
+        return None, {'id': action_id or None, 'index': index, 'status': 'rejected', 'error': 'id is required'}
+
+    def reject(message):
+        return None, {'id': action_id, 'index': index, 'status': 'rejected', 'error': message}
+
+    kind = str(raw.get('action') or '').strip().lower()
+    if kind not in ACTIONS:
+        return reject('action must be "check_in" or "check_out"')
+    try:
+        slot_id = int(raw.get('slot_id'))
+    except (TypeError, ValueError):
+        return reject('slot_id must be an integer')
+    plate = normalize_plate(raw.get('license_plate'))
+    if kind == 'check_in' and not plate:
+        return reject('license_plate is required')
+    try:
+        happened = datetime.fromisoformat(str(raw.get('timestamp') or '').replace('Z', '+00:00'))
+    except ValueError:
+        return reject('timestamp must be ISO 8601')
+    if happened.tzinfo is None:
+        happened = happened.replace(tzinfo=timezone.utc)
+    happened = happened.astimezone(timezone.utc)
+    if happened > datetime.now(timezone.utc) + MAX_CLOCK_SKEW:
+        return reject('timestamp is in the future')
+    return {'id': action_id, 'index': index, 'action': kind, 'slot_id': slot_id,
+            'license_plate': plate, 'time': happened}, None
+
+
+def _load_slots(slot_ids):
+    try:
+        rows = run_query(
+            supabase.table('parking_slot').select('id, lot_id, slot_number, status, license_plate, check_in_time')
+            .in_('id', slot_ids), 'sync.slots',
+        ).data or []
+    except Exception as exc:
+        if is_transient(exc):
+            raise
+        # license_plate/check_in_time columns not added yet
+        rows = run_query(
+            supabase.table('parking_slot').select('id, lot_id, slot_number, status').in_('id', slot_ids), 'sync.slots'
+        ).data or []
+    return {row['id']: row for row in rows}
+
+
+def _parked_elsewhere(plates):
+    """{plate: slot_id} for the plates currently occupying a slot."""
+    if not plates:
+        return {}
+    try:
+        rows = run_query(
+            supabase.table('parking_slot').select('id, license_plate')
+            .in_('license_plate', sorted(plates)).eq('status', 'occupied'), 'sync.plates',
+        ).data or []
+    except Exception as exc:
+        if is_transient(exc):
+            raise
+        return {}
+    return {normalize_plate(row.get('license_plate')): row['id'] for row in rows}
+
+
+def _replay(actions, state, parked):
+    """Apply actions to the slot state in time order; {action id: outcome}."""
+    outcomes = {}
+    for action in sorted(actions, key=lambda item: (item['time'], item['index'])):
+        slot = state.get(action['slot_id'])
+        plate = action['license_plate']
+
+        def outcome(status, error=None):
+            outcomes[action['id']] = {'id': action['id'], 'index': action['index'], 'status': status,
+                                      'slot_id': action['slot_id'], 'action': action['action']}
+            if error:
+                outcomes[action['id']]['error'] = error
+
+        if slot is None:
+            outcome('conflict', 'Slot not found')
+            continue
+        status = (slot.get('status') or 'available').lower()
+        holder = normalize_plate(slot.get('license_plate'))
+        if action['action'] == 'check_in':
+            if status == 'occupied':
+                outcome('conflict', f"Slot {slot.get('slot_number')} is already occupied"
+                        + (f' by {holder}' if holder and holder != plate else ''))
+            elif parked.get(plate) not in (None, action['slot_id']):
+                outcome('conflict', f'{plate} is already checked in at another slot')
+            else:
+                slot.update(status='occupied', license_plate=plate, check_in_time=action['time'].isoformat())
+                parked[plate] = action['slot_id']
+                outcome('applied')
+        else:
+            if status != 'occupied':
+                outcome('conflict', 'Slot is not currently occupied')
+            elif plate and holder and plate != holder:
+                outcome('conflict', f'Slot is occupied by {holder}, not {plate}')
+            else:
+                action['license_plate'] = holder or plate
+                slot.update(status='available', license_plate=None, check_in_time=None)
+                parked.pop(holder, None)
+                outcome('applied')
+        action['slot'] = dict(slot)
+    return outcomes
+
+
+def apply_actions(raw_actions, owner):
+    """Outcomes (in request order) for a batch of offline actions of one user."""
+    cache = _cache()
+    outcomes, actions = {}, []
+    for index, raw in enumerate(raw_actions):
+        action, rejected = _parse(index, raw)
+        if rejected is not None:
+            outcomes[('rejected', index)] = rejected
+        else:
+            actions.append(action)
+
+    keys = {action['id']: f'{KEY_PREFIX}:{owner}:{action["id"]}' for action in actions}
+    done = cache.get_many(list(keys.values())) if cache is not None and keys else {}
+    fresh, seen = [], set()
+    for action in actions:
+        previous = done.get(keys[action['id']])
+        if action['id'] in seen:
+            outcomes[('rejected', action['index'])] = {
+                'id': action['id'], 'index': action['index'], 'status': 'rejected', 'error': 'duplicate id',
+            }
+        elif previous is not None:
+            outcomes[action['id']] = dict(previous, index=action['index'], replayed=True)
+        else:
+            fresh.append(action)
+        seen.add(action['id'])
+
+    if fresh:
+        slots = _load_slots(sorted({action['slot_id'] for action in fresh}))
+        original = {slot_id: dict(row) for slot_id, row in slots.items()}
+        parked = _parked_elsewhere({action['license_plate'] for action in fresh if action['action'] == 'check_in'})
+        replayed = _replay(fresh, slots, parked)
+
+        # One compare-and-set per changed slot, against the status read above
+        lost = set()
+        for slot_id, row in slots.items():
+            before = original[slot_id]
+            if (row.get('status') or 'available').lower() == (before.get('status') or 'available').lower() \
+                    and row.get('license_plate') == before.get('license_plate'):
+                continue
+            fields = {'license_plate': row.get('license_plate'), 'check_in_time': row.get('check_in_time')}
+            if not transition_slot(slot_id, before.get('status'), row['status'], 'sync.slot_update', fields,
+                                   expected=parking_of(before)):
+                lost.add(slot_id)
+            elif row['status'] == 'occupied':
+                occupancy.check_in(slot_id, row['license_plate'], row['check_in_time'], row.get('lot_id'))
+            else:
+                occupancy.check_out(slot_id, row.get('lot_id'))
+
+        applied = []
+        for action in fresh:
+            result = replayed[action['id']]
+            if result['status'] == 'applied' and action['slot_id'] in lost:
+                result.update(status='conflict', error='The slot changed while syncing; check it and try again')
+            elif result['status'] == 'applied':
+                applied.append(action)
+            outcomes[action['id']] = result
+
+        if applied:
+            vehicle_ids, _ = resolve_vehicles(action['license_plate'] for action in applied)
+            history = []
+            for action in applied:
+                lot_id = action['slot'].get('lot_id')
+                lot = get_lot(lot_id) or {}
+                history.append({
+                    'time': action['time'].isoformat(),
+                    'vehicle_id': vehicle_ids.get(action['license_plate']),
+                    'action': 'entry' if action['action'] == 'check_in' else 'exit',
+                    'lot_id': lot_id,
+                    'zone': lot.get('code'),
+                })
+            history_outbox.record_many([row for row in history if row['vehicle_id']], 'sync.history')
+
+        if cache is not None:
+            # Conflicts are final too: the tablet drops them from its queue and shows them
+            cache.set_many({keys[action['id']]: outcomes[action['id']] for action in fresh}, OUTCOME_TTL)
+
+    for result in outcomes.values():
+        if not result.get('replayed'):
+            metrics.SLOT_ACTIONS.inc(action=result.get('action') or 'unknown', source='sync',
+                                     outcome=METRIC_OUTCOMES[result['status']])
+    return sorted(outcomes.values(), key=lambda item: item['index'])
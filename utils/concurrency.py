@@ -0,0 +1,139 @@
+"""
+Concurrent fan-out of independent Supabase queries inside a single request.
+
+Views that need several unrelated result sets (lots, slots, today's entries...)
+submit them together so the page waits for the slowest query rather than the
+sum of all of them. Under WSGI the queries run on a shared thread pool; async
+views (ASGI) use gather() which runs them on the event loop.
+
+A query that raises or misses its timeout yields its default value, matching
+the per-query try/except fallbacks the views already use; the exception is kept
+in FanOutResult.errors for callers that report it.
+
+Each query runs in a copy of the caller's context, so the request id, trace
+span and run_query site follow it onto the pool thread.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 16
+DEFAULT_TIMEOUT = 10.0
+
+_executor = None
+_executor_lock = threading.Lock()
+_worker_state = threading.local()
+
+
+class FanOutResult(dict):
+    """Query results keyed by name, with failures recorded in .errors."""
+
+    def __init__(self):
+        super().__init__()
+        self.errors = {}
+
+
+def _setting(name, default):
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def _mark_worker():
+    _worker_state.in_pool = True
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(_setting('QUERY_FANOUT_WORKERS', DEFAULT_WORKERS)),
+                    thread_name_prefix='supabase-fanout',
+                    initializer=_mark_worker,
+                )
+    return _executor
+
+
+def _timeout_for(name, timeout):
+    if isinstance(timeout, dict):
+        return timeout.get(name, _setting('QUERY_FANOUT_TIMEOUT', DEFAULT_TIMEOUT))
+    if timeout is None:
+        return _setting('QUERY_FANOUT_TIMEOUT', DEFAULT_TIMEOUT)
+    return timeout
+
+
+def fan_out(queries, timeout=None, defaults=None):
+    """
+    Run independent zero-argument callables concurrently.
+
+    queries maps a name to a callable; timeout is seconds for every query or a
+    {name: seconds} dict (unlisted names use settings.QUERY_FANOUT_TIMEOUT).
+    Returns a FanOutResult mapping each name to its result or its default.
+    """
+    defaults = defaults or {}
+    results = FanOutResult()
+
+    # Calls from inside a pool worker (or single queries) run inline so nested
+    # fan-outs cannot exhaust the pool and deadlock waiting on themselves.
+    if len(queries) <= 1 or getattr(_worker_state, 'in_pool', False):
+        for name, query in queries.items():
+            try:
+                results[name] = query()
+            except Exception as exc:
+                results.errors[name] = exc
+                results[name] = defaults.get(name)
+        return results
+
+    executor = _get_executor()
+    started = time.monotonic()
+    futures = {name: executor.submit(contextvars.copy_context().run, query) for name, query in queries.items()}
+    for name, future in futures.items():
+        remaining = max(0.0, started + _timeout_for(name, timeout) - time.monotonic())
+        try:
+            results[name] = future.result(timeout=remaining)
+        except Exception as exc:
+            # A timed-out query keeps running until its HTTP read timeout; the
+            # request just stops waiting for it.
+            future.cancel()
+            results.errors[name] = exc
+            results[name] = defaults.get(name)
+    return results
+
+
+async def gather(queries, timeout=None, defaults=None):
+    """
+    Async counterpart of fan_out() for async views.
+
+    Each value may be a coroutine function or a plain callable; plain callables
+    are run in a worker thread so they do not block the event loop.
+    """
+    defaults = defaults or {}
+    results = FanOutResult()
+
+    async def run(name, query):
+        if asyncio.iscoroutinefunction(query):
+            awaitable = query()
+        else:
+            awaitable = asyncio.to_thread(query)
+        return await asyncio.wait_for(awaitable, timeout=_timeout_for(name, timeout))
+
+    names = list(queries)
+    outcomes = await asyncio.gather(
+        *(run(name, queries[name]) for name in names),
+        return_exceptions=True,
+    )
+    for name, outcome in zip(names, outcomes):
+        if isinstance(outcome, BaseException):
+            if isinstance(outcome, asyncio.CancelledError):
+                raise outcome
+            results.errors[name] = outcome
+            results[name] = defaults.get(name)
+        else:
+            results[name] = outcome
+    return results
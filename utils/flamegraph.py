@@ -0,0 +1,99 @@
+"""
+Flamegraphs from collapsed stacks ("frame;frame;frame weight" lines).
+
+    counts = profiling.read_collapsed('profiles/continuous/20250501-073000-4242.folded')
+    open('rush.svg', 'w').write(flamegraph.render_svg(counts, title='7-9am'))
+
+A self-contained SVG (hover a frame for its share), so no flamegraph.pl or
+browser tool is needed on the server; the collapsed files work with those too.
+"""
+import hashlib
+from collections import Counter
+from html import escape
+
+WIDTH = 1200
+FRAME_HEIGHT = 16
+MIN_WIDTH_PX = 0.3
+FONT_SIZE = 11
+CHAR_WIDTH = FONT_SIZE * 0.59
+
+
+class _Node:
+    __slots__ = ('name', 'total', 'children')
+
+    def __init__(self, name):
+        self.name = name
+        self.total = 0
+        self.children = {}
+
+
+def build_tree(counts):
+    root = _Node('all')
+    for stack, weight in counts.items():
+        root.total += weight
+        node = root
+        for name in stack.split(';'):
+            node = node.children.setdefault(name, _Node(name))
+            node.total += weight
+    return root
+
+
+def self_weights(counts):
+    """{frame: weight spent in the frame itself} - the leaf of each stack."""
+    leaves = Counter()
+    for stack, weight in counts.items():
+        leaves[stack.rsplit(';', 1)[-1]] += weight
+    return leaves
+
+
+def _color(name):
+    # Stable warm colours; the views and their root frames stand out in orange
+    digest = hashlib.md5(name.encode()).digest()
+    if name.startswith(('views.py', 'async_views.py', 'view:')):
+        return f'rgb(240,{130 + digest[0] % 60},{40 + digest[1] % 40})'
+    return f'rgb({200 + digest[0] % 55},{80 + digest[1] % 110},{40 + digest[2] % 50})'
+
+
+def render_svg(counts, title='Flame graph'):
+    """An SVG flamegraph of counts (root at the bottom, as flamegraph.pl draws it)."""
+    root = build_tree(counts)
+    if not root.total:
+        return f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="40"><text x="10" y="24">{escape(title)}: no samples</text></svg>'
+
+    scale = (WIDTH - 20) / root.total
+    rects, depth_max = [], 0
+    stack = [(root, 10.0, 0)]
+    while stack:
+        node, x, depth = stack.pop()
+        width = node.total * scale
+        if width < MIN_WIDTH_PX:
+            continue
+        depth_max = max(depth_max, depth)
+        rects.append((node, x, depth, width))
+        child_x = x
+        for child in sorted(node.children.values(), key=lambda item: item.name):
+            stack.append((child, child_x, depth + 1))
+            child_x += child.total * scale
+
+    height = (depth_max + 1) * FRAME_HEIGHT + 50
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="{height}" font-family="monospace" '
+        f'font-size="{FONT_SIZE}">',
+        '<rect width="100%" height="100%" fill="#fafafa"/>',
+        f'<text x="{WIDTH / 2}" y="20" text-anchor="middle" font-size="15">{escape(title)}</text>',
+    ]
+    for node, x, depth, width in rects:
+        y = height - 10 - (depth + 1) * FRAME_HEIGHT
+        share = 100.0 * node.total / root.total
+        label = escape(node.name)
+        parts.append(
+            f'<g><title>{label} ({share:.2f}%)</title>'
+            f'<rect x="{x:.2f}" y="{y}" width="{width:.2f}" height="{FRAME_HEIGHT - 1}" fill="{_color(node.name)}" rx="2"/>'
+        )
+        max_chars = int((width - 6) / CHAR_WIDTH)
+        if max_chars >= 3:
+            text = node.name if len(node.name) <= max_chars else node.name[:max_chars - 2] + '..'
+            parts.append(f'<text x="{x + 3:.2f}" y="{y + FRAME_HEIGHT - 4}">{escape(text)}</text>')
+        parts.append('</g>')
+    parts.append('</svg>')
+    return '\n'.join(parts)
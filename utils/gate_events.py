@@ -0,0 +1,317 @@
+"""
+Batched ingestion of gate camera (ANPR) plate reads.
+
+    summary = gate_events.ingest([
+        {'plate': 'ABC 1234', 'lot_code': 'NGE', 'slot': 12, 'action': 'entry',
+         'timestamp': '2025-05-01T08:00:03Z'},
+        ...
+    ])
+
+A burst is handled with a fixed number of round trips, plus one per slot it
+changes and one per new plate:
+
+1. validate and normalize every event in memory; repeated reads of the same
+   plate/lot/slot/action within DEDUP_WINDOW_SECONDS collapse into the first
+   one, also across requests (per worker process);
+2. resolve all plates with one vehicle lookup, then look the plates not found
+   up case-insensitively (concurrently, as check-in does one) and create the
+   vehicles still missing in one upsert (on the vehicle.plate unique
+   constraint from sql/unique_constraints.sql);
+3. read the slots the events name in one query and apply the events to them in
+   time order (an entry into a slot held by another plate is a conflict);
+4. write each changed slot with a compare-and-set against the status read in
+   step 3 (a slot changed meanwhile by a check-in/out is a conflict, not
+   overwritten) and the entries_exits rows in one batch through the history
+   outbox.
+
+The caller gets per-event rejections and slot conflicts back; a conflicting
+slot read is still recorded in the history, since the car did pass the gate.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+from . import history_outbox, metrics
+from .concurrency import fan_out
+from .occupancy import engine as occupancy, parking_of, transition_slot
+from .reference_cache import get_lots
+from .resilience import is_transient, run_query
+from .supabase_client import supabase
+
+ACTIONS = ('entry', 'exit')
+MAX_EVENTS = 5000
+DEDUP_WINDOW_SECONDS = 60
+# A slot can be entered unless another vehicle holds it or it is closed
+ENTERABLE_STATUSES = ('available', 'reserved')
+# Reads remembered across requests, so a read repeated in the next burst is dropped too
+RECENT_READS_LIMIT = 100000
+
+_recent_lock = threading.Lock()
+_recent_reads = {}  # (plate, lot_id, action, slot) -> time of the last read ingested
+
+
+class GateEvent:
+    __slots__ = ('index', 'plate', 'lot_id', 'lot_code', 'slot', 'action', 'time')
+
+    def __init__(self, index, plate, lot_id, lot_code, slot, action, time):
+        self.index = index
+        self.plate = plate
+        self.lot_id = lot_id
+        self.lot_code = lot_code
+        self.slot = slot
+        self.action = action
+        self.time = time
+
+
+def normalize_plate(plate):
+    # Same normalization as handle_check_in, so both find the same vehicle rows
+    return str(plate or '').strip().upper()
+
+
+def _parse_time(value):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError('timestamp is required (ISO 8601)')
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'invalid timestamp "{value}"')
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _slot_number(value):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = 0
+    if isinstance(value, bool) or number < 1:
+        raise ValueError('slot must be a positive slot number')
+    return number
+
+
+def parse_events(raw_events, lots=None):
+    """(valid GateEvents sorted by time, [{'index', 'error'}]) from the request body."""
+    lot_ids = {str(lot.get('code')).upper(): lot['id'] for lot in (lots if lots is not None else get_lots())}
+    events, rejected = [], []
+    for index, raw in enumerate(raw_events):
+        if not isinstance(raw, dict):
+            rejected.append({'index': index, 'error': 'expected an object'})
+            continue
+        plate = normalize_plate(raw.get('plate'))
+        lot_code = str(raw.get('lot_code') or '').strip().upper()
+        action = str(raw.get('action') or '').strip().lower()
+        slot = raw.get('slot')
+        try:
+            if not plate:
+                raise ValueError('plate is required')
+            if lot_code not in lot_ids:
+                raise ValueError(f'unknown lot_code "{raw.get("lot_code")}"')
+            if action not in ACTIONS:
+                raise ValueError('action must be "entry" or "exit"')
+            if slot is not None:
+                slot = _slot_number(slot)
+            event_time = _parse_time(raw.get('timestamp'))
+        except ValueError as exc:
+            rejected.append({'index': index, 'error': str(exc)})
+            continue
+        events.append(GateEvent(index, plate, lot_ids[lot_code], lot_code, slot, action, event_time))
+    events.sort(key=lambda event: (event.time, event.index))
+    return events, rejected
+
+
+def deduplicate(events, window=DEDUP_WINDOW_SECONDS, recent=None):
+    """Drop repeated reads of the same plate/lot/action/slot within window seconds.
+
+    recent holds the reads of earlier requests; returns (kept events, their read times).
+    """
+    recent = recent or {}
+    kept, last_seen = [], {}
+    for event in events:
+        key = (event.plate, event.lot_id, event.action, event.slot)
+        previous = last_seen.get(key) or recent.get(key)
+        if previous is not None and abs((event.time - previous).total_seconds()) <= window:
+            continue
+        last_seen[key] = event.time
+        kept.append(event)
+    return kept, last_seen
+
+
+def _remember(reads, window=DEDUP_WINDOW_SECONDS):
+    with _recent_lock:
+        _recent_reads.update(reads)
+        if len(_recent_reads) > RECENT_READS_LIMIT:
+            newest = max(_recent_reads.values())
+            for key, seen in list(_recent_reads.items()):
+                if (newest - seen).total_seconds() > window:
+                    del _recent_reads[key]
+
+
+def _find_plates_ignoring_case(plates):
+    """{plate: vehicle id} for plates stored in another case or spacing, one ilike per plate."""
+    results = fan_out({
+        plate: lambda plate=plate: run_query(
+            supabase.table('vehicle').select('id, plate').ilike('plate', plate), 'gate.vehicles'
+        ).data or []
+        for plate in plates
+    })
+    if results.errors:
+        raise next(iter(results.errors.values()))
+    found = {}
+    for plate in plates:
+        # ilike also treats _ and % as wildcards; keep only the same plate
+        matches = [row for row in results[plate] if normalize_plate(row['plate']) == plate]
+        if matches:
+            found[plate] = matches[0]['id']
+    return found
+
+
+def resolve_vehicles(plates):
+    """{plate: vehicle id} for all plates, creating the missing vehicles; (ids, created)."""
+    plates = sorted(set(plates))
+    found = run_query(supabase.table('vehicle').select('id, plate').in_('plate', plates), 'gate.vehicles').data or []
+    vehicle_ids = {row['plate']: row['id'] for row in found}
+    missing = [plate for plate in plates if plate not in vehicle_ids]
+    if missing:
+        vehicle_ids.update(_find_plates_ignoring_case(missing))
+        missing = [plate for plate in missing if plate not in vehicle_ids]
+    if missing:
+        # ignore_duplicates: a vehicle created concurrently is picked up by the re-read
+        run_query(
+            supabase.table('vehicle').upsert(
+                [{'plate': plate} for plate in missing], on_conflict='plate', ignore_duplicates=True
+            ),
+            'gate.vehicles', idempotent=False,
+        )
+        created = run_query(
+            supabase.table('vehicle').select('id, plate').in_('plate', missing), 'gate.vehicles'
+        ).data or []
+        vehicle_ids.update((row['plate'], row['id']) for row in created)
+    return vehicle_ids, len(missing)
+
+
+def _load_slots(events):
+    wanted = {(event.lot_id, event.slot) for event in events if event.slot is not None}
+    if not wanted:
+        return {}
+    lot_ids = sorted({lot_id for lot_id, _ in wanted})
+    numbers = sorted({number for _, number in wanted})
+    try:
+        rows = run_query(
+            supabase.table('parking_slot').select('id, lot_id, slot_number, status, license_plate, check_in_time')
+            .in_('lot_id', lot_ids).in_('slot_number', numbers),
+            'gate.slots',
+        ).data or []
+    except Exception as exc:
+        if is_transient(exc):
+            raise
+        # license_plate/check_in_time columns not added yet
+        rows = run_query(
+            supabase.table('parking_slot').select('id, lot_id, slot_number, status')
+            .in_('lot_id', lot_ids).in_('slot_number', numbers),
+            'gate.slots',
+        ).data or []
+    return {(row['lot_id'], row['slot_number']): row for row in rows if (row['lot_id'], row['slot_number']) in wanted}
+
+
+def apply_to_slots(events, slots):
+    """Play the events over the slots; ({slot key: new row}, [conflicts])."""
+    changed, conflicts = {}, []
+    for event in events:
+        if event.slot is None:
+            continue
+        key = (event.lot_id, event.slot)
+        current = changed.get(key) or slots.get(key)
+        if current is None:
+            conflicts.append({'index': event.index, 'error': f'slot {event.slot} does not exist in {event.lot_code}'})
+            continue
+        status = (current.get('status') or 'available').lower()
+        holder = normalize_plate(current.get('license_plate'))
+        if event.action == 'entry':
+            if status == 'occupied' and holder == event.plate:
+                continue
+            if status not in ENTERABLE_STATUSES:
+                conflicts.append({'index': event.index, 'error': f'slot {event.slot} is {status}'})
+                continue
+            changed[key] = dict(current, status='occupied', license_plate=event.plate,
+                                check_in_time=event.time.isoformat())
+        else:
+            if status != 'occupied':
+                continue
+            if holder and holder != event.plate:
+                conflicts.append({'index': event.index, 'error': f'slot {event.slot} is held by another vehicle'})
+                continue
+            changed[key] = dict(current, status='available', license_plate=None, check_in_time=None)
+    return changed, conflicts
+
+
+def _write_slots(changed, slots):
+    """Compare-and-set the changed slots against their rows as read; returns the keys that lost."""
+    lost = set()
+    for key, row in changed.items():
+        before = slots[key]
+        if (row.get('status') or 'available').lower() == (before.get('status') or 'available').lower() \
+                and row.get('license_plate') == before.get('license_plate'):
+            continue
+        fields = {'license_plate': row.get('license_plate'), 'check_in_time': row.get('check_in_time')}
+        if not transition_slot(row['id'], before.get('status'), row['status'], 'gate.slot_update', fields,
+                               expected=parking_of(before)):
+            lost.add(key)
+        elif row['status'] == 'occupied':
+            occupancy.check_in(row['id'], row['license_plate'], row['check_in_time'], row['lot_id'])
+        else:
+            occupancy.check_out(row['id'], row['lot_id'])
+    return lost
+
+
+def ingest(raw_events, lots=None):
+    """Validate, deduplicate and apply a batch of gate events; returns a summary dict."""
+    started = time.perf_counter()
+    events, rejected = parse_events(raw_events, lots)
+    with _recent_lock:
+        unique, reads = deduplicate(events, recent=_recent_reads)
+
+    vehicle_ids, vehicles_created = resolve_vehicles(event.plate for event in unique) if unique else ({}, 0)
+    slots = _load_slots(unique)
+    changed, conflicts = apply_to_slots(unique, slots)
+    lost = _write_slots(changed, slots) if changed else set()
+    if lost:
+        conflicting = {conflict['index'] for conflict in conflicts}
+        conflicts.extend(
+            {'index': event.index, 'error': f'slot {event.slot} changed while the gate events were applied'}
+            for event in unique
+            if (event.lot_id, event.slot) in lost and event.index not in conflicting
+        )
+        conflicts.sort(key=lambda conflict: conflict['index'])
+
+    history = [
+        {
+            'time': event.time.isoformat(),
+            'vehicle_id': vehicle_ids[event.plate],
+            'action': event.action,
+            'lot_id': event.lot_id,
+            'zone': event.lot_code,
+        }
+        for event in unique
+        if event.plate in vehicle_ids
+    ]
+    recorded = history_outbox.record_many(history, 'gate.history')
+    conflicting = {conflict['index'] for conflict in conflicts}
+    for event in unique:
+        if event.slot is not None:
+            metrics.SLOT_ACTIONS.inc(action='check_in' if event.action == 'entry' else 'check_out', source='gate',
+                                     outcome='conflict' if event.index in conflicting else 'success')
+    # Only now: a batch that failed must not have its reads dropped on retry
+    _remember(reads)
+
+    return {
+        'received': len(raw_events),
+        'accepted': len(unique),
+        'duplicates': len(events) - len(unique),
+        'rejected': rejected,
+        'history_recorded': recorded,
+        'vehicles_created': vehicles_created,
+        'slots_updated': len(changed) - len(lost),
+        'slot_conflicts': conflicts,
+        'seconds': round(time.perf_counter() - started, 4),
+    }
@@ -0,0 +1,371 @@
+"""
+Write-behind outbox for entries_exits history rows.
+
+Check-in/out append their history row to a local SQLite journal and return;
+a background drainer sends the journal to Supabase in batches:
+
+    history_outbox.record({'time': ..., 'vehicle_id': ..., 'action': 'entry', 'lot_id': ...})
+
+- A row is only removed from the journal once Supabase has accepted it, so a
+  failed insert, an outage or a restart never loses history.
+- Batches go out in the order the rows were recorded. Transient errors back
+  off and retry the same batch; a row Supabase rejects outright (e.g. the 23505
+  entries_exits sequence error) is parked with its error and retried every
+  PARKED_RETRY_SECONDS. The later rows of the same vehicle wait behind it, so
+  an exit is never delivered before its entry; other vehicles' rows carry on.
+- A batch whose insert failed ambiguously (timeout) is checked against the rows
+  already in entries_exits before it is re-sent, so retries don't duplicate.
+- Several worker processes can share the journal; one of them at a time holds
+  the drain lease.
+- The drainer starts with the first record() of a process, and at startup of
+  the WSGI/ASGI application (Park_IT/wsgi.py, asgi.py) for rows left in the
+  journal by an earlier run.
+
+settings.HISTORY_OUTBOX_PATH is the journal file (on persistent disk in
+production); set it to an empty string to insert synchronously as before.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from .resilience import is_unavailable, run_query
+from .supabase_client import supabase
+
+BATCH_SIZE = 200
+IDLE_POLL_SECONDS = 2.0
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+PARKED_RETRY_SECONDS = 60.0
+LEASE_SECONDS = 30.0
+
+logger = logging.getLogger('parkit.history_outbox')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE TABLE IF NOT EXISTS lease (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    owner TEXT,
+    expires REAL NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO lease (id, owner, expires) VALUES (1, NULL, 0);
+"""
+
+
+def _default_path():
+    try:
+        from django.conf import settings
+        if settings.configured:
+            return getattr(settings, 'HISTORY_OUTBOX_PATH', None)
+    except ImportError:
+        pass
+    return os.environ.get('HISTORY_OUTBOX_PATH')
+
+
+def _vehicle_key(row):
+    vehicle_id = row.get('vehicle_id')
+    return None if vehicle_id is None else str(vehicle_id)
+
+
+def _same_time(left, right):
+    try:
+        return datetime.fromisoformat(str(left)) == datetime.fromisoformat(str(right))
+    except ValueError:
+        return str(left) == str(right)
+
+
+class HistoryOutbox:
+    """SQLite journal of pending entries_exits rows plus its drainer thread."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._thread = None
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')  # a recorded row survives a power cut
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    # -- producers ---------------------------------------------------------
+
+    def append(self, row):
+        """Journal one entries_exits row; returns its outbox id."""
+        cursor = self._connection().execute(
+            'INSERT INTO outbox (payload, created_at) VALUES (?, ?)', (json.dumps(row, default=str), time.time())
+        )
+        self.start()
+        self._wake.set()
+        return cursor.lastrowid
+
+    def append_many(self, rows):
+        """Journal rows in one transaction (all or none), in list order."""
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT INTO outbox (payload, created_at) VALUES (?, ?)',
+                [(json.dumps(row, default=str), now) for row in rows],
+            )
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        self.start()
+        self._wake.set()
+
+    def pending(self):
+        """(rows waiting, rows parked after a rejected insert)."""
+        waiting, parked = self._connection().execute(
+            "SELECT COUNT(*), COUNT(last_error) FROM outbox"
+        ).fetchone()
+        return waiting, parked
+
+    # -- drainer -----------------------------------------------------------
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='history-outbox', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(IDLE_POLL_SECONDS)
+            self._wake.clear()
+            try:
+                self.drain()
+            except Exception:
+                logger.exception('History outbox drain failed')
+                time.sleep(BACKOFF_MAX)
+
+    def _acquire_lease(self, conn):
+        now = time.time()
+        cursor = conn.execute(
+            'UPDATE lease SET owner = ?, expires = ? WHERE id = 1 AND (owner = ? OR owner IS NULL OR expires < ?)',
+            (self.owner, now + LEASE_SECONDS, self.owner, now),
+        )
+        return cursor.rowcount == 1
+
+    def _held_vehicles(self, conn, now):
+        # Vehicles with a parked row not due yet: their later rows wait behind it
+        held = {}
+        for outbox_id, payload in conn.execute(
+            'SELECT id, payload FROM outbox WHERE last_error IS NOT NULL AND next_attempt > ? ORDER BY id', (now,)
+        ):
+            held.setdefault(_vehicle_key(json.loads(payload)), outbox_id)
+        held.pop(None, None)
+        return held
+
+    def _next_batch(self, conn):
+        # Parked rows are skipped until due, along with the later rows of their
+        # vehicle; any other row waiting out a backoff holds back everything
+        # behind it, to keep the order
+        now = time.time()
+        held = self._held_vehicles(conn, now)
+        batch = []
+        for outbox_id, payload, attempts, next_attempt, last_error in conn.execute(
+            'SELECT id, payload, attempts, next_attempt, last_error FROM outbox ORDER BY id'
+        ):
+            if next_attempt > now:
+                if last_error is None:
+                    break
+                continue
+            if held and _vehicle_key(json.loads(payload)) in held:
+                continue
+            batch.append((outbox_id, payload, attempts))
+            if len(batch) >= BATCH_SIZE:
+                break
+        return batch
+
+    def drain(self):
+        """Send every due row; returns how many reached Supabase."""
+        with self._drain_lock:
+            conn = self._connection()
+            sent = 0
+            if conn.execute('SELECT 1 FROM outbox LIMIT 1').fetchone() is None:
+                return sent
+            while self._acquire_lease(conn):
+                batch = self._next_batch(conn)
+                if not batch:
+                    break
+                delivered = self._send(conn, batch)
+                if delivered is None:
+                    break  # Supabase unavailable; the batch waits for its backoff
+                sent += delivered
+            return sent
+
+    def flush(self, timeout=10.0):
+        """Drain now, until nothing is due or timeout; True if the journal is empty."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self.drain()
+            if self.pending()[0] == 0:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def _send(self, conn, batch):
+        ids = [outbox_id for outbox_id, _, _ in batch]
+        rows = [json.loads(payload) for _, payload, _ in batch]
+        if any(attempts for _, _, attempts in batch):
+            rows, ids = self._skip_delivered(rows, ids)
+            self._delete(conn, sorted({outbox_id for outbox_id, _, _ in batch} - set(ids)))
+        if not rows:
+            return 0
+        try:
+            run_query(supabase.table('entries_exits').insert(rows), 'history.outbox', idempotent=False)
+        except Exception as exc:
+            if is_unavailable(exc):
+                self._retry_later(conn, ids)
+                return None
+            return self._send_one_by_one(conn, rows, ids)
+        self._delete(conn, ids)
+        return len(rows)
+
+    def _skip_delivered(self, rows, ids):
+        # A timed-out insert may have landed: drop rows already in entries_exits
+        try:
+            existing = run_query(
+                supabase.table('entries_exits').select('vehicle_id, action, time')
+                .in_('time', sorted({row['time'] for row in rows})),
+                'history.outbox_check',
+            ).data or []
+        except Exception:
+            return rows, ids
+        keep_rows, keep_ids = [], []
+        for row, outbox_id in zip(rows, ids):
+            landed = any(
+                str(found.get('vehicle_id')) == str(row.get('vehicle_id')) and found.get('action') == row.get('action')
+                and _same_time(found.get('time'), row.get('time'))
+                for found in existing
+            )
+            if not landed:
+                keep_rows.append(row)
+                keep_ids.append(outbox_id)
+        return keep_rows, keep_ids
+
+    def _send_one_by_one(self, conn, rows, ids):
+        # Isolate the row(s) Supabase rejects so they don't hold back other vehicles
+        delivered = 0
+        parked = set()
+        for row, outbox_id in zip(rows, ids):
+            vehicle = _vehicle_key(row)
+            if vehicle is not None and vehicle in parked:
+                continue  # stays journaled behind its vehicle's parked row
+            try:
+                run_query(supabase.table('entries_exits').insert(row), 'history.outbox', idempotent=False)
+            except Exception as exc:
+                if is_unavailable(exc):
+                    self._retry_later(conn, [outbox_id])
+                    return None
+                self._park(conn, outbox_id, exc)
+                parked.add(vehicle)
+                continue
+            self._delete(conn, [outbox_id])
+            delivered += 1
+        return delivered
+
+    def _retry_later(self, conn, ids):
+        attempts = conn.execute(
+            f"SELECT MAX(attempts) FROM outbox WHERE id IN ({','.join('?' * len(ids))})", ids
+        ).fetchone()[0] or 0
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempts)
+        conn.executemany(
+            'UPDATE outbox SET attempts = attempts + 1, next_attempt = ? WHERE id = ?',
+            [(time.time() + delay, outbox_id) for outbox_id in ids],
+        )
+
+    def _park(self, conn, outbox_id, exc):
+        message = str(exc)
+        if '23505' in message and 'entries_exits_pkey' in message:
+            message += ' (run fix_entries_exits_sequence.sql in the Supabase SQL Editor)'
+        logger.warning(
+            'entries_exits rejected outbox row %s, retrying in %.0fs: %s', outbox_id, PARKED_RETRY_SECONDS, message
+        )
+        conn.execute(
+            'UPDATE outbox SET attempts = attempts + 1, next_attempt = ?, last_error = ? WHERE id = ?',
+            (time.time() + PARKED_RETRY_SECONDS, message, outbox_id),
+        )
+
+    def _delete(self, conn, ids):
+        if ids:
+            conn.execute(f"DELETE FROM outbox WHERE id IN ({','.join('?' * len(ids))})", ids)
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox():
+    """The process's outbox, or None when HISTORY_OUTBOX_PATH is empty."""
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                path = _default_path()
+                _outbox = HistoryOutbox(path) if path else False
+    return _outbox or None
+
+
+def record(row, site='history.insert'):
+    """Record an entries_exits row: journaled for the drainer, or inserted now without an outbox.
+
+    Falls back to the synchronous insert if the journal can't be written, so
+    the caller sees the insert error in that case.
+    """
+    outbox = get_outbox()
+    if outbox is not None:
+        try:
+            outbox.append(row)
+            return True
+        except sqlite3.Error as exc:
+            logger.warning('History outbox unavailable, inserting directly: %s', exc)
+    result = run_query(supabase.table('entries_exits').insert(row), site, idempotent=False)
+    return bool(result.data)
+
+
+def record_many(rows, site='history.insert'):
+    """record() for a list of rows, journaled (or inserted) together; returns how many."""
+    if not rows:
+        return 0
+    outbox = get_outbox()
+    if outbox is not None:
+        try:
+            outbox.append_many(rows)
+            return len(rows)
+        except sqlite3.Error as exc:
+            logger.warning('History outbox unavailable, inserting directly: %s', exc)
+    result = run_query(supabase.table('entries_exits').insert(rows), site, idempotent=False)
+    return len(result.data or [])
+
+
+def start():
+    """Start draining rows left in the journal by an earlier run."""
+    outbox = get_outbox()
+    if outbox is not None:
+        try:
+            outbox.start()
+        except Exception as exc:
+            logger.warning('History outbox not started: %s', exc)
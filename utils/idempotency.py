@@ -0,0 +1,201 @@
+"""
+Idempotency-Key support for POST endpoints that must not run twice.
+
+Gate tablets retry check-in/out POSTs when the Wi-Fi drops the response. With
+
+    @require_POST
+    @idempotent_view('checkin')
+    def handle_check_in(request, slot_id): ...
+
+a request carrying an `Idempotency-Key` header runs the view once; the response
+is kept in Django's cache (shared by all workers when REDIS_URL is set) for
+settings.IDEMPOTENCY_KEY_TTL seconds and replayed for retries with the same key
+without touching Supabase again. Replays carry `Idempotency-Replayed: true`.
+
+- Keys are scoped to the user and the endpoint, so two tablets can't collide.
+- A retry that arrives while the first request is still running gets 409 with
+  Retry-After; reusing a key with a different body or URL gets 422.
+- 5xx responses and exceptions are not stored, so the client may retry them.
+- Requests without the header behave exactly as before.
+"""
+import functools
+import hashlib
+import inspect
+
+from . import tracing
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+KEY_PREFIX = 'parkit:idem'
+MAX_KEY_LENGTH = 255
+DEFAULT_TTL = 900
+# How long an in-progress marker survives a worker that died mid-request
+PENDING_TTL = 60
+
+
+def _ttl():
+    try:
+        from django.conf import settings
+        return int(getattr(settings, 'IDEMPOTENCY_KEY_TTL', DEFAULT_TTL))
+    except Exception:
+        return DEFAULT_TTL
+
+
+def _fingerprint(request):
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.get_full_path().encode())
+    digest.update(b'\0')
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _cache_key(scope, owner, key):
+    raw = f'{scope}:{owner or "anonymous"}:{key}'
+    # Hashed so arbitrary client keys are safe as cache keys (memcached/redis limits)
+    return f'{KEY_PREFIX}:{hashlib.sha256(raw.encode()).hexdigest()}'
+
+
+def _owner(request):
+    session = getattr(request, 'session', None) or {}
+    return session.get('user_id') or getattr(session, 'session_key', None)
+
+
+async def _aowner(request):
+    # The session store is loaded on first access, which must not block the event loop
+    session = getattr(request, 'session', None)
+    if session is None:
+        return None
+    return await session.aget('user_id') or session.session_key
+
+
+def _error(message, status, **headers):
+    from django.http import JsonResponse
+
+    response = JsonResponse({'error': message}, status=status)
+    for name, value in headers.items():
+        response[name.replace('_', '-')] = value
+    return response
+
+
+def _replay(stored):
+    from django.http import HttpResponse
+
+    response = HttpResponse(stored['content'], status=stored['status'], content_type=stored['content_type'])
+    response['Idempotency-Replayed'] = 'true'
+    return response
+
+
+def _invalid_key(key):
+    if len(key) > MAX_KEY_LENGTH or not key.isprintable():
+        return _error(f'Idempotency-Key must be at most {MAX_KEY_LENGTH} printable characters', 400)
+    return None
+
+
+def _answer_retry(stored, fingerprint):
+    """Response to a request whose key was already claimed (stored is the cache entry)."""
+    if stored['fingerprint'] != fingerprint:
+        return _error('This Idempotency-Key was already used for a different request', 422)
+    if stored['state'] == 'pending':
+        return _error('A request with this Idempotency-Key is still being processed', 409, Retry_After='1')
+    return _replay(stored)
+
+
+def _stored(response, fingerprint):
+    """The cache entry that replays response, or None when it must not be kept."""
+    if response.status_code >= 500 or getattr(response, 'streaming', False):
+        return None
+    return {
+        'state': 'done',
+        'fingerprint': fingerprint,
+        'status': response.status_code,
+        'content': response.content,
+        'content_type': response.get('Content-Type', 'application/json'),
+    }
+
+
+def idempotent_view(scope):
+    """Honor the Idempotency-Key header on a view (sync or async); scope names the endpoint."""
+
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            return _async_decorator(scope, view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = (request.META.get(HEADER) or '').strip()
+            if not key:
+                return view(request, *args, **kwargs)
+            invalid = _invalid_key(key)
+            if invalid is not None:
+                return invalid
+
+            from django.core.cache import cache
+
+            cache_key = _cache_key(scope, _owner(request), key)
+            fingerprint = _fingerprint(request)
+            with tracing.span('cache idempotency', attributes={'cache.name': 'idempotency'}) as span:
+                claimed = cache.add(cache_key, {'state': 'pending', 'fingerprint': fingerprint}, PENDING_TTL)
+                stored = None if claimed else cache.get(cache_key)
+                if span is not None:
+                    span.set_attribute('cache.result', 'miss' if stored is None else 'hit')
+            if not claimed:
+                if stored is None:
+                    # Expired between add() and get(): treat the retry as the first request
+                    return wrapper(request, *args, **kwargs)
+                return _answer_retry(stored, fingerprint)
+
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                cache.delete(cache_key)
+                raise
+            stored = _stored(response, fingerprint)
+            if stored is None:
+                cache.delete(cache_key)
+            else:
+                cache.set(cache_key, stored, _ttl())
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _async_decorator(scope, view):
+    # Same steps as the sync wrapper, through the cache's async methods
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        key = (request.META.get(HEADER) or '').strip()
+        if not key:
+            return await view(request, *args, **kwargs)
+        invalid = _invalid_key(key)
+        if invalid is not None:
+            return invalid
+
+        from django.core.cache import cache
+
+        cache_key = _cache_key(scope, await _aowner(request), key)
+        fingerprint = _fingerprint(request)
+        with tracing.span('cache idempotency', attributes={'cache.name': 'idempotency'}) as span:
+            claimed = await cache.aadd(cache_key, {'state': 'pending', 'fingerprint': fingerprint}, PENDING_TTL)
+            stored = None if claimed else await cache.aget(cache_key)
+            if span is not None:
+                span.set_attribute('cache.result', 'miss' if stored is None else 'hit')
+        if not claimed:
+            if stored is None:
+                return await wrapper(request, *args, **kwargs)
+            return _answer_retry(stored, fingerprint)
+
+        try:
+            response = await view(request, *args, **kwargs)
+        except BaseException:
+            await cache.adelete(cache_key)
+            raise
+        stored = _stored(response, fingerprint)
+        if stored is None:
+            await cache.adelete(cache_key)
+        else:
+            await cache.aset(cache_key, stored, _ttl())
+        return response
+
+    return wrapper
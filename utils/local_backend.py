@@ -0,0 +1,820 @@
+"""
+In-memory stand-in for the Supabase client.
+
+Implements the subset of the supabase-py / postgrest fluent API that the views
+use (table().select/insert/upsert/update/delete, the eq/gte/lte/lt/ilike/in_/order/
+limit/range filters, rpc and the auth calls) on top of in-process tables, so the
+app can be run, load-tested and benchmarked without a live Supabase project.
+AsyncLocalClient offers the same tables to the async views.
+
+Enable it with SUPABASE_BACKEND=local. Optional environment variables:
+
+    SUPABASE_LOCAL_FIXTURE      path to a JSON file used to seed the tables
+    SUPABASE_LOCAL_LATENCY_MS   median round-trip latency per request (default 20)
+    SUPABASE_LOCAL_JITTER       log-normal sigma applied to the latency (default 0.35)
+    SUPABASE_LOCAL_ROW_COST_US  extra transfer/parse cost per returned row (default 4)
+
+The fixture file maps table names to lists of rows; the special key
+"auth_users" holds {"id", "email", "password"} records for the auth calls.
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import lru_cache
+from types import SimpleNamespace
+
+from . import metrics, slow_queries, tracing
+
+
+# Columns (and their defaults) of the tables the app talks to. Selecting or
+# writing a column that is not listed raises the same 42703 error PostgREST
+# returns, so the "extended columns" fallbacks in the views behave as in
+# production. Tables that are not listed accept any column.
+TABLE_SCHEMAS = {
+    'users': {
+        'id': None, 'first_name': None, 'last_name': None, 'email': None,
+        'student_employee_id': None, 'role': 'user', 'role_id': 1,
+        'status': 'active', 'created_at': None,
+    },
+    'parking_lot': {'id': None, 'code': None, 'name': None, 'capacity': None},
+    'parking_slot': {
+        'id': None, 'lot_id': None, 'slot_number': None, 'status': 'available',
+        'license_plate': None, 'check_in_time': None,
+    },
+    'vehicle': {'id': None, 'plate': None},
+    'entries_exits': {
+        'id': None, 'time': None, 'vehicle_id': None, 'action': None,
+        'zone': None, 'lot_id': None,
+    },
+}
+
+UNIQUE_KEYS = {
+    'users': [('email',)],
+    'parking_lot': [('code',)],
+    'parking_slot': [('lot_id', 'slot_number')],
+    'vehicle': [('plate',)],
+}
+
+# Tables whose primary key is a client supplied UUID rather than a sequence
+UUID_TABLES = {'users'}
+
+_RPC_FUNCTIONS = {}
+
+
+def register_rpc(name):
+    """Register a Python implementation for a Postgres function called via rpc()."""
+    def decorator(func):
+        _RPC_FUNCTIONS[name] = func
+        return func
+    return decorator
+
+
+class LocalAPIError(Exception):
+    """Mirrors postgrest.APIError: args[0] is a dict with code and message."""
+
+    def __init__(self, error):
+        super().__init__(error)
+        self.code = error.get('code')
+        self.message = error.get('message')
+
+
+class LocalAuthError(Exception):
+    """Raised by the local auth calls, like gotrue's AuthApiError."""
+
+
+class LocalResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+@lru_cache(maxsize=65536)
+def _parse_timestamp(value):
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _comparable(value):
+    """Convert ISO timestamps and numeric strings so they compare like Postgres."""
+    if isinstance(value, str) and len(value) >= 10 and value[4:5] == '-' and value[7:8] == '-':
+        parsed = _parse_timestamp(value)
+        if parsed is not None:
+            return parsed
+    return value
+
+
+def _coerce_pair(left, right):
+    left = _comparable(left)
+    right = _comparable(right)
+    if type(left) is not type(right):
+        # PostgREST sends every filter value as text and lets Postgres cast it
+        if isinstance(left, (int, float)) and isinstance(right, str):
+            try:
+                right = type(left)(right)
+            except ValueError:
+                left = str(left)
+        elif isinstance(right, (int, float)) and isinstance(left, str):
+            try:
+                left = type(right)(left)
+            except ValueError:
+                right = str(right)
+    return left, right
+
+
+@lru_cache(maxsize=1024)
+def _like_regex(pattern, case_insensitive):
+    parts = []
+    for char in pattern:
+        if char == '%':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    flags = re.DOTALL | (re.IGNORECASE if case_insensitive else 0)
+    return re.compile(''.join(parts) + r'\Z', flags)
+
+
+class _InValues(list):
+    """in_() values, plus a set when they can be matched exactly (large IN lists)."""
+
+    def __init__(self, values):
+        super().__init__(values)
+        self.ints = all(type(item) is int for item in self)
+        self.strs = all(type(item) is str and _comparable(item) is item for item in self)
+        self.exact = frozenset(self) if self.ints or self.strs else None
+
+
+def _matches(row, column, op, value):
+    current = row.get(column)
+    if op == 'is':
+        return current is None if value in (None, 'null') else current is value
+    if op == 'in':
+        if value.exact is not None and (
+            (value.ints and type(current) is int)
+            or (value.strs and type(current) is str and _comparable(current) is current)
+        ):
+            return current in value.exact
+        return any(_eq(current, item) for item in value)
+    if op in ('like', 'ilike'):
+        if current is None:
+            return False
+        return _like_regex(value, op == 'ilike').match(str(current)) is not None
+    if current is None:
+        return False
+    if op == 'eq':
+        return _eq(current, value)
+    if op == 'neq':
+        return not _eq(current, value)
+    left, right = _coerce_pair(current, value)
+    try:
+        if op == 'gt':
+            return left > right
+        if op == 'gte':
+            return left >= right
+        if op == 'lt':
+            return left < right
+        if op == 'lte':
+            return left <= right
+    except TypeError:
+        return False
+    raise LocalAPIError({'code': 'PGRST100', 'message': f'unsupported operator "{op}"'})
+
+
+def _eq(current, value):
+    if current is None or value is None:
+        return current is None and value is None
+    left, right = _coerce_pair(current, value)
+    return left == right
+
+
+def _parse_columns(columns):
+    columns = (columns or '*').strip()
+    if columns == '*':
+        return None
+    return [col.strip() for col in columns.split(',') if col.strip()]
+
+
+class LocalStore:
+    """Thread-safe in-memory tables keyed by primary key (insertion ordered)."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.tables = defaultdict(dict)
+        self.sequences = defaultdict(int)
+        self.unique_index = defaultdict(dict)
+        self.auth_users = {}
+
+    def load_fixture(self, fixture):
+        with self.lock:
+            for user in fixture.get('auth_users', []):
+                self.add_auth_user(user['email'], user.get('password', ''), user.get('id'))
+            for table, rows in fixture.items():
+                if table == 'auth_users':
+                    continue
+                self.insert(table, rows)
+
+    def add_auth_user(self, email, password, user_id=None):
+        with self.lock:
+            user = {
+                'id': user_id or str(uuid.uuid4()),
+                'email': email,
+                'password': password,
+            }
+            self.auth_users[email.lower()] = user
+            return user
+
+    def _check_columns(self, table, columns):
+        schema = TABLE_SCHEMAS.get(table)
+        if schema is None:
+            return
+        for column in columns:
+            if column not in schema:
+                raise LocalAPIError({
+                    'code': '42703',
+                    'message': f'column {table}.{column} does not exist',
+                })
+
+    def _unique_values(self, table, row):
+        for key in UNIQUE_KEYS.get(table, []):
+            values = tuple(row.get(column) for column in key)
+            if all(value is not None for value in values):
+                yield key, values
+
+    def _check_unique(self, table, row, ignore_id=None):
+        for key, values in self._unique_values(table, row):
+            owner = self.unique_index[(table, key)].get(values)
+            if owner is not None and owner != ignore_id:
+                raise LocalAPIError({
+                    'code': '23505',
+                    'message': (
+                        f'duplicate key value violates unique constraint '
+                        f'"{table}_{"_".join(key)}_key"'
+                    ),
+                })
+
+    def _index_row(self, table, row):
+        for key, values in self._unique_values(table, row):
+            self.unique_index[(table, key)][values] = row['id']
+
+    def _unindex_row(self, table, row):
+        for key, values in self._unique_values(table, row):
+            self.unique_index[(table, key)].pop(values, None)
+
+    def _next_id(self, table):
+        if table in UUID_TABLES:
+            return str(uuid.uuid4())
+        self.sequences[table] += 1
+        return self.sequences[table]
+
+    def insert(self, table, payload):
+        rows = payload if isinstance(payload, list) else [payload]
+        schema = TABLE_SCHEMAS.get(table)
+        inserted = []
+        with self.lock:
+            try:
+                for values in rows:
+                    self._check_columns(table, values.keys())
+                    row = dict(schema) if schema else {}
+                    row.update(values)
+                    if row.get('id') is None:
+                        row['id'] = self._next_id(table)
+                    elif row['id'] in self.tables[table]:
+                        raise LocalAPIError({
+                            'code': '23505',
+                            'message': f'duplicate key value violates unique constraint "{table}_pkey"',
+                        })
+                    elif isinstance(row['id'], int):
+                        self.sequences[table] = max(self.sequences[table], row['id'])
+                    if schema and 'created_at' in schema and row.get('created_at') is None:
+                        row['created_at'] = datetime.now(timezone.utc).isoformat()
+                    self._check_unique(table, row)
+                    self.tables[table][row['id']] = row
+                    self._index_row(table, row)
+                    inserted.append(row)
+            except LocalAPIError:
+                # A bulk insert is a single statement: undo the rows already added
+                for row in inserted:
+                    self._unindex_row(table, row)
+                    self.tables[table].pop(row['id'], None)
+                raise
+        return [dict(row) for row in inserted]
+
+    def upsert(self, table, payload, on_conflict=None, ignore_duplicates=False):
+        """INSERT ... ON CONFLICT (on_conflict columns, default id) DO UPDATE / DO NOTHING."""
+        rows = payload if isinstance(payload, list) else [payload]
+        key = tuple(column.strip() for column in on_conflict.split(',')) if on_conflict else ('id',)
+        if key != ('id',) and key not in UNIQUE_KEYS.get(table, []):
+            raise LocalAPIError({
+                'code': '42P10',
+                'message': 'there is no unique or exclusion constraint matching the ON CONFLICT specification',
+            })
+        written = []
+        inserted, updated = [], []
+        with self.lock:
+            try:
+                for values in rows:
+                    self._check_columns(table, values.keys())
+                    if key == ('id',):
+                        existing = self.tables[table].get(values.get('id'))
+                    else:
+                        owner = self.unique_index[(table, key)].get(tuple(values.get(column) for column in key))
+                        existing = self.tables[table].get(owner) if owner is not None else None
+                    if existing is None:
+                        row = self.insert(table, values)[0]
+                        inserted.append(row['id'])
+                        written.append(row)
+                    elif not ignore_duplicates:
+                        candidate = dict(existing)
+                        candidate.update(values)
+                        self._check_unique(table, candidate, ignore_id=existing['id'])
+                        updated.append((existing, dict(existing)))
+                        self._unindex_row(table, existing)
+                        existing.update(values)
+                        self._index_row(table, existing)
+                        written.append(dict(existing))
+            except LocalAPIError:
+                # One statement: undo the rows already written
+                for row_id in inserted:
+                    self._unindex_row(table, self.tables[table][row_id])
+                    self.tables[table].pop(row_id)
+                for existing, previous in reversed(updated):
+                    self._unindex_row(table, existing)
+                    existing.clear()
+                    existing.update(previous)
+                    self._index_row(table, existing)
+                raise
+        return written
+
+    def select_rows(self, table, filters):
+        rows = self.tables.get(table, {})
+        # Fast path for primary-key lookups, the most common query in the views
+        for column, op, value in filters:
+            if column == 'id' and op == 'eq':
+                row = rows.get(value)
+                if row is None and isinstance(value, str) and value.isdigit():
+                    row = rows.get(int(value))
+                candidates = [row] if row is not None else []
+                break
+        else:
+            candidates = rows.values()
+        return [
+            row for row in candidates
+            if all(_matches(row, column, op, value) for column, op, value in filters)
+        ]
+
+
+class LocalQuery:
+    """Fluent request builder mirroring postgrest's SyncRequestBuilder."""
+
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._op = 'select'
+        self._columns = None
+        self._payload = None
+        self._filters = []
+        self._order = []
+        self._limit = None
+        self._offset = 0
+        self._count = None
+        self._single = False
+
+    # -- operations -------------------------------------------------------
+    def select(self, *columns, count=None):
+        self._op = 'select'
+        self._columns = _parse_columns(','.join(columns) if columns else '*')
+        self._count = count
+        return self
+
+    def insert(self, json, count=None, returning=None, upsert=False, **kwargs):
+        if upsert:
+            return self.upsert(json, count=count)
+        self._op = 'insert'
+        self._payload = json
+        self._count = count
+        return self
+
+    def upsert(self, json, count=None, returning=None, ignore_duplicates=False, on_conflict='', **kwargs):
+        self._op = 'upsert'
+        self._payload = json
+        self._count = count
+        self._upsert = (on_conflict, ignore_duplicates)
+        return self
+
+    def update(self, json, count=None, **kwargs):
+        self._op = 'update'
+        self._payload = json
+        self._count = count
+        return self
+
+    def delete(self, count=None, **kwargs):
+        self._op = 'delete'
+        self._count = count
+        return self
+
+    # -- filters ----------------------------------------------------------
+    def _filter(self, column, op, value):
+        self._filters.append((column, op, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column, value):
+        return self._filter(column, 'neq', value)
+
+    def gt(self, column, value):
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column, value):
+        return self._filter(column, 'gte', value)
+
+    def lt(self, column, value):
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column, value):
+        return self._filter(column, 'lte', value)
+
+    def like(self, column, pattern):
+        return self._filter(column, 'like', pattern)
+
+    def ilike(self, column, pattern):
+        return self._filter(column, 'ilike', pattern)
+
+    def in_(self, column, values):
+        return self._filter(column, 'in', _InValues(values))
+
+    def is_(self, column, value):
+        return self._filter(column, 'is', value)
+
+    # -- modifiers --------------------------------------------------------
+    def order(self, column, desc=False, nullsfirst=None, **kwargs):
+        self._order.append((column, desc, nullsfirst))
+        return self
+
+    def limit(self, size, **kwargs):
+        self._limit = size
+        return self
+
+    def range(self, start, end, **kwargs):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    # -- execution --------------------------------------------------------
+    def _project(self, row):
+        if self._columns is None:
+            return dict(row)
+        return {column: row.get(column) for column in self._columns}
+
+    def _sort(self, rows):
+        for column, desc, nullsfirst in reversed(self._order):
+            # Postgres puts NULLs last for ASC and first for DESC by default
+            nulls_first = desc if nullsfirst is None else nullsfirst
+            present = [row for row in rows if row.get(column) is not None]
+            missing = [row for row in rows if row.get(column) is None]
+            present.sort(key=lambda row: _comparable(row.get(column)), reverse=desc)
+            rows = missing + present if nulls_first else present + missing
+        return rows
+
+    def _run(self):
+        store = self._client.store
+        with store.lock:
+            if self._op == 'insert':
+                return LocalResponse(store.insert(self._table, self._payload))
+            if self._op == 'upsert':
+                on_conflict, ignore_duplicates = self._upsert
+                return LocalResponse(store.upsert(self._table, self._payload, on_conflict, ignore_duplicates))
+
+            self._check_filter_columns(store)
+            matched = store.select_rows(self._table, self._filters)
+
+            if self._op == 'update':
+                store._check_columns(self._table, self._payload.keys())
+                updated, previous = [], []
+                try:
+                    for row in matched:
+                        candidate = dict(row)
+                        candidate.update(self._payload)
+                        store._check_unique(self._table, candidate, ignore_id=row.get('id'))
+                        previous.append((row, dict(row)))
+                        store._unindex_row(self._table, row)
+                        row.update(self._payload)
+                        store._index_row(self._table, row)
+                        updated.append(dict(row))
+                except LocalAPIError:
+                    # One statement: undo the rows already updated
+                    for row, values in reversed(previous):
+                        store._unindex_row(self._table, row)
+                        row.clear()
+                        row.update(values)
+                        store._index_row(self._table, row)
+                    raise
+                return LocalResponse(updated, len(updated) if self._count else None)
+
+            if self._op == 'delete':
+                table = store.tables[self._table]
+                deleted = []
+                for row in matched:
+                    store._unindex_row(self._table, row)
+                    deleted.append(table.pop(row['id']))
+                return LocalResponse(deleted, len(deleted) if self._count else None)
+
+            if self._columns:
+                store._check_columns(self._table, self._columns)
+            total = len(matched)
+            rows = self._sort(list(matched)) if self._order else list(matched)
+            if self._offset or self._limit is not None:
+                end = None if self._limit is None else self._offset + self._limit
+                rows = rows[self._offset:end]
+            data = [self._project(row) for row in rows]
+
+        if self._single:
+            if len(data) != 1:
+                raise LocalAPIError({
+                    'code': 'PGRST116',
+                    'message': 'JSON object requested, multiple (or no) rows returned',
+                })
+            data = data[0]
+        return LocalResponse(data, total if self._count else None)
+
+    def _check_filter_columns(self, store):
+        store._check_columns(self._table, [column for column, _, _ in self._filters])
+
+    def _metric_labels(self):
+        return self._table, self._op
+
+    def _describe_filters(self):
+        return '&'.join(f'{column}={op}.{value}' for column, op, value in self._filters)
+
+    def _span(self):
+        table, operation = self._metric_labels()
+        return tracing.span(f'{operation} {table}', tracing.CLIENT, {
+            'db.system': 'local',
+            'db.operation.name': operation,
+            'db.collection.name': table,
+            'parkit.query.site': slow_queries.current_site.get(),
+        })
+
+    def _observe(self, started, rows=None, outcome='ok'):
+        seconds = time.perf_counter() - started
+        metrics.observe_query(*self._metric_labels(), seconds, outcome)
+        slow_queries.observe(*self._metric_labels(), seconds, filters=self._describe_filters(), rows=rows,
+                             outcome=outcome)
+        span = tracing.current_span.get()
+        if span is not None:
+            span.set_attribute('db.response.returned_rows', rows)
+
+    def execute(self):
+        started = time.perf_counter()
+        with self._span():
+            try:
+                response = self._run()
+            except LocalAPIError:
+                self._observe(started, outcome='error')
+                raise
+            rows = response.data if isinstance(response.data, list) else [response.data]
+            self._client.simulate_round_trip(len(rows))
+            self._observe(started, len(rows))
+            return response
+
+
+class LocalRpc:
+    def __init__(self, client, name, params):
+        self._client = client
+        self._name = name
+        self._params = params or {}
+
+    def _run(self):
+        func = _RPC_FUNCTIONS.get(self._name)
+        if func is None:
+            raise LocalAPIError({
+                'code': 'PGRST202',
+                'message': f'Could not find the function public.{self._name}',
+            })
+        with self._client.store.lock:
+            data = func(self._client.store, self._params)
+        return LocalResponse(data)
+
+    def _metric_labels(self):
+        return self._name, 'rpc'
+
+    def _describe_filters(self):
+        return '&'.join(f'{name}={value}' for name, value in self._params.items())
+
+    _span = LocalQuery._span
+    _observe = LocalQuery._observe
+    execute = LocalQuery.execute
+
+
+class LocalAuthAdmin:
+    def __init__(self, client):
+        self._client = client
+
+    def create_user(self, attributes):
+        self._client.simulate_round_trip(1)
+        store = self._client.store
+        email = attributes.get('email', '')
+        with store.lock:
+            if email.lower() in store.auth_users:
+                raise LocalAuthError('A user with this email address has already been registered')
+            user = store.add_auth_user(email, attributes.get('password', ''))
+        return SimpleNamespace(user=SimpleNamespace(id=user['id'], email=user['email']))
+
+    def delete_user(self, user_id, should_soft_delete=False):
+        self._client.simulate_round_trip(1)
+        store = self._client.store
+        with store.lock:
+            for email, user in list(store.auth_users.items()):
+                if user['id'] == user_id:
+                    del store.auth_users[email]
+
+    def update_user_by_id(self, user_id, attributes):
+        self._client.simulate_round_trip(1)
+        store = self._client.store
+        with store.lock:
+            for user in store.auth_users.values():
+                if user['id'] == user_id:
+                    if 'password' in attributes:
+                        user['password'] = attributes['password']
+                    return SimpleNamespace(user=SimpleNamespace(id=user['id'], email=user['email']))
+        raise LocalAuthError('User not found')
+
+
+class LocalAuth:
+    def __init__(self, client):
+        self._client = client
+        self._current_user_id = None
+        self.admin = LocalAuthAdmin(client)
+
+    def _session_for(self, user):
+        return SimpleNamespace(
+            access_token=f'local-access-{user["id"]}-{uuid.uuid4().hex}',
+            refresh_token=f'local-refresh-{uuid.uuid4().hex}',
+            user=SimpleNamespace(id=user['id'], email=user['email']),
+        )
+
+    def sign_in_with_password(self, credentials):
+        self._client.simulate_round_trip(1)
+        store = self._client.store
+        with store.lock:
+            user = store.auth_users.get((credentials.get('email') or '').lower())
+            if not user or user['password'] != credentials.get('password'):
+                raise LocalAuthError('Invalid login credentials')
+            self._current_user_id = user['id']
+        session = self._session_for(user)
+        return SimpleNamespace(user=session.user, session=session)
+
+    def sign_up(self, credentials):
+        self._client.simulate_round_trip(1)
+        store = self._client.store
+        email = credentials.get('email') or ''
+        with store.lock:
+            if email.lower() in store.auth_users:
+                raise LocalAuthError('User already registered')
+            user = store.add_auth_user(email, credentials.get('password', ''))
+        return SimpleNamespace(user=SimpleNamespace(id=user['id'], email=user['email']), session=None)
+
+    def sign_out(self, options=None):
+        self._current_user_id = None
+
+    def set_session(self, access_token, refresh_token):
+        # Access tokens minted above embed the user id: local-access-<uuid>-<nonce>
+        parts = access_token.split('-')
+        self._current_user_id = '-'.join(parts[2:-1]) or None
+
+    def get_user(self, jwt=None):
+        store = self._client.store
+        with store.lock:
+            for user in store.auth_users.values():
+                if user['id'] == self._current_user_id:
+                    return SimpleNamespace(user=SimpleNamespace(id=user['id'], email=user['email']))
+        return None
+
+    def update_user(self, attributes):
+        self._client.simulate_round_trip(1)
+        store = self._client.store
+        with store.lock:
+            for user in store.auth_users.values():
+                if user['id'] == self._current_user_id:
+                    if 'password' in attributes:
+                        user['password'] = attributes['password']
+                    return SimpleNamespace(user=SimpleNamespace(id=user['id'], email=user['email']))
+        raise LocalAuthError('Auth session missing!')
+
+
+class LocalClient:
+    """Drop-in replacement for supabase.Client backed by a LocalStore."""
+
+    def __init__(self, store=None, latency_ms=20.0, jitter=0.35, row_cost_us=4.0):
+        self.store = store or LocalStore()
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.row_cost_us = row_cost_us
+        self.auth = LocalAuth(self)
+
+    def table(self, table_name):
+        return LocalQuery(self, table_name)
+
+    def from_(self, table_name):
+        return self.table(table_name)
+
+    def rpc(self, fn, params=None):
+        return LocalRpc(self, fn, params)
+
+    def round_trip_seconds(self, row_count=0):
+        """Latency to inject for one request returning row_count rows."""
+        delay = 0.0
+        if self.latency_ms > 0:
+            median = self.latency_ms / 1000.0
+            delay = random.lognormvariate(math.log(median), self.jitter) if self.jitter else median
+        return delay + row_count * self.row_cost_us / 1_000_000.0
+
+    def simulate_round_trip(self, row_count=0):
+        delay = self.round_trip_seconds(row_count)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class AsyncLocalQuery(LocalQuery):
+    async def execute(self):
+        started = time.perf_counter()
+        with self._span():
+            try:
+                response = self._run()
+            except LocalAPIError:
+                self._observe(started, outcome='error')
+                raise
+            rows = response.data if isinstance(response.data, list) else [response.data]
+            await self._client.simulate_round_trip_async(len(rows))
+            self._observe(started, len(rows))
+            return response
+
+
+class AsyncLocalRpc(LocalRpc):
+    execute = AsyncLocalQuery.execute
+
+
+class AsyncLocalClient(LocalClient):
+    """Counterpart of supabase.AsyncClient; execute() is awaited and the latency
+    is slept on the event loop. Usually shares the store of the sync client."""
+
+    def table(self, table_name):
+        return AsyncLocalQuery(self, table_name)
+
+    def rpc(self, fn, params=None):
+        return AsyncLocalRpc(self, fn, params)
+
+    async def simulate_round_trip_async(self, row_count=0):
+        delay = self.round_trip_seconds(row_count)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def create_local_client(fixture_path=None, latency_ms=None, jitter=None, row_cost_us=None):
+    """Build a LocalClient configured from the SUPABASE_LOCAL_* environment variables."""
+    client = LocalClient(
+        latency_ms=_env_float('SUPABASE_LOCAL_LATENCY_MS', 20.0) if latency_ms is None else latency_ms,
+        jitter=_env_float('SUPABASE_LOCAL_JITTER', 0.35) if jitter is None else jitter,
+        row_cost_us=_env_float('SUPABASE_LOCAL_ROW_COST_US', 4.0) if row_cost_us is None else row_cost_us,
+    )
+    fixture_path = fixture_path or os.environ.get('SUPABASE_LOCAL_FIXTURE')
+    if fixture_path:
+        with open(fixture_path, encoding='utf-8') as fixture_file:
+            client.store.load_fixture(json.load(fixture_file))
+    return client
+
+
+def create_async_local_client(store):
+    """Async client over an existing store, with the same SUPABASE_LOCAL_* latency."""
+    return AsyncLocalClient(
+        store=store,
+        latency_ms=_env_float('SUPABASE_LOCAL_LATENCY_MS', 20.0),
+        jitter=_env_float('SUPABASE_LOCAL_JITTER', 0.35),
+        row_cost_us=_env_float('SUPABASE_LOCAL_ROW_COST_US', 4.0),
+    )
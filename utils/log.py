@@ -0,0 +1,145 @@
+"""
+Logging plumbing used by settings.LOGGING.
+
+- QueueingHandler: the request thread only puts the record on an in-memory
+  queue; a listener thread formats it and writes it to stdout. When the queue
+  is full the record is dropped (and counted) instead of blocking the request.
+- JsonFormatter: one JSON object per line with the request id and any
+  extra={...} fields, for the log collector to index.
+- RequestIdFilter: stamps records with the id of the request being served
+  (set by Park_IT.middleware.RequestIdMiddleware) and, in a traced request,
+  the trace and span ids (utils/tracing.py).
+- SamplingFilter: keeps a fraction of the DEBUG records, so the per-row debug
+  output of busy views can stay on in production.
+
+    logger = logging.getLogger('parkit.views')
+    logger.info('checked in', extra={'slot_id': slot_id, 'lot_id': lot_id})
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+from .tracing import current_span
+
+# Id of the request the current thread/task is serving (None outside requests)
+request_id = contextvars.ContextVar('parkit_request_id', default=None)
+
+# LogRecord attributes that are not extra={...} fields
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'request_id', 'trace_id', 'span_id',
+}
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id.get()
+        span = current_span.get()
+        record.trace_id = span.trace_id if span is not None else None
+        record.span_id = span.span_id if span is not None else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep `rate` (0..1) of the records at or below `level`; everything above passes."""
+
+    def __init__(self, rate=1.0, level=logging.DEBUG):
+        super().__init__()
+        self.rate = float(rate)
+        self.level = logging._checkLevel(level)
+
+    def filter(self, record):
+        if record.levelno > self.level or self.rate >= 1:
+            return True
+        if random.random() >= self.rate:
+            return False
+        record.sample_rate = self.rate  # so counts can be scaled back up
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        if getattr(record, 'trace_id', None):
+            entry['trace_id'], entry['span_id'] = record.trace_id, record.span_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class QueueingHandler(logging.handlers.QueueHandler):
+    """QueueHandler with its own QueueListener writing to stdout (or stderr).
+
+    The formatter set on this handler (e.g. by dictConfig) is used by the
+    listener thread, so JSON encoding happens off the request path too.
+    """
+
+    def __init__(self, stream='stdout', maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.StreamHandler(sys.stderr if stream == 'stderr' else sys.stdout)
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def _ensure_listener(self):
+        # The listener thread doesn't survive a fork (gunicorn --preload): restart it in the worker
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Unlike the stock prepare, keep the record structured (extra fields,
+        # request_id) and only render what can't cross threads safely: the
+        # message args and the traceback
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        listener, self._listener = self._listener, None
+        if listener is not None and self._pid == os.getpid():
+            listener.stop()  # writes out what is still queued
+        self._pid = None
+        super().close()
@@ -0,0 +1,408 @@
+"""
+Prometheus metrics, served at /metrics in the text exposition format.
+
+    metrics.QUERIES.inc(table='parking_slot', operation='select', outcome='ok')
+    metrics.QUERY_LATENCY.observe(0.042, table='parking_slot', operation='select')
+
+All metrics are declared in this module, so every process knows every name.
+Values live in the process that recorded them; with several gunicorn workers,
+set settings.METRICS_DIR to a directory shared by the workers of one host
+(cleared on each deploy). Each worker then writes its values there every
+FLUSH_SECONDS and at exit, and /metrics adds up the files of all workers. The
+files of workers that have since been recycled are folded into the worker
+answering /metrics, so counters never go backwards and the directory does not
+grow with every restart.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+
+# Seconds; wide enough for a p95 alert on both cached pages and slow report queries
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+FLUSH_SECONDS = 5.0
+
+_registry = {}
+_lock = threading.Lock()
+_pid = os.getpid()
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry[name] = self
+
+    def _key(self, labels):
+        try:
+            return tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError as exc:
+            raise ValueError(f'{self.name}: missing label {exc}') from None
+
+    def _reset(self):
+        self._values = {}
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        _check_fork()
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _snapshot(self):
+        return [[list(key), value] for key, value in self._values.items()]
+
+    def _merge(self, into, rows):
+        for key, value in rows:
+            key = tuple(key)
+            into[key] = into.get(key, 0) + value
+
+    def _render(self, values):
+        lines = []
+        for key, value in sorted(values.items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, key)} {_number(value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        _check_fork()
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (not cumulative), sum, count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _snapshot(self):
+        return [[list(key), [list(state[0]), state[1], state[2]]] for key, state in self._values.items()]
+
+    def _merge(self, into, rows):
+        for key, (counts, total, count) in rows:
+            key = tuple(key)
+            state = into.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            if len(counts) != len(self.buckets):
+                continue  # written with other buckets by an older deploy
+            state[0] = [left + right for left, right in zip(state[0], counts)]
+            state[1] += total
+            state[2] += count
+
+    def _render(self, values):
+        lines = []
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, [("le", _number(bound))])} {cumulative}')
+            lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, [("le", "+Inf")])} {count}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+# -- the app's metrics --------------------------------------------------------
+
+REQUEST_LATENCY = Histogram(
+    'parkit_http_request_duration_seconds', 'Request latency by URL name (Park_IT/urls.py).', ('view', 'method')
+)
+REQUESTS = Counter(
+    'parkit_http_requests_total', 'Requests by URL name and status class.', ('view', 'method', 'status')
+)
+QUERY_LATENCY = Histogram(
+    'parkit_supabase_query_duration_seconds', 'Supabase (PostgREST) call latency.', ('table', 'operation')
+)
+QUERIES = Counter(
+    'parkit_supabase_queries_total', 'Supabase calls; outcome is ok, error (HTTP 4xx/5xx) or failed (no response).',
+    ('table', 'operation', 'outcome'),
+)
+CACHE_LOOKUPS = Counter(
+    'parkit_cache_lookups_total', 'Cache lookups; result is local (in-process hit), hit (shared cache) or miss.',
+    ('cache', 'result'),
+)
+SLOT_ACTIONS = Counter(
+    'parkit_slot_actions_total', 'Check-ins/check-outs; outcome is success, conflict, rejected or error.',
+    ('action', 'source', 'outcome'),
+)
+
+
+def outcome_for_status(status):
+    """Outcome label of a check-in/out response status."""
+    if status >= 500:
+        return 'error'
+    if status == 409:
+        return 'conflict'
+    if status >= 400:
+        return 'rejected'
+    return 'success'
+
+
+def track_slot_action(action, source='web'):
+    """Decorator counting a check-in/out view's responses (sync or async) in SLOT_ACTIONS."""
+    def decorator(view):
+        import inspect
+        from functools import wraps
+
+        if inspect.iscoroutinefunction(view):
+            @wraps(view)
+            async def awrapped(request, *args, **kwargs):
+                try:
+                    response = await view(request, *args, **kwargs)
+                except Exception:
+                    SLOT_ACTIONS.inc(action=action, source=source, outcome='error')
+                    raise
+                SLOT_ACTIONS.inc(action=action, source=source, outcome=outcome_for_status(response.status_code))
+                return response
+            return awrapped
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                SLOT_ACTIONS.inc(action=action, source=source, outcome='error')
+                raise
+            SLOT_ACTIONS.inc(action=action, source=source, outcome=outcome_for_status(response.status_code))
+            return response
+        return wrapped
+    return decorator
+
+
+# -- Supabase call parsing ----------------------------------------------------
+
+_METHOD_OPERATIONS = {'GET': 'select', 'HEAD': 'count', 'POST': 'insert', 'PATCH': 'update', 'DELETE': 'delete'}
+
+
+def describe_request(method, path, prefer=''):
+    """(table, operation) of a PostgREST request, e.g. ('parking_slot', 'update')."""
+    segments = [segment for segment in path.split('/') if segment]
+    if 'v1' in segments:
+        segments = segments[segments.index('v1') + 1:]
+    if segments[:1] == ['rpc'] and len(segments) > 1:
+        return segments[1], 'rpc'
+    operation = _METHOD_OPERATIONS.get(method.upper(), method.lower())
+    if operation == 'insert' and 'resolution=' in (prefer or ''):
+        operation = 'upsert'
+    return (segments[0] if segments else ''), operation
+
+
+def observe_query(table, operation, seconds, outcome='ok'):
+    QUERIES.inc(table=table, operation=operation, outcome=outcome)
+    QUERY_LATENCY.observe(seconds, table=table, operation=operation)
+
+
+# -- multi-process aggregation ------------------------------------------------
+
+def _read_metrics_dir():
+    try:
+        from django.conf import settings
+        if settings.configured:
+            return getattr(settings, 'METRICS_DIR', None)
+    except ImportError:
+        pass
+    return os.environ.get('METRICS_DIR')
+
+
+_UNRESOLVED = object()
+_directory = _UNRESOLVED
+_file = None
+_flusher = None
+_exit_flush = False
+
+
+def _metrics_dir():
+    # Read once, on the first metric recorded; the exit flush must not touch settings
+    global _directory
+    if _directory is _UNRESOLVED:
+        _directory = _read_metrics_dir()
+    return _directory
+
+
+def _check_fork():
+    # A forked worker starts from zero; its parent's values are in the parent's file
+    global _pid, _file, _flusher
+    if os.getpid() != _pid:
+        with _lock:
+            if os.getpid() != _pid:
+                for metric in _registry.values():
+                    metric._reset()
+                _pid, _file, _flusher = os.getpid(), None, None
+    if _flusher is None:
+        _start_flusher()
+
+
+def _start_flusher():
+    global _flusher
+    with _lock:
+        if _flusher is not None:
+            return
+        if not _metrics_dir():
+            _flusher = False  # single process: nothing to write
+            return
+        _flusher = threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True)
+        _flusher.start()
+        _register_exit_flush()
+
+
+def _register_exit_flush():
+    # Once per process tree: a forked worker inherits the handler, which flushes its own file
+    global _exit_flush
+    if not _exit_flush:
+        _exit_flush = True
+        atexit.register(_flush_at_exit)
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except OSError:
+        pass
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def snapshot():
+    with _lock:
+        return {name: metric._snapshot() for name, metric in _registry.items()}
+
+
+def flush():
+    """Write this process's values to its file in METRICS_DIR (no-op without one)."""
+    global _file
+    directory = _metrics_dir()
+    if not directory:
+        return
+    if _file is None:
+        os.makedirs(directory, exist_ok=True)
+        _file = os.path.join(directory, f'metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+    temporary = f'{_file}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as handle:
+        json.dump(snapshot(), handle)
+    os.replace(temporary, _file)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists, owned by another user
+    return True
+
+
+def _absorb_exited(directory):
+    """
+    Fold the files of workers that have exited into this process's values.
+
+    Each file is claimed with an atomic rename, so only one worker takes it
+    and its values are counted once; the caller flushes and then removes the
+    claimed paths returned. The directory keeps one file per live worker
+    instead of one per worker ever started. Process ids are only meaningful on
+    this host and only checked on POSIX (os.kill(pid, 0) would end the
+    process on Windows).
+    """
+    if os.name != 'posix':
+        return []
+    claimed = []
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        try:
+            pid = int(os.path.basename(path).split('-')[1])
+        except (IndexError, ValueError):
+            continue
+        if pid == os.getpid() or _alive(pid):
+            continue
+        taken = f'{path}.{os.getpid()}.absorbed'
+        try:
+            os.rename(path, taken)
+            with open(taken, encoding='utf-8') as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            continue  # claimed by another worker first
+        with _lock:
+            for name, rows in data.items():
+                if name in _registry:
+                    _registry[name]._merge(_registry[name]._values, rows)
+        claimed.append(taken)
+    return claimed
+
+
+def collect():
+    """{metric name: merged values} over every process (just this one without METRICS_DIR)."""
+    directory = _metrics_dir()
+    if not directory:
+        snapshots = [snapshot()]
+    else:
+        absorbed = _absorb_exited(directory)
+        flush()
+        for path in absorbed:
+            os.remove(path)
+        snapshots = []
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            try:
+                with open(path, encoding='utf-8') as handle:
+                    snapshots.append(json.load(handle))
+            except (OSError, ValueError):
+                continue  # being replaced; its values are counted on the next scrape
+    merged = {name: {} for name in _registry}
+    for data in snapshots:
+        for name, rows in data.items():
+            if name in _registry:
+                _registry[name]._merge(merged[name], rows)
+    return merged
+
+
+def render():
+    """All metrics in the Prometheus text format (version 0.0.4)."""
+    merged = collect()
+    lines = []
+    for name, metric in _registry.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        lines.extend(metric._render(merged[name]))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,656 @@
+"""
+In-memory occupancy state per parking lot.
+
+Two kinds of state, both loaded lazily and then kept up to date in place by the
+views that change a slot (check-in/out, status change, delete, seeding):
+
+- per-lot totals (slots, filled) from one aggregate query, enough for the
+  occupancy summaries and the lot dropdown;
+- the slots of a lot, read with a lot_id filter the first time its grid is
+  shown, so a grid costs O(slots in the lot) rather than the whole table, and
+  held as a compact slot_snapshot.LotSnapshot.
+
+Each worker process has its own engine and only sees its own writes directly.
+With a shared cache (REDIS_URL) every write also bumps a per-lot generation
+counter there, and a worker re-reads a lot whose counter moved, checked at most
+every settings.OCCUPANCY_SHARED_CHECK_SECONDS; so another worker's check-in
+shows in this worker's grids, ETags and ?since= deltas within about a second.
+Without one (or for changes made in the Supabase dashboard) state is only
+re-read once it is older than settings.OCCUPANCY_RECONCILE_SECONDS, so run a
+single worker without REDIS_URL.
+
+The totals come from the lot_occupancy() function in sql/lot_occupancy.sql (run
+it once in the Supabase SQL editor); without it they fall back to count queries.
+"""
+import logging
+import threading
+import time
+import uuid
+
+from .concurrency import fan_out
+from .local_backend import register_rpc
+from .resilience import arun_query, is_transient, run_query
+from .slot_snapshot import FILLED_STATUSES, LotSnapshot
+from .supabase_client import supabase
+
+logger = logging.getLogger('parkit.occupancy')
+
+DEFAULT_RECONCILE_SECONDS = 60
+DEFAULT_SHARED_CHECK_SECONDS = 1.0
+
+# Generation counters in the shared cache: one per lot, one for the totals, and
+# one bumped by invalidate() that all state is compared against too
+GENERATION_PREFIX = 'parkit:occupancy'
+COUNTS_GENERATION = f'{GENERATION_PREFIX}:counts'
+RESET_GENERATION = f'{GENERATION_PREFIX}:reset'
+
+# Fallback paths already logged by _warn_once()
+_warned = set()
+
+
+def _setting(name, default):
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def _shared_cache():
+    """Django's cache when it is shared by the workers (not per-process), else None."""
+    try:
+        from django.conf import settings
+        if not settings.configured:
+            return None
+        from django.core.cache import cache
+        from django.core.cache.backends.locmem import LocMemCache
+    except ImportError:
+        return None
+    return None if isinstance(cache, LocMemCache) else cache
+
+
+def _lot_generation(lot_id):
+    return f'{GENERATION_PREFIX}:lot:{lot_id}'
+
+
+def _bump(cache, key):
+    """Increment a shared generation counter; its new value, or None when unknown."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Never set or evicted
+        return 1 if cache.add(key, 1, None) else None
+
+
+def _advance(seen, bumped):
+    # This worker's own write keeps its state current only if nobody else wrote in between
+    if seen is not None and bumped is not None and seen[0] == bumped - 1:
+        return (bumped,) + seen[1:]
+    return seen
+
+
+def _normalize_id(value):
+    # Lot/slot ids arrive as int from the database and as str from URLs and forms
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _slot_sort_key(slot):
+    slot_num = slot.get('slot_number')
+    if slot_num is None:
+        return (True, 0)
+    try:
+        return (False, int(slot_num))
+    except (ValueError, TypeError):
+        return (False, 0)
+
+
+def _is_filled(slot):
+    return (slot.get('status') or 'available').lower() in FILLED_STATUSES
+
+
+@register_rpc('lot_occupancy')
+def _local_lot_occupancy(store, params):
+    # SUPABASE_BACKEND=local version of sql/lot_occupancy.sql
+    totals = {}
+    for row in store.tables['parking_slot'].values():
+        if row.get('lot_id') is None:
+            continue
+        counts = totals.setdefault(row['lot_id'], [0, 0])
+        counts[0] += 1
+        counts[1] += _is_filled(row)
+    return [{'lot_id': lot_id, 'total': total, 'occupied': filled} for lot_id, (total, filled) in totals.items()]
+
+
+def load_lot_slots(lot_id):
+    """One lot's parking_slot rows, falling back to the base columns on older schemas."""
+    try:
+        rows = run_query(supabase.table('parking_slot').select(
+            'id, lot_id, slot_number, status, license_plate, check_in_time'
+        ).eq('lot_id', lot_id), 'slots.lot').data or []
+    except Exception:
+        rows = run_query(
+            supabase.table('parking_slot').select('id, lot_id, slot_number, status').eq('lot_id', lot_id), 'slots.lot'
+        ).data or []
+    for row in rows:
+        row.setdefault('license_plate', None)
+        row.setdefault('check_in_time', None)
+    return rows
+
+@register_rpc('set_slot_statuses')
+def _local_set_slot_statuses(store, params):
+    # SUPABASE_BACKEND=local version of sql/set_slot_statuses.sql
+    table = store.tables['parking_slot']
+    updated = []
+    for change in params.get('changes') or []:
+        row = table.get(change['id'])
+        if row is not None and row.get('status') == change.get('expected'):
+            row['status'] = change['status']
+            updated.append(dict(row))
+    return updated
+
+
+def _warn_once(name, message):
+    if name not in _warned:
+        _warned.add(name)
+        logger.warning(message)
+
+
+def set_slot_statuses(changes):
+    """Set the status of many slots, [{'id', 'status', 'expected'}], in one statement.
+
+    Each slot is only changed while its status is still 'expected' (as read),
+    so a slot checked in meanwhile is left alone. Uses the set_slot_statuses()
+    function from sql/set_slot_statuses.sql; without it, one UPDATE per
+    (expected, status) pair. Returns the ids of the slots updated.
+    """
+    try:
+        # Not retried, like transition_slot(): a repeat of an update that landed matches nothing
+        response = run_query(
+            supabase.rpc('set_slot_statuses', {'changes': changes}), 'slots.bulk_status', idempotent=False
+        )
+        return {row['id'] for row in response.data or []}
+    except Exception as exc:
+        if is_transient(exc):
+            raise
+        _warn_once('set_slot_statuses', 'set_slot_statuses() is not installed (sql/set_slot_statuses.sql); '
+                                        'bulk status changes use one UPDATE per status')
+
+    ids_by_pair = {}
+    for change in changes:
+        ids_by_pair.setdefault((change['expected'], change['status']), []).append(change['id'])
+    updated = set()
+    for (expected, status), slot_ids in ids_by_pair.items():
+        query = supabase.table('parking_slot').update({'status': status}).in_('id', slot_ids)
+        query = query.is_('status', 'null') if expected is None else query.eq('status', expected)
+        response = run_query(query, 'slots.bulk_status', idempotent=False)
+        updated.update(row['id'] for row in response.data or [])
+    return updated
+
+
+def parking_of(row):
+    """A slot row's license_plate/check_in_time as read, for transition_slot(expected=...)."""
+    return {column: row[column] for column in ('license_plate', 'check_in_time') if column in row}
+
+
+def _slot_matches(query, expected_status, expected):
+    for column, value in dict(expected or {}, status=expected_status).items():
+        query = query.is_(column, 'null') if value is None else query.eq(column, value)
+    return query
+
+
+def transition_slot(slot_id, expected_status, status, site, fields=None, expected=None):
+    """
+    Compare-and-set a slot's status: the write only applies while the slot still
+    has expected_status (the value just read), as one UPDATE ... WHERE id = ? AND
+    status = ?. Returns False when another request changed the slot first, so of
+    two concurrent check-ins of the same slot exactly one succeeds.
+
+    expected holds the other columns as read, e.g. the license_plate and
+    check_in_time of the parking being ended. They are matched too, since a slot
+    checked out and taken by another vehicle in between is 'occupied' again and
+    status alone would end the wrong parking. check_in_time is set on every
+    check-in, so with it the predicate names one parking, not just a status.
+
+    fields (license_plate, check_in_time) are written in the same statement when
+    those columns exist.
+    """
+    def attempt(values, expected):
+        query = _slot_matches(
+            supabase.table('parking_slot').update(values).eq('id', slot_id), expected_status, expected
+        )
+        # Not retried: repeating an update that did land would match nothing and read as a conflict
+        return bool(run_query(query, site, idempotent=False).data)
+
+    if fields or expected:
+        try:
+            return attempt(dict(fields or {}, status=status), expected)
+        except Exception as exc:
+            if is_transient(exc):
+                raise
+            # license_plate/check_in_time columns not added yet; nothing was written
+    return attempt({'status': status}, None)
+
+
+async def atransition_slot(client, slot_id, expected_status, status, site, fields=None, expected=None):
+    """transition_slot() for async views, through the async Supabase client."""
+    async def attempt(values, expected):
+        query = _slot_matches(
+            client.table('parking_slot').update(values).eq('id', slot_id), expected_status, expected
+        )
+        return bool((await arun_query(query, site, idempotent=False)).data)
+
+    if fields or expected:
+        try:
+            return await attempt(dict(fields or {}, status=status), expected)
+        except Exception as exc:
+            if is_transient(exc):
+                raise
+    return await attempt({'status': status}, None)
+
+
+def _count_slots(lot_id, filled_only=False):
+    query = supabase.table('parking_slot').select('id', count='exact').eq('lot_id', lot_id)
+    if filled_only:
+        query = query.in_('status', sorted(FILLED_STATUSES))
+    return run_query(query.limit(1), 'slots.count').count or 0
+
+
+def load_lot_counts():
+    """{lot_id: (total, filled)} for every lot that has slots."""
+    try:
+        rows = run_query(supabase.rpc('lot_occupancy', {}), 'slots.occupancy').data or []
+        return {_normalize_id(row['lot_id']): (int(row['total']), int(row['occupied'])) for row in rows}
+    except Exception as exc:
+        if is_transient(exc):
+            raise
+        # lot_occupancy() not installed: two count queries per lot (status must be lowercase)
+        _warn_once('lot_occupancy', 'lot_occupancy() is not installed (sql/lot_occupancy.sql); '
+                                    'occupancy totals use two count queries per lot')
+
+    from .reference_cache import get_lots
+    lot_ids = [lot['id'] for lot in get_lots()]
+    calls = {}
+    for lot_id in lot_ids:
+        calls[('total', lot_id)] = lambda lot_id=lot_id: _count_slots(lot_id)
+        calls[('filled', lot_id)] = lambda lot_id=lot_id: _count_slots(lot_id, filled_only=True)
+    results = fan_out(calls)
+    if results.errors:
+        raise next(iter(results.errors.values()))
+    return {
+        _normalize_id(lot_id): (results[('total', lot_id)], results[('filled', lot_id)])
+        for lot_id in lot_ids
+        if results[('total', lot_id)]
+    }
+
+
+class _LotState:
+    __slots__ = ('slots', 'loaded_at', 'generation', 'checked_at', 'version', 'floor', 'changed', 'removed')
+
+    def __init__(self, slots, loaded_at):
+        self.slots = slots  # LotSnapshot
+        self.loaded_at = loaded_at
+        self.generation = None  # shared (lot, reset) generations the slots reflect
+        self.checked_at = loaded_at
+        self.version = 0    # engine version of the lot's last change
+        self.floor = 0      # first version the change logs below cover
+        self.changed = {}   # slot_id -> version of its last change
+        self.removed = {}   # slot_id -> version it was removed at
+
+    def mark(self, slot_id, version, removed=False):
+        (self.changed if removed else self.removed).pop(slot_id, None)
+        (self.removed if removed else self.changed)[slot_id] = version
+        self.version = version
+
+
+class OccupancyEngine:
+    """Lazily loaded per-lot totals and slot states, updated in place."""
+
+    def __init__(self, slot_loader=load_lot_slots, counts_loader=load_lot_counts, reconcile_seconds=None,
+                 shared_cache=_shared_cache, shared_check_seconds=None):
+        self.slot_loader = slot_loader
+        self.counts_loader = counts_loader
+        self.reconcile_seconds = reconcile_seconds
+        self.shared_cache = shared_cache
+        self.shared_check_seconds = shared_check_seconds
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        self._lots = {}          # lot_id -> _LotState, for lots whose grid was shown
+        self._slot_lots = {}     # slot_id -> lot_id, for those lots
+        self._counts = None      # lot_id -> [total, filled] from the aggregate
+        self._counts_at = None
+        self._counts_generation = None
+        self._counts_checked_at = None
+        self._counts_dirty = False
+        self._pending = {}       # load key -> changes applied while it was reading
+        self._listeners = []
+        self.version = 0
+        # Versions are only comparable within one engine (one worker process)
+        self.epoch = uuid.uuid4().hex[:8]
+
+    # -- loading -----------------------------------------------------------
+
+    def _reconcile_interval(self):
+        if self.reconcile_seconds is not None:
+            return self.reconcile_seconds
+        return float(_setting('OCCUPANCY_RECONCILE_SECONDS', DEFAULT_RECONCILE_SECONDS))
+
+    def _is_stale(self, loaded_at):
+        return loaded_at is None or time.monotonic() - loaded_at >= self._reconcile_interval()
+
+    def _check_due(self, checked_at):
+        # Answers from memory; the shared generations are only read by ensure_*()
+        if self.shared_cache() is None:
+            return False
+        interval = self.shared_check_seconds
+        if interval is None:
+            interval = float(_setting('OCCUPANCY_SHARED_CHECK_SECONDS', DEFAULT_SHARED_CHECK_SECONDS))
+        return checked_at is None or time.monotonic() - checked_at >= interval
+
+    def _generations(self, *keys):
+        """Current values of shared generation counters, or None without a shared cache."""
+        cache = self.shared_cache()
+        if cache is None:
+            return None
+        try:
+            values = cache.get_many(keys + (RESET_GENERATION,))
+        except Exception:
+            return None  # cache down: fall back to the reconcile interval
+        return tuple(values.get(key, 0) for key in keys + (RESET_GENERATION,))
+
+    def counts_fresh(self):
+        return (self._counts is not None and not self._counts_dirty and not self._is_stale(self._counts_at)
+                and not self._check_due(self._counts_checked_at))
+
+    def lot_fresh(self, lot_id):
+        state = self._lots.get(_normalize_id(lot_id))
+        return state is not None and not self._is_stale(state.loaded_at) and not self._check_due(state.checked_at)
+
+    def _load(self, key, has_state, load):
+        """Run load() in one thread per key.
+
+        Without any state the callers wait for it; with stale state they keep
+        serving it while the thread holding the lock reloads.
+        """
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        if not load_lock.acquire(blocking=not has_state):
+            return
+        try:
+            with self._lock:
+                self._pending[key] = []
+            try:
+                result = load()
+            except Exception:
+                if not has_state:
+                    raise
+                return  # keep serving the previous state; retried on the next call
+            finally:
+                with self._lock:
+                    pending = self._pending.pop(key)
+            return result, pending
+        finally:
+            load_lock.release()
+
+    def ensure_counts(self):
+        if self.counts_fresh():
+            return
+        generation = self._generations(COUNTS_GENERATION)
+        with self._lock:
+            if (self._counts is not None and not self._counts_dirty and not self._is_stale(self._counts_at)
+                    and generation in (None, self._counts_generation)):
+                # No other worker wrote since the totals were read
+                self._counts_checked_at = time.monotonic()
+                return
+            self._counts_dirty = False
+        loaded = self._load('counts', self._counts is not None, self.counts_loader)
+        if loaded is None:
+            return
+        counts, pending = loaded
+        with self._lock:
+            self._counts = {lot_id: list(totals) for lot_id, totals in counts.items()}
+            self._counts_at = self._counts_checked_at = time.monotonic()
+            # Read before the aggregate, so a write made while it ran shows as a new generation
+            self._counts_generation = generation
+            # A write made while the aggregate ran may be missing from it
+            if pending:
+                self._counts_dirty = True
+            self.version += 1
+
+    def ensure_lot(self, lot_id):
+        lot_id = _normalize_id(lot_id)
+        if lot_id is None or self.lot_fresh(lot_id):
+            return
+        generation = self._generations(_lot_generation(lot_id))
+        with self._lock:
+            state = self._lots.get(lot_id)
+            if state is not None and not self._is_stale(state.loaded_at) \
+                    and generation in (None, state.generation):
+                # No other worker wrote to the lot since its slots were read
+                state.checked_at = time.monotonic()
+                return
+        loaded = self._load(('lot', lot_id), lot_id in self._lots, lambda: self.slot_loader(lot_id))
+        if loaded is None:
+            return
+        rows, pending = loaded
+
+        slots = LotSnapshot(lot_id)
+        for row in rows:
+            slots.add(dict(row, id=_normalize_id(row.get('id')), slot_number=_normalize_id(row.get('slot_number'))))
+        state = _LotState(slots, time.monotonic())
+        # Read before the rows, so a write made while they were read shows as a new generation
+        state.generation = generation
+
+        with self._lock:
+            self.version += 1
+            previous = self._lots.get(lot_id)
+            if previous is None:
+                state.version = state.floor = self.version
+            else:
+                for slot_id in previous.slots.slot_ids():
+                    self._slot_lots.pop(slot_id, None)
+                self._carry_changes(previous, state)
+            self._lots[lot_id] = state
+            self._slot_lots.update(dict.fromkeys(slots.slot_ids(), lot_id))
+            # Writes made while the rows were being read may be missing from them
+            for change in pending:
+                change()
+
+    def _carry_changes(self, previous, state):
+        # Keep the change log across a reconcile, logging what the reload changed
+        state.version, state.floor = previous.version, previous.floor
+        state.changed, state.removed = previous.changed, previous.removed
+        old = {slot['id']: slot for slot in previous.slots.iter_slots()}
+        for slot in state.slots.iter_slots():
+            if old.pop(slot['id'], None) != slot:
+                state.mark(slot['id'], self.version)
+        for slot_id in old:
+            state.mark(slot_id, self.version, removed=True)
+
+    def invalidate(self):
+        """Re-read everything on next use (e.g. after bulk changes), in every worker."""
+        with self._lock:
+            self._counts_dirty = True
+            for state in self._lots.values():
+                state.loaded_at = None
+        cache = self.shared_cache()
+        if cache is not None:
+            try:
+                _bump(cache, RESET_GENERATION)
+            except Exception:
+                pass  # the other workers reconcile after OCCUPANCY_RECONCILE_SECONDS
+
+    def _publish(self, lot_id):
+        """Bump the shared generations a write changed, keeping this worker's own state current."""
+        cache = self.shared_cache()
+        if cache is None:
+            return
+        try:
+            counts = _bump(cache, COUNTS_GENERATION)
+            lot = _bump(cache, _lot_generation(lot_id)) if lot_id is not None else None
+        except Exception:
+            return  # the other workers reconcile after OCCUPANCY_RECONCILE_SECONDS
+        with self._lock:
+            self._counts_generation = _advance(self._counts_generation, counts)
+            state = self._lots.get(lot_id)
+            if state is not None:
+                state.generation = _advance(state.generation, lot)
+
+    # -- incremental updates -----------------------------------------------
+
+    def add_listener(self, listener):
+        """Call listener(lot_id, slot_id, fields) after each change (fields None on removal)."""
+        self._listeners.append(listener)
+
+    def _notify(self, lot_id, slot_id, fields):
+        if lot_id is None:
+            return
+        for listener in self._listeners:
+            try:
+                listener(lot_id, slot_id, fields)
+            except Exception:
+                pass  # a listener never fails the write that triggered it
+
+    def _record(self, change):
+        with self._lock:
+            self.version += 1
+            change()
+            for pending in self._pending.values():
+                pending.append(change)
+
+    def upsert_slot(self, row):
+        """Add a slot or update the given fields of a known one.
+
+        row must have 'id'; give 'lot_id' too when known, so a change to a lot
+        whose slots are not held still updates its totals.
+        """
+        row = dict(row)
+        slot_id = _normalize_id(row.get('id'))
+
+        def change():
+            lot_id = self._slot_lots.get(slot_id)
+            if lot_id is None:
+                lot_id = _normalize_id(row.get('lot_id'))
+                state = self._lots.get(lot_id)
+                if state is None:
+                    # Slots of this lot are not held: re-aggregate the totals on next use
+                    self._counts_dirty = True
+                    return
+                if 'slot_number' not in row:
+                    # Partial update of a slot created since the lot was read
+                    state.loaded_at = None
+                    return
+                state.slots.add(dict(row, id=slot_id, slot_number=_normalize_id(row['slot_number'])))
+                state.mark(slot_id, self.version)
+                self._slot_lots[slot_id] = lot_id
+                return
+            state = self._lots[lot_id]
+            state.slots.update(slot_id, row)
+            state.mark(slot_id, self.version)
+
+        self._record(change)
+        with self._lock:
+            lot_id = self._slot_lots.get(slot_id, _normalize_id(row.get('lot_id')))
+        self._publish(lot_id)
+        self._notify(lot_id, slot_id, {
+            field: value for field, value in row.items() if field not in ('id', 'lot_id')
+        })
+
+    def set_status(self, slot_id, status, lot_id=None):
+        self.upsert_slot({'id': slot_id, 'lot_id': lot_id, 'status': status})
+
+    def check_in(self, slot_id, license_plate, check_in_time, lot_id=None):
+        self.upsert_slot({
+            'id': slot_id, 'lot_id': lot_id, 'status': 'occupied',
+            'license_plate': license_plate, 'check_in_time': check_in_time,
+        })
+
+    def check_out(self, slot_id, lot_id=None):
+        self.upsert_slot({
+            'id': slot_id, 'lot_id': lot_id, 'status': 'available', 'license_plate': None, 'check_in_time': None,
+        })
+
+    def remove_slot(self, slot_id, lot_id=None):
+        slot_id = _normalize_id(slot_id)
+
+        def change():
+            held_lot = self._slot_lots.pop(slot_id, None)
+            if held_lot is not None:
+                state = self._lots[held_lot]
+                state.slots.remove(slot_id)
+                state.mark(slot_id, self.version, removed=True)
+            else:
+                self._counts_dirty = True
+
+        with self._lock:
+            held_lot = self._slot_lots.get(slot_id)
+        self._record(change)
+        lot_id = held_lot if held_lot is not None else _normalize_id(lot_id)
+        self._publish(lot_id)
+        self._notify(lot_id, slot_id, None)
+
+    # -- queries -----------------------------------------------------------
+
+    def lot_counts(self):
+        """{lot_id: {'total', 'occupied', 'available'}} for every lot with slots."""
+        self.ensure_counts()
+        with self._lock:
+            totals = {lot_id: tuple(counts) for lot_id, counts in (self._counts or {}).items()}
+            # Held lots are exact and include this worker's latest writes
+            for lot_id, state in self._lots.items():
+                if not self._is_stale(state.loaded_at):
+                    totals[lot_id] = (state.slots.total, state.slots.filled)
+        return {
+            lot_id: {'total': total, 'occupied': filled, 'available': total - filled}
+            for lot_id, (total, filled) in totals.items()
+            if total
+        }
+
+    def lot_slots(self, lot_id):
+        """Copies of one lot's slots, ordered by slot number."""
+        self.ensure_lot(lot_id)
+        with self._lock:
+            state = self._lots.get(_normalize_id(lot_id))
+            return list(state.slots.iter_slots()) if state else []
+
+    def lot_grid(self, lot_id, since=None):
+        """One lot's slots with the version of its last change.
+
+        With since (a version from an earlier call to this engine) only the
+        slots changed or removed after it are returned; 'full' is False then.
+        """
+        lot_id = _normalize_id(lot_id)
+        self.ensure_lot(lot_id)
+        with self._lock:
+            state = self._lots.get(lot_id)
+            if state is None:
+                return None
+            grid = {
+                'version': state.version,
+                'total': state.slots.total,
+                'filled': state.slots.filled,
+                'removed': [],
+            }
+            if since is None or not state.floor <= since <= self.version:
+                grid.update(full=True, slots=list(state.slots.iter_slots()))
+                return grid
+            changed = [slot_id for slot_id, version in state.changed.items() if version > since]
+            grid.update(
+                full=False,
+                slots=sorted(filter(None, map(state.slots.slot, changed)), key=_slot_sort_key),
+                removed=[slot_id for slot_id, version in state.removed.items() if version > since],
+            )
+            return grid
+
+    def slot(self, slot_id):
+        """A slot's state if its lot is held, else None."""
+        with self._lock:
+            lot_id = self._slot_lots.get(_normalize_id(slot_id))
+            if lot_id is None:
+                return None
+            return self._lots[lot_id].slots.slot(_normalize_id(slot_id))
+
+
+engine = OccupancyEngine()
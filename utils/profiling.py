@@ -0,0 +1,336 @@
+"""
+Profiling: single requests on demand, and a continuous low-rate sampler.
+
+An admin asks /api/admin/profile-link/?path=/admin/reports/ for a signed link,
+opens it, and that one request runs under a profiler:
+
+    mode=sample    (default) the request thread's stack is sampled every
+                   PROFILE_SAMPLE_INTERVAL seconds into collapsed stacks
+                   ("frame;frame;frame weight" lines, weighted in
+                   microseconds), the input format of flamegraph.pl,
+                   speedscope and inferno;
+    mode=cprofile  cProfile over the request, as a pstats file (snakeviz,
+                   python -m pstats).
+
+The profile is saved under settings.PROFILE_DIR (its name is returned in the
+X-Profile-File header) or, with download=1, returned instead of the page.
+The link is bound to the admin's session and expires after
+PROFILE_TOKEN_MAX_AGE seconds. Requests without a link pay one dict lookup.
+
+The continuous sampler (ContinuousSampler, started by
+ContinuousProfilingMiddleware) samples the threads serving requests every
+PROFILER_SAMPLE_INTERVAL seconds, all day, and writes what it saw to
+PROFILER_DIR every PROFILER_FLUSH_SECONDS as collapsed stacks whose root frame
+is the view ("view:dashboard;..."). `manage.py profile_stacks` merges them over
+a time range (e.g. the 7-9am rush) into one file or an SVG flamegraph.
+"""
+import cProfile
+import glob
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger('parkit.profiling')
+
+SALT = 'parkit.profile'
+MODES = ('sample', 'cprofile')
+DEFAULT_SAMPLE_INTERVAL = 0.001
+DEFAULT_TOKEN_MAX_AGE = 900
+
+
+def _setting(name, default):
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except ImportError:
+        return default
+
+
+def frame_label(frame):
+    """'views.py:handle_check_in:2648' - no ';' or spaces, as collapsed stacks need."""
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}'.replace(';', ':').replace(' ', '_')
+
+
+def collapse(frame, limit=128):
+    """The stack of frame as one collapsed-stack key, outermost frame first."""
+    labels = []
+    while frame is not None and len(labels) < limit:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+def render_collapsed(counts):
+    """Collapsed-stack text from {stack: weight}."""
+    return ''.join(f'{stack} {count}\n' for stack, count in sorted(counts.items()) if count)
+
+
+class ThreadSampler:
+    """Samples the stack of one thread every `interval` seconds from a helper thread.
+
+    While the sampled thread holds the GIL the sampler wakes up late, so each
+    sample is weighted by the microseconds since the previous one; otherwise
+    CPU-bound code would look cheaper than code waiting on I/O.
+    """
+
+    def __init__(self, thread_id, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.counts[collapse(frame)] += int((now - last) * 1_000_000)
+            last = now
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+
+# -- signed links -------------------------------------------------------------
+
+def make_token(user_id, mode='sample', download=False):
+    from django.core import signing
+
+    if mode not in MODES:
+        raise ValueError(f'mode must be one of {", ".join(MODES)}')
+    return signing.dumps({'uid': str(user_id), 'mode': mode, 'download': bool(download)}, salt=SALT, compress=True)
+
+
+def read_token(token, user_id):
+    """The token's options if it is valid, unexpired and was issued to user_id; else None."""
+    from django.core import signing
+
+    try:
+        options = signing.loads(token, salt=SALT, max_age=int(_setting('PROFILE_TOKEN_MAX_AGE', DEFAULT_TOKEN_MAX_AGE)))
+    except signing.BadSignature:
+        return None
+    if user_id is None or options.get('uid') != str(user_id) or options.get('mode') not in MODES:
+        return None
+    return options
+
+
+def profile_link(path, user_id, mode='sample', download=False):
+    separator = '&' if '?' in path else '?'
+    return f'{path}{separator}profile={make_token(user_id, mode, download)}'
+
+
+# -- running a request under the profiler --------------------------------------
+
+class RequestProfile:
+    """Profiler for the request running on the current thread."""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.started = None
+        self.seconds = None
+        self._sampler = None
+        self._profiler = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            interval = float(_setting('PROFILE_SAMPLE_INTERVAL', DEFAULT_SAMPLE_INTERVAL))
+            self._sampler = ThreadSampler(threading.get_ident(), interval).start()
+        return self
+
+    def stop(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    @property
+    def extension(self):
+        return 'prof' if self.mode == 'cprofile' else 'folded'
+
+    def content(self):
+        """The profile file as bytes."""
+        if self._profiler is not None:
+            import marshal
+            import pstats
+
+            stats = pstats.Stats(self._profiler)
+            return marshal.dumps(stats.stats)  # what Stats.dump_stats() writes
+        return render_collapsed(self._sampler.counts).encode()
+
+    def save(self, name):
+        """Write the profile under PROFILE_DIR; returns the file name."""
+        directory = str(_setting('PROFILE_DIR', 'profiles'))
+        os.makedirs(directory, exist_ok=True)
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}.{self.extension}"
+        with open(os.path.join(directory, filename), 'wb') as handle:
+            handle.write(self.content())
+        return filename
+
+
+# -- continuous sampling -------------------------------------------------------
+
+DEFAULT_CONTINUOUS_INTERVAL = 0.02
+DEFAULT_FLUSH_SECONDS = 60.0
+DEFAULT_RETENTION_DAYS = 7
+# Above this share of one CPU spent sampling, the interval is doubled
+MAX_OVERHEAD = 0.01
+FILE_TIME_FORMAT = '%Y%m%d-%H%M%S'
+
+
+def view_label(request):
+    """URL name of the request's view ('unresolved' before URL resolution)."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return (match.url_name or match.view_name or 'unnamed').replace(';', ':').replace(' ', '_')
+
+
+class ContinuousSampler:
+    """Samples the threads registered as serving a request, per view.
+
+    Each stack is weighted by the microseconds since the previous tick (see
+    ThreadSampler). The sampler measures its own CPU time and backs off when it
+    exceeds MAX_OVERHEAD of the wall time.
+    """
+
+    def __init__(self, directory, interval=DEFAULT_CONTINUOUS_INTERVAL, flush_seconds=DEFAULT_FLUSH_SECONDS,
+                 retention_days=DEFAULT_RETENTION_DAYS):
+        self.directory = str(directory)
+        self.interval = interval
+        self.flush_seconds = flush_seconds
+        self.retention_days = retention_days
+        self.pid = os.getpid()
+        self.counts = Counter()
+        self._inflight = {}  # thread id -> request being served
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='continuous-profiler', daemon=True)
+
+    # Called on the request threads; plain dict writes, no lock needed
+    def enter(self, request):
+        self._inflight[threading.get_ident()] = request
+
+    def exit(self):
+        self._inflight.pop(threading.get_ident(), None)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+    def _sample(self, weight):
+        if not self._inflight:
+            return
+        frames = sys._current_frames()
+        with self._lock:
+            for thread_id, request in list(self._inflight.items()):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.counts[f'view:{view_label(request)};{collapse(frame)}'] += weight
+
+    def _run(self):
+        last = window_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        next_flush = time.monotonic() + self.flush_seconds
+        # Jittered ticks, so periodic work is not always hit (or always missed)
+        while not self._stop.wait(self.interval * random.uniform(0.5, 1.5)):
+            now = time.perf_counter()
+            self._sample(int((now - last) * 1_000_000))
+            last = now
+            if time.monotonic() >= next_flush:
+                overhead = (time.thread_time() - cpu_start) / max(now - window_start, 1e-9)
+                if overhead > MAX_OVERHEAD:
+                    self.interval *= 2
+                    logger.warning('Continuous profiler used %.2f%% CPU; sampling every %.3fs now',
+                                   overhead * 100, self.interval)
+                try:
+                    self.flush()
+                except OSError as exc:
+                    logger.warning('Continuous profiler could not write its stacks: %s', exc)
+                window_start, cpu_start = now, time.thread_time()
+                next_flush = time.monotonic() + self.flush_seconds
+
+    def flush(self):
+        """Write the stacks gathered since the last flush to a new file; returns its path."""
+        with self._lock:
+            counts, self.counts = self.counts, Counter()
+        self._prune()
+        if not counts:
+            return None
+        path = os.path.join(self.directory, f'{time.strftime(FILE_TIME_FORMAT)}-{self.pid}.folded')
+        with open(path, 'a', encoding='utf-8') as handle:
+            handle.write(render_collapsed(counts))
+        return path
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_days * 86400
+        for path in glob.glob(os.path.join(self.directory, '*.folded')):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler():
+    """This process's continuous sampler, started on first use."""
+    global _sampler
+    if _sampler is None or _sampler.pid != os.getpid():
+        with _sampler_lock:
+            # A forked worker gets its own sampler thread
+            if _sampler is None or _sampler.pid != os.getpid():
+                _sampler = ContinuousSampler(
+                    _setting('PROFILER_DIR', 'profiles/continuous'),
+                    interval=float(_setting('PROFILER_SAMPLE_INTERVAL', DEFAULT_CONTINUOUS_INTERVAL)),
+                    flush_seconds=float(_setting('PROFILER_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS)),
+                    retention_days=float(_setting('PROFILER_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)),
+                ).start()
+    return _sampler
+
+
+def file_time(path):
+    """The time a continuous profiler file was written, from its name (None if not one)."""
+    match = re.match(r'(\d{8}-\d{6})-\d+\.folded$', os.path.basename(path))
+    if match is None:
+        return None
+    return time.mktime(time.strptime(match.group(1), FILE_TIME_FORMAT))
+
+
+def read_collapsed(path, into=None):
+    """Add the stacks of a collapsed-stack file to a Counter."""
+    counts = into if into is not None else Counter()
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            stack, _, weight = line.rstrip('\n').rpartition(' ')
+            if stack and weight.isdigit():
+                counts[stack] += int(weight)
+    return counts
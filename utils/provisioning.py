@@ -0,0 +1,306 @@
+"""
+Provision parking lots and slots from a layout description.
+
+Used by `manage.py provision_lots <file>` and by the default layout the parking
+spaces page seeds into an empty database. A layout (JSON, or YAML with PyYAML
+installed) looks like:
+
+    lots:
+      - code: NGE
+        name: North Gate Extension
+        capacity: 48            # optional, defaults to the number of slots
+        slots: 48               # slots 1-48, available
+      - code: RTL
+        name: Rizal Tower Lot
+        slots:
+          - {slot_number: 1, status: reserved}
+          - {from: 2, to: 40}                       # status defaults to available
+          - {from: 41, to: 44, status: unavailable}
+
+plan_layout() compares the layout with the database in a few paged reads and
+apply_plan() writes the differences with batched upserts, so applying the same
+layout twice changes nothing the second time. Slots with a parked vehicle are
+never changed or removed. The upserts need the unique constraints on
+parking_lot.code and parking_slot(lot_id, slot_number) from
+sql/unique_constraints.sql.
+"""
+import json
+import time
+
+from .occupancy import engine as occupancy
+from .reference_cache import invalidate_lots
+from .resilience import run_query
+from .supabase_client import supabase
+
+SLOT_STATUSES = ('available', 'occupied', 'reserved', 'unavailable')
+PAGE_SIZE = 1000
+BATCH_SIZE = 1000
+
+# Postgres: no unique constraint matches the ON CONFLICT target
+NO_CONFLICT_TARGET = '42P10'
+
+
+class LayoutError(ValueError):
+    """The layout file is malformed; the message names the offending entry."""
+
+
+def load_layout(path):
+    """Parse a .json/.yaml/.yml layout file into normalized lots (see normalize_layout)."""
+    with open(path, encoding='utf-8') as handle:
+        text = handle.read()
+    if str(path).lower().endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise LayoutError('YAML layouts need PyYAML (pip install pyyaml); or use a .json file.')
+        data = yaml.safe_load(text)
+    else:
+        try:
+            data = json.loads(text)
+        except ValueError as exc:
+            raise LayoutError(f'Invalid JSON: {exc}')
+    return normalize_layout(data)
+
+
+def _slot_entries(code, slots):
+    if isinstance(slots, int):
+        return {number: 'available' for number in range(1, slots + 1)}
+    if not isinstance(slots, list):
+        raise LayoutError(f'{code}: slots must be a count or a list')
+
+    numbered = {}
+    for index, entry in enumerate(slots):
+        where = f'{code}: slots[{index}]'
+        if not isinstance(entry, dict):
+            raise LayoutError(f'{where}: expected a mapping')
+        status = str(entry.get('status') or 'available').strip().lower()
+        if status not in SLOT_STATUSES:
+            raise LayoutError(f'{where}: invalid status "{entry.get("status")}"')
+        try:
+            if 'slot_number' in entry:
+                numbers = [int(entry['slot_number'])]
+            else:
+                numbers = range(int(entry['from']), int(entry['to']) + 1)
+        except (KeyError, TypeError, ValueError):
+            raise LayoutError(f'{where}: needs slot_number, or from and to')
+        for number in numbers:
+            if number < 1:
+                raise LayoutError(f'{where}: slot numbers start at 1')
+            if number in numbered:
+                raise LayoutError(f'{where}: slot {number} is listed twice')
+            numbered[number] = status
+    return numbered
+
+
+def normalize_layout(data):
+    """[{'code', 'name', 'capacity', 'slots': {slot_number: status}}] from parsed layout data."""
+    lots = data.get('lots') if isinstance(data, dict) else None
+    if not isinstance(lots, list):
+        raise LayoutError('The layout needs a top-level "lots" list')
+
+    normalized = []
+    seen = set()
+    for index, lot in enumerate(lots):
+        code = str((lot or {}).get('code') or '').strip()
+        if not code:
+            raise LayoutError(f'lots[{index}]: code is required')
+        if code in seen:
+            raise LayoutError(f'{code}: listed twice')
+        seen.add(code)
+        slots = _slot_entries(code, lot.get('slots', 0))
+        normalized.append({
+            'code': code,
+            'name': lot.get('name') or code,
+            'capacity': int(lot.get('capacity') or len(slots)),
+            'slots': slots,
+        })
+    return normalized
+
+
+def _paged(query_factory, site):
+    rows, start = [], 0
+    while True:
+        page = run_query(query_factory().range(start, start + PAGE_SIZE - 1), site).data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+class ProvisionPlan:
+    """Differences between a layout and the database."""
+
+    def __init__(self, lots):
+        self.lots = lots
+        self.lot_ids = {}         # code -> id of the lots that already exist
+        self.new_lots = []        # lot rows to create
+        self.changed_lots = []    # (lot row, {field: (old, new)})
+        self.new_slots = []       # (code, slot_number, status)
+        self.changed_slots = []   # (code, slot_number, old status, new status)
+        self.pruned_slots = []    # (code, slot_number, slot id)
+        self.kept_occupied = []   # (code, slot_number) left alone because a vehicle is parked
+        self.unchanged_slots = 0
+
+    @property
+    def has_changes(self):
+        return bool(self.new_lots or self.changed_lots or self.new_slots or self.changed_slots or self.pruned_slots)
+
+    def summary(self):
+        """Human-readable diff, one line per lot plus totals."""
+        lines = []
+        for lot in self.new_lots:
+            lines.append(f"+ lot {lot['code']} ({lot['name']}, capacity {lot['capacity']})")
+        for lot, changes in self.changed_lots:
+            detail = ', '.join(f'{field} {old!r} -> {new!r}' for field, (old, new) in changes.items())
+            lines.append(f"~ lot {lot['code']}: {detail}")
+
+        per_lot = {}
+        for code, *_ in self.new_slots:
+            per_lot.setdefault(code, [0, 0, 0, 0])[0] += 1
+        for code, *_ in self.changed_slots:
+            per_lot.setdefault(code, [0, 0, 0, 0])[1] += 1
+        for code, *_ in self.pruned_slots:
+            per_lot.setdefault(code, [0, 0, 0, 0])[2] += 1
+        for code, _ in self.kept_occupied:
+            per_lot.setdefault(code, [0, 0, 0, 0])[3] += 1
+        for code, (created, changed, pruned, kept) in sorted(per_lot.items()):
+            line = f'  {code}: +{created} slots, ~{changed} status, -{pruned} removed'
+            if kept:
+                line += f' ({kept} occupied slots left as they are)'
+            lines.append(line)
+
+        lines.append(
+            f'{len(self.new_lots)} lots created, {len(self.changed_lots)} updated; '
+            f'{len(self.new_slots)} slots created, {len(self.changed_slots)} updated, '
+            f'{len(self.pruned_slots)} removed, {self.unchanged_slots} unchanged.'
+        )
+        return lines
+
+
+def plan_layout(lots, sync_status=False, prune=False):
+    """Compare normalized lots with the database.
+
+    sync_status also resets the status of existing slots to the layout's;
+    prune removes slots of these lots that the layout does not list.
+    """
+    plan = ProvisionPlan(lots)
+    codes = [lot['code'] for lot in lots]
+    existing_lots = {
+        row['code']: row
+        for row in run_query(
+            supabase.table('parking_lot').select('id, code, name, capacity').in_('code', codes), 'provision.lots'
+        ).data or []
+    }
+    plan.lot_ids = {code: row['id'] for code, row in existing_lots.items()}
+
+    existing_slots = {}
+    if plan.lot_ids:
+        codes_by_id = {lot_id: code for code, lot_id in plan.lot_ids.items()}
+        rows = _paged(
+            lambda: supabase.table('parking_slot').select('id, lot_id, slot_number, status')
+            .in_('lot_id', list(codes_by_id)).order('id'),
+            'provision.slots',
+        )
+        for row in rows:
+            existing_slots.setdefault(codes_by_id[row['lot_id']], {})[row.get('slot_number')] = row
+
+    for lot in lots:
+        code = lot['code']
+        current = existing_lots.get(code)
+        if current is None:
+            plan.new_lots.append({'code': code, 'name': lot['name'], 'capacity': lot['capacity']})
+        else:
+            changes = {
+                field: (current.get(field), lot[field])
+                for field in ('name', 'capacity')
+                if current.get(field) != lot[field]
+            }
+            if changes:
+                plan.changed_lots.append((lot, changes))
+
+        slots = existing_slots.get(code, {})
+        for number, status in sorted(lot['slots'].items()):
+            row = slots.get(number)
+            if row is None:
+                plan.new_slots.append((code, number, status))
+                continue
+            current_status = (row.get('status') or 'available').lower()
+            if not sync_status or current_status == status:
+                plan.unchanged_slots += 1
+            elif current_status == 'occupied':
+                plan.kept_occupied.append((code, number))
+            else:
+                plan.changed_slots.append((code, number, current_status, status))
+        if prune:
+            for number, row in slots.items():
+                if number in lot['slots']:
+                    continue
+                if (row.get('status') or 'available').lower() == 'occupied':
+                    plan.kept_occupied.append((code, number))
+                else:
+                    plan.pruned_slots.append((code, number, row['id']))
+    return plan
+
+
+def _batches(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _upsert(table, rows, on_conflict, site):
+    try:
+        return run_query(supabase.table(table).upsert(rows, on_conflict=on_conflict), site)
+    except Exception as exc:
+        details = exc.args[0] if exc.args and isinstance(exc.args[0], dict) else {}
+        if str(details.get('code') or getattr(exc, 'code', '') or '') != NO_CONFLICT_TARGET:
+            raise
+        raise RuntimeError(
+            f'{table} has no unique constraint on ({on_conflict}); run sql/unique_constraints.sql first'
+        ) from exc
+
+
+def apply_plan(plan, batch_size=BATCH_SIZE):
+    """Write a plan with batched upserts; returns the number of requests made."""
+    requests = 0
+    lot_rows = plan.new_lots + [
+        {'code': lot['code'], 'name': lot['name'], 'capacity': lot['capacity']} for lot, _ in plan.changed_lots
+    ]
+    if lot_rows:
+        written = _upsert('parking_lot', lot_rows, 'code', 'provision.lots').data
+        plan.lot_ids.update((row['code'], row['id']) for row in written or [])
+        requests += 1
+
+    slot_rows = [
+        {'lot_id': plan.lot_ids[code], 'slot_number': number, 'status': status}
+        for code, number, status in plan.new_slots
+    ] + [
+        {'lot_id': plan.lot_ids[code], 'slot_number': number, 'status': status}
+        for code, number, _, status in plan.changed_slots
+    ]
+    for batch in _batches(slot_rows, batch_size):
+        _upsert('parking_slot', batch, 'lot_id,slot_number', 'provision.slots')
+        requests += 1
+
+    pruned_ids = [slot_id for _, _, slot_id in plan.pruned_slots]
+    for batch in _batches(pruned_ids, batch_size):
+        # Re-checked here so a vehicle parked since the plan was made is not lost
+        run_query(
+            supabase.table('parking_slot').delete().in_('id', batch).neq('status', 'occupied'), 'provision.slots'
+        )
+        requests += 1
+
+    if lot_rows:
+        invalidate_lots()
+    if slot_rows or pruned_ids:
+        occupancy.invalidate()
+    return requests
+
+
+def provision(lots, sync_status=False, prune=False, dry_run=False, batch_size=BATCH_SIZE):
+    """plan_layout() + apply_plan(); returns (plan, requests made, seconds taken)."""
+    started = time.monotonic()
+    plan = plan_layout(lots, sync_status=sync_status, prune=prune)
+    requests = 0
+    if plan.has_changes and not dry_run:
+        requests = apply_plan(plan, batch_size=batch_size)
+    return plan, requests, time.monotonic() - started
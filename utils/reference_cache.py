@@ -0,0 +1,164 @@
+"""
+Read-through cache for reference data that rarely changes (parking lots).
+
+Two levels:
+- Django's cache framework holds the rows under a versioned key, shared by all
+  workers when CACHES points at a shared backend (Redis). invalidate() bumps the
+  version, so every worker reloads on its next miss.
+- Each process also memoizes the rows for LOCAL_TTL seconds to skip the cache
+  round trip on hot paths; that is the longest another worker can serve rows
+  from before an invalidation.
+
+Tuned with settings.REFERENCE_CACHE = {'TTL': ..., 'LOCAL_TTL': ...}.
+"""
+import threading
+import time
+
+from . import metrics, tracing
+from .resilience import run_query
+from .supabase_client import supabase
+
+DEFAULT_TTL = 3600
+DEFAULT_LOCAL_TTL = 5
+KEY_PREFIX = 'parkit:ref'
+
+
+def _setting(name, default):
+    try:
+        from django.conf import settings
+        return (getattr(settings, 'REFERENCE_CACHE', None) or {}).get(name, default)
+    except Exception:
+        return default
+
+
+def _django_cache():
+    try:
+        from django.conf import settings
+        if not settings.configured:
+            # Outside Django (scripts, benchmarks) only the process-local level is used
+            return None
+        from django.core.cache import cache
+        return cache
+    except ImportError:
+        return None
+
+
+class ReferenceCache:
+    """Versioned read-through cache of one reference result set."""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._local = None  # (version, expires_at, rows)
+
+    @property
+    def version_key(self):
+        return f'{KEY_PREFIX}:{self.name}:version'
+
+    def _version(self, cache):
+        if cache is None:
+            return 0
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, 1, None)
+            version = cache.get(self.version_key) or 1
+        return version
+
+    def peek(self):
+        """Rows memoized in this process if still fresh, else None (never blocks)."""
+        local = self._local
+        if local is not None and local[1] > time.monotonic():
+            return local[2]
+        return None
+
+    def _count(self, span, result):
+        metrics.CACHE_LOOKUPS.inc(cache=self.name, result=result)
+        if span is not None:
+            span.set_attribute('cache.result', result)
+
+    def get(self):
+        """Cached rows; a loader error propagates and nothing is cached."""
+        with tracing.span(f'cache {self.name}', attributes={'cache.name': self.name}) as span:
+            return self._get(span)
+
+    def _get(self, span):
+        rows = self.peek()
+        if rows is not None:
+            self._count(span, 'local')
+            return rows
+
+        with self._lock:
+            cache = _django_cache()
+            version = self._version(cache)
+            local = self._local
+            if local is not None and local[0] == version and local[1] > time.monotonic():
+                self._count(span, 'local')
+                return local[2]
+
+            data_key = f'{KEY_PREFIX}:{self.name}:v{version}'
+            rows = cache.get(data_key) if cache is not None else None
+            self._count(span, 'miss' if rows is None else 'hit')
+            if rows is None:
+                rows = self.loader()
+                if cache is not None:
+                    cache.set(data_key, rows, int(_setting('TTL', DEFAULT_TTL)))
+            self._local = (version, time.monotonic() + float(_setting('LOCAL_TTL', DEFAULT_LOCAL_TTL)), rows)
+            return rows
+
+    def invalidate(self):
+        """Drop the cached rows in every worker (after creating or seeding rows)."""
+        with self._lock:
+            self._local = None
+            cache = _django_cache()
+            if cache is None:
+                return
+            try:
+                cache.incr(self.version_key)
+            except ValueError:
+                # Version key evicted or never set - any new value orphans old entries
+                cache.set(self.version_key, int(time.time()), None)
+
+
+def _load_lots():
+    lots_resp = run_query(supabase.table('parking_lot').select('id, code, name, capacity').order('code'), 'lots.list')
+    return lots_resp.data or []
+
+
+lots_cache = ReferenceCache('parking_lot', _load_lots)
+
+
+def get_lots():
+    """All parking lots ordered by code, as fresh dicts the caller may modify."""
+    return [dict(lot) for lot in lots_cache.get()]
+
+
+async def aget_lots():
+    """get_lots() for async views; only a miss leaves the event loop."""
+    rows = lots_cache.peek()
+    if rows is None:
+        from asgiref.sync import sync_to_async
+        rows = await sync_to_async(lots_cache.get)()
+    return [dict(lot) for lot in rows]
+
+
+def get_lot(lot_id):
+    """One parking lot by id, or None."""
+    for lot in lots_cache.get():
+        if str(lot.get('id')) == str(lot_id):
+            return dict(lot)
+    return None
+
+
+def get_lot_names(lot_ids=None):
+    """{lot id: name}, optionally limited to lot_ids."""
+    wanted = None if lot_ids is None else {str(lot_id) for lot_id in lot_ids}
+    return {
+        lot['id']: lot.get('name', '')
+        for lot in lots_cache.get()
+        if wanted is None or str(lot.get('id')) in wanted
+    }
+
+
+def invalidate_lots():
+    lots_cache.invalidate()
@@ -0,0 +1,466 @@
+"""
+Retries, hedged reads and a circuit breaker around Supabase calls.
+
+    run_query(query, 'reports.entries')              # read: retried on transient errors
+    run_query(query, 'checkin.entry', idempotent=False)  # write: breaker only
+    await arun_query(query, 'history.exit')          # async views
+
+Every call site has a name. Its policy is settings.SUPABASE_RESILIENCE, updated
+with SUPABASE_RESILIENCE['SITES'][name], updated with the keyword arguments.
+
+- Reads are retried on transient errors (timeouts, dropped connections, 5xx)
+  with full-jitter exponential backoff. Writes are never retried.
+- With HEDGE on, a read that is still running after the site's observed p95
+  latency is issued a second time, by at most HEDGE_MAX_SHARE of the hedged
+  reads in flight. In async views the first response wins; a sync read runs
+  on the caller's thread and only the hedge uses the pool, so it falls back
+  on the hedge when its own attempt fails.
+- Transient failures trip a shared circuit breaker; while it is open calls fail
+  at once with CircuitOpenError instead of waiting on a degraded Supabase.
+  After BREAKER_RESET seconds a single probe call is let through.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .slow_queries import current_site
+
+DEFAULT_POLICY = {
+    'RETRIES': 2,
+    'BACKOFF_BASE': 0.1,
+    'BACKOFF_MAX': 1.0,
+    'HEDGE': False,
+    'HEDGE_MIN_DELAY': 0.05,
+    'HEDGE_MAX_SHARE': 0.1,
+    'BREAKER': 'supabase',
+    'BREAKER_THRESHOLD': 5,
+    'BREAKER_RESET': 30.0,
+}
+
+# PostgREST/Postgres codes that mean "try again": connection failures
+# (PGRST000-003, 08xxx), cancelled/too-slow statements, lock conflicts, overload.
+TRANSIENT_CODES = {'PGRST000', 'PGRST001', 'PGRST002', 'PGRST003', '57014', '40001', '40P01', '53300'}
+TRANSIENT_PREFIXES = ('08', '53')
+
+# Samples kept per call site for the hedging delay
+LATENCY_WINDOW = 200
+MIN_HEDGE_SAMPLES = 20
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling Supabase while its circuit breaker is open."""
+
+
+def _settings_policy():
+    try:
+        from django.conf import settings
+        return getattr(settings, 'SUPABASE_RESILIENCE', None) or {}
+    except Exception:
+        return {}
+
+
+def policy_for(site, **overrides):
+    """Effective policy for a call site (defaults < settings < site < overrides)."""
+    configured = _settings_policy()
+    policy = dict(DEFAULT_POLICY)
+    policy.update({key: value for key, value in configured.items() if key != 'SITES'})
+    policy.update((configured.get('SITES') or {}).get(site, {}))
+    policy.update({key.upper(): value for key, value in overrides.items() if value is not None})
+    return policy
+
+
+def is_transient(exc):
+    """True when an error is worth retrying (and counts against the breaker)."""
+    if isinstance(exc, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    try:
+        import httpx
+        if isinstance(exc, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)):
+            return True
+    except ImportError:
+        pass
+
+    # postgrest APIError (and the local backend's LocalAPIError) carry a dict
+    details = exc.args[0] if exc.args and isinstance(exc.args[0], dict) else {}
+    code = str(details.get('code') or getattr(exc, 'code', '') or '')
+    if code in TRANSIENT_CODES or code.startswith(TRANSIENT_PREFIXES):
+        return True
+    return len(code) == 3 and code.startswith('5')  # HTTP 5xx from the gateway
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open (one probe) -> closed."""
+
+    def __init__(self, name, threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = None  # token of the half-open probe in flight
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self):
+        """Raise CircuitOpenError while open; returns a token when this call is the half-open probe."""
+        with self._lock:
+            if self._opened_at is None:
+                return None
+            if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError(
+                    f'{self.name} is unavailable (circuit open after {self._failures} failures)'
+                )
+            self._probing = probe = object()
+            return probe
+
+    def end_probe(self, probe):
+        """Release a probe that ended without an outcome (cancelled, KeyboardInterrupt...).
+
+        Otherwise the breaker would stay half-open with no probe left to close it.
+        """
+        if probe is None:
+            return
+        with self._lock:
+            if self._probing is probe:
+                self._probing = None
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._probing = None
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name='supabase', threshold=None, reset_timeout=None):
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(
+                name,
+                threshold=DEFAULT_POLICY['BREAKER_THRESHOLD'] if threshold is None else threshold,
+                reset_timeout=DEFAULT_POLICY['BREAKER_RESET'] if reset_timeout is None else reset_timeout,
+            )
+        return breaker
+
+
+def _breaker_for(policy):
+    return get_breaker(policy['BREAKER'], int(policy['BREAKER_THRESHOLD']), float(policy['BREAKER_RESET']))
+
+
+class _LatencyTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, site, seconds):
+        with self._lock:
+            self._samples.setdefault(site, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def p95(self, site):
+        with self._lock:
+            samples = sorted(self._samples.get(site, ()))
+        if len(samples) < MIN_HEDGE_SAMPLES:
+            return None
+        return samples[int(len(samples) * 0.95) - 1]
+
+
+latencies = _LatencyTracker()
+
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+
+
+def _get_hedge_executor():
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='supabase-hedge')
+    return _hedge_executor
+
+
+def _hedge_delay(site, policy):
+    if not policy['HEDGE']:
+        return None
+    p95 = latencies.p95(site)
+    if p95 is None:
+        return None
+    return max(float(policy['HEDGE_MIN_DELAY']), p95)
+
+
+def _backoff(attempt, policy):
+    ceiling = min(float(policy['BACKOFF_MAX']), float(policy['BACKOFF_BASE']) * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+class _HedgeBudget:
+    """Hedged calls in flight and the hedges out, so at most HEDGE_MAX_SHARE of those calls hedge."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+
+    def enter(self):
+        with self._lock:
+            self.calls += 1
+
+    def leave(self):
+        with self._lock:
+            self.calls -= 1
+
+    def take(self, share):
+        with self._lock:
+            if self.hedges >= max(1, int(self.calls * share)):
+                return False
+            self.hedges += 1
+            return True
+
+    def give_back(self):
+        with self._lock:
+            self.hedges -= 1
+
+
+hedge_budget = _HedgeBudget()
+
+
+class _HedgeTimer:
+    """One thread that starts each sync hedge once its delay is up."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._due = []  # heap of (deadline, order, callback)
+        self._order = itertools.count()
+        self._thread = None
+
+    def schedule(self, delay, callback):
+        with self._cond:
+            heapq.heappush(self._due, (time.monotonic() + delay, next(self._order), callback))
+            if self._thread is None or not self._thread.is_alive():  # not started, or lost in a fork
+                self._thread = threading.Thread(target=self._run, name='supabase-hedge-timer', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due or self._due[0][0] > time.monotonic():
+                    self._cond.wait(self._due[0][0] - time.monotonic() if self._due else None)
+                _, _, callback = heapq.heappop(self._due)
+            try:
+                callback()
+            except Exception:
+                pass  # a hedge that cannot start leaves the caller's own attempt
+
+
+_hedge_timer = _HedgeTimer()
+
+
+class _Hedge:
+    """The second attempt of one sync call: waiting, then cancelled or started on the hedge pool."""
+
+    def __init__(self, func, share):
+        self._func = func
+        self._share = share
+        # Runs in a copy of the caller's context (site name, request id)
+        self._context = contextvars.copy_context()
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self.future = None
+
+    def start(self):
+        with self._lock:
+            if self._cancelled or not hedge_budget.take(self._share):
+                return
+            try:
+                self.future = _get_hedge_executor().submit(self._context.run, self._run)
+            except Exception:
+                hedge_budget.give_back()
+                raise
+
+    def _run(self):
+        try:
+            return self._func()
+        finally:
+            hedge_budget.give_back()
+
+    def cancel(self):
+        """Stop the hedge from starting; the started future, or None."""
+        with self._lock:
+            self._cancelled = True
+            return self.future
+
+
+def _call_hedged(func, delay, share):
+    """
+    func() on the caller's thread, with a second attempt started on the hedge
+    pool if it is still running after delay (and fewer than share of the
+    hedged calls in flight have one out). A blocking call cannot be abandoned,
+    so the caller keeps its own answer when it succeeds and takes the hedge's
+    when it fails; async calls (_acall_hedged) return whichever answers first.
+    """
+    hedge = _Hedge(func, share)
+    hedge_budget.enter()
+    try:
+        _hedge_timer.schedule(delay, hedge.start)
+        try:
+            return func()
+        except Exception as exc:
+            started = hedge.cancel()
+            if started is None:
+                raise
+            try:
+                return started.result()
+            except Exception:
+                raise exc from None
+        finally:
+            hedge.cancel()
+    finally:
+        hedge_budget.leave()
+
+
+def call(func, site, idempotent=True, **overrides):
+    """Run a zero-argument Supabase call under the site's resilience policy."""
+    token = current_site.set(site)
+    try:
+        return _call(func, site, idempotent, overrides)
+    finally:
+        current_site.reset(token)
+
+
+def _call(func, site, idempotent, overrides):
+    policy = policy_for(site, **overrides)
+    breaker = _breaker_for(policy)
+    attempts = 1 + int(policy['RETRIES']) if idempotent else 1
+    hedge_delay = _hedge_delay(site, policy) if idempotent else None
+
+    for attempt in range(attempts):
+        probe = breaker.before_call()
+        started = time.monotonic()
+        try:
+            result = _call_hedged(func, hedge_delay, float(policy['HEDGE_MAX_SHARE'])) if hedge_delay else func()
+        except Exception as exc:
+            if not is_transient(exc):
+                # Supabase answered (bad column, constraint...) - it is not degraded
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt + 1 >= attempts:
+                raise
+            time.sleep(_backoff(attempt, policy))
+            continue
+        else:
+            breaker.record_success()
+            latencies.record(site, time.monotonic() - started)
+            return result
+        finally:
+            # Cancellation or KeyboardInterrupt records no outcome; let the next call probe
+            breaker.end_probe(probe)
+
+
+def run_query(query, site, idempotent=True, **overrides):
+    """call() for a postgrest query builder: run_query(supabase.table(...)..., 'site')."""
+    return call(query.execute, site, idempotent=idempotent, **overrides)
+
+
+async def _acall_hedged(func, delay, share):
+    hedge_budget.enter()
+    first = asyncio.ensure_future(func())
+    pending = {first}
+    hedged = False
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done or not hedge_budget.take(share):
+            return await first
+
+        hedged = True
+        pending.add(asyncio.ensure_future(func()))
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+        if hedged:
+            hedge_budget.give_back()
+        hedge_budget.leave()
+
+
+async def acall(func, site, idempotent=True, **overrides):
+    """Async counterpart of call(); func is a coroutine function."""
+    token = current_site.set(site)
+    try:
+        return await _acall(func, site, idempotent, overrides)
+    finally:
+        current_site.reset(token)
+
+
+async def _acall(func, site, idempotent, overrides):
+    policy = policy_for(site, **overrides)
+    breaker = _breaker_for(policy)
+    attempts = 1 + int(policy['RETRIES']) if idempotent else 1
+    hedge_delay = _hedge_delay(site, policy) if idempotent else None
+
+    for attempt in range(attempts):
+        probe = breaker.before_call()
+        started = time.monotonic()
+        try:
+            result = await (
+                _acall_hedged(func, hedge_delay, float(policy['HEDGE_MAX_SHARE'])) if hedge_delay else func()
+            )
+        except Exception as exc:
+            if not is_transient(exc):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt + 1 >= attempts:
+                raise
+            await asyncio.sleep(_backoff(attempt, policy))
+            continue
+        else:
+            breaker.record_success()
+            latencies.record(site, time.monotonic() - started)
+            return result
+        finally:
+            # Cancellation or KeyboardInterrupt records no outcome; let the next call probe
+            breaker.end_probe(probe)
+
+
+async def arun_query(query, site, idempotent=True, **overrides):
+    """acall() for an async postgrest query builder."""
+    return await acall(query.execute, site, idempotent=idempotent, **overrides)
+
+
+def is_unavailable(exc):
+    """True for errors the user can only retry later (breaker open or transient)."""
+    return isinstance(exc, CircuitOpenError) or is_transient(exc)
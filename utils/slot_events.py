@@ -0,0 +1,172 @@
+"""
+Per-lot stream of slot changes for the live parking grid (Server-Sent Events).
+
+The occupancy engine reports every slot change this worker makes; they are
+delivered to the SSE connections of the same lot:
+
+    async for event in slot_events.subscribe(lot_id):   # {'type': 'slot', 'slot': {...}}
+        ...
+
+With REDIS_URL set (and the redis package installed) changes are also relayed
+through Redis pub/sub so screens connected to other workers see them; otherwise
+only this worker's connections are notified and the others catch up on their
+next page load.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+
+from .occupancy import engine as occupancy
+
+CHANNEL_PREFIX = 'parkit:slots:'
+QUEUE_SIZE = 256
+RELAY_RETRY_SECONDS = 2
+
+# Identifies this process's own messages coming back from Redis
+_ORIGIN = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+
+
+class _Subscriber:
+    __slots__ = ('loop', 'queue', 'lagged')
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.lagged = False
+
+    def offer(self, event):
+        # Runs on the subscriber's loop; a reader that fell behind is told to resync
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'resync'})
+
+
+class SlotEventHub:
+    """Fans slot events out to the asyncio subscribers of each lot."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # lot_id -> set of _Subscriber
+        self._redis = None
+        self._relay_started = False
+
+    # -- delivery ----------------------------------------------------------
+
+    def _deliver(self, lot_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(lot_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+            except RuntimeError:
+                pass  # loop closed; the subscription is dropped when its generator ends
+
+    def publish(self, lot_id, event):
+        """Send an event to this lot's subscribers, in this worker and via Redis."""
+        try:
+            lot_id = int(lot_id)
+        except (TypeError, ValueError):
+            return
+        self._deliver(lot_id, event)
+        client = self._redis_client()
+        if client is not None:
+            try:
+                client.publish(f'{CHANNEL_PREFIX}{lot_id}', json.dumps({'origin': _ORIGIN, 'event': event}, default=str))
+            except Exception:
+                pass  # live updates are best effort; the page still reloads correctly
+
+    async def subscribe(self, lot_id):
+        """Async iterator of the lot's events until the consumer stops iterating."""
+        subscriber = _Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(int(lot_id), set()).add(subscriber)
+        self._start_relay()
+        try:
+            while True:
+                event = await subscriber.queue.get()
+                yield event
+                if event['type'] == 'resync':
+                    return
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(int(lot_id))
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._subscribers[int(lot_id)]
+
+    # -- Redis relay -------------------------------------------------------
+
+    def _redis_client(self):
+        if self._redis is None:
+            try:
+                from django.conf import settings
+                url = getattr(settings, 'REDIS_URL', None)
+                if not url:
+                    self._redis = False
+                    return None
+                import redis
+                self._redis = redis.Redis.from_url(url)
+            except Exception:
+                self._redis = False
+        return self._redis or None
+
+    def _start_relay(self):
+        with self._lock:
+            if self._relay_started:
+                return
+            self._relay_started = True
+        if self._redis_client() is not None:
+            threading.Thread(target=self._relay, name='slot-events-relay', daemon=True).start()
+
+    def _relay(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+                for message in pubsub.listen():
+                    self._relay_message(message)
+            except Exception:
+                time.sleep(RELAY_RETRY_SECONDS)  # Redis restarted - subscribe again
+
+    def _relay_message(self, message):
+        try:
+            payload = json.loads(message['data'])
+            if payload.get('origin') == _ORIGIN:
+                return
+            channel = message['channel']
+            channel = channel.decode() if isinstance(channel, bytes) else channel
+            self._deliver(int(channel[len(CHANNEL_PREFIX):]), payload['event'])
+        except (ValueError, KeyError, TypeError):
+            pass
+
+
+hub = SlotEventHub()
+
+
+def _on_slot_change(lot_id, slot_id, change):
+    if change is None:
+        hub.publish(lot_id, {'type': 'removed', 'slot_id': slot_id})
+    else:
+        hub.publish(lot_id, {'type': 'slot', 'slot': dict(change, id=slot_id)})
+
+
+occupancy.add_listener(_on_slot_change)
+
+
+def format_sse(event):
+    """One text/event-stream message."""
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+subscribe = hub.subscribe
+publish = hub.publish
@@ -0,0 +1,286 @@
+"""
+Compact per-lot slot state.
+
+A lot's slots are held as one status byte per slot number instead of one dict
+per slot:
+
+    codes     array('B')  status code at index slot_number (0 = no such slot)
+    ids       array('q')  parking_slot.id at the same index
+    plates    {slot_number: license_plate}   only for slots that have one
+    checkins  {slot_number: check_in_time}   likewise
+
+so 10k slots take ~90 KB instead of several MB of dicts, counting filled slots
+is a C-level array scan, and rows are only materialized for the grid that is
+actually rendered. Slots whose number or id is not a small integer (legacy
+data) are kept as plain dicts on the side.
+
+    snapshots = group_rows(rows)          # {lot_id: LotSnapshot}
+    snapshots[lot_id].filled, .total
+    list(snapshots[lot_id].iter_slots())  # dicts ordered like the grid
+"""
+from array import array
+
+# Statuses counted as "filled" in the occupancy summaries
+FILLED_STATUSES = frozenset((
+    'occupied', 'taken', 'full', 'in_use', 'busy', 'reserved', 'hold', 'pending', 'unavailable',
+))
+
+# Code 0 marks an unused slot number; anything unknown is stored as 'available',
+# which is how both the grid and the summaries already treat it.
+STATUSES = (None, 'available') + tuple(sorted(FILLED_STATUSES))
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES) if status}
+AVAILABLE = STATUS_CODES['available']
+FILLED_CODES = tuple(STATUS_CODES[status] for status in sorted(FILLED_STATUSES))
+# codes.tobytes().translate(_FILLED_TABLE) has a 1 for every filled slot
+_FILLED_TABLE = bytes(int(code in FILLED_CODES) for code in range(256))
+
+# Slot numbers above this (and above 4x the slot count) go to the side table
+# rather than stretching the arrays
+MAX_DENSE_NUMBER = 65535
+
+
+def status_code(status):
+    return STATUS_CODES.get((status or 'available').lower(), AVAILABLE)
+
+
+def _dense_number(row):
+    number, slot_id = row.get('slot_number'), row.get('id')
+    if type(number) is not int or type(slot_id) is not int or not 0 <= number <= MAX_DENSE_NUMBER:
+        return None
+    return number
+
+
+class LotSnapshot:
+    """Slots of one lot, indexed by slot number."""
+
+    __slots__ = ('lot_id', 'codes', 'ids', 'plates', 'checkins', 'extra', '_index', '_dense')
+
+    def __init__(self, lot_id=None):
+        self.lot_id = lot_id
+        self.codes = array('B')
+        self.ids = array('q')
+        self.plates = {}
+        self.checkins = {}
+        self.extra = {}     # slot_id -> row dict, for slots without a dense number
+        self._index = None  # slot_id -> slot_number, built on the first lookup by id
+        self._dense = 0
+
+    @classmethod
+    def from_rows(cls, rows, lot_id=None):
+        """Snapshot of rows with unique ids (a query result)."""
+        snapshot = cls(lot_id)
+        snapshot._extend(rows)
+        return snapshot
+
+    def _extend(self, rows):
+        # Bulk load without the per-row duplicate checks of add()
+        codes, ids, plates, checkins = self.codes, self.ids, self.plates, self.checkins
+        rows = list(rows)
+        max_number = 4 * (self._dense + len(rows)) + 1024
+        for row in rows:
+            number = _dense_number(row)
+            if number is None or number > max_number or (number < len(codes) and codes[number]):
+                self._add_extra(row)
+                continue
+            if number >= len(codes):
+                self._grow(number)
+            codes[number] = STATUS_CODES.get((row.get('status') or 'available').lower(), AVAILABLE)
+            ids[number] = row['id']
+            self._dense += 1
+            if self._index is not None:
+                self._index[row['id']] = number
+            plate = row.get('license_plate')
+            if plate:
+                plates[number] = plate
+            check_in_time = row.get('check_in_time')
+            if check_in_time:
+                checkins[number] = check_in_time
+
+    @property
+    def index(self):
+        if self._index is None:
+            codes, ids = self.codes, self.ids
+            self._index = {ids[number]: number for number in range(len(codes)) if codes[number]}
+        return self._index
+
+    # -- updates -----------------------------------------------------------
+
+    def _grow(self, number):
+        missing = number + 1 - len(self.codes)
+        if missing > 0:
+            self.codes.frombytes(bytes(missing))
+            self.ids.frombytes(bytes(self.ids.itemsize * missing))
+
+    def add(self, row):
+        """Add (or replace) the slot in row; returns False for a row without an id."""
+        slot_id = row.get('id')
+        if slot_id is None:
+            return False
+        self.remove(slot_id)
+        number = _dense_number(row)
+        if number is not None and number > 4 * self._dense + 1024:
+            number = None
+        if number is None or (number < len(self.codes) and self.codes[number]):
+            self._add_extra(row)
+            return True
+
+        self._grow(number)
+        self.codes[number] = status_code(row.get('status'))
+        self.ids[number] = slot_id
+        self.index[slot_id] = number
+        self._dense += 1
+        self._set_side(number, row.get('license_plate'), row.get('check_in_time'))
+        return True
+
+    def _add_extra(self, row):
+        # Sparse or duplicate number: keep the row as it is
+        self.extra[row['id']] = {
+            'id': row['id'], 'lot_id': self.lot_id if self.lot_id is not None else row.get('lot_id'),
+            'slot_number': row.get('slot_number'), 'status': (row.get('status') or 'available').lower(),
+            'license_plate': row.get('license_plate'), 'check_in_time': row.get('check_in_time'),
+        }
+
+    def _set_side(self, number, plate, check_in_time):
+        if plate:
+            self.plates[number] = plate
+        else:
+            self.plates.pop(number, None)
+        if check_in_time:
+            self.checkins[number] = check_in_time
+        else:
+            self.checkins.pop(number, None)
+
+    def update(self, slot_id, fields):
+        """Apply status/license_plate/check_in_time changes; False if the slot is unknown."""
+        extra = self.extra.get(slot_id)
+        if extra is not None:
+            for field in ('license_plate', 'check_in_time'):
+                if field in fields:
+                    extra[field] = fields[field]
+            if 'status' in fields:
+                extra['status'] = (fields['status'] or 'available').lower()
+            return True
+        number = self.index.get(slot_id)
+        if number is None:
+            return False
+        if 'status' in fields:
+            self.codes[number] = status_code(fields['status'])
+        self._set_side(
+            number,
+            fields['license_plate'] if 'license_plate' in fields else self.plates.get(number),
+            fields['check_in_time'] if 'check_in_time' in fields else self.checkins.get(number),
+        )
+        return True
+
+    def remove(self, slot_id):
+        if self.extra.pop(slot_id, None) is not None:
+            return True
+        number = self.index.pop(slot_id, None)
+        if number is None:
+            return False
+        self.codes[number] = 0
+        self.ids[number] = 0
+        self._dense -= 1
+        self._set_side(number, None, None)
+        return True
+
+    # -- reads -------------------------------------------------------------
+
+    def slot_ids(self):
+        return list(self.index) + list(self.extra)
+
+    def __contains__(self, slot_id):
+        return slot_id in self.index or slot_id in self.extra
+
+    def __len__(self):
+        return self._dense + len(self.extra)
+
+    @property
+    def total(self):
+        return len(self)
+
+    @property
+    def filled(self):
+        filled = self.codes.tobytes().translate(_FILLED_TABLE).count(1)
+        return filled + sum(row['status'] in FILLED_STATUSES for row in self.extra.values())
+
+    def status_counts(self):
+        """{status: count} over all slots."""
+        counts = {}
+        for code, status in enumerate(STATUSES):
+            if status and code in self.codes:
+                counts[status] = self.codes.count(code)
+        for row in self.extra.values():
+            status = row['status'] if row['status'] in STATUS_CODES else 'available'
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def _dense_row(self, number):
+        return {
+            'id': self.ids[number],
+            'lot_id': self.lot_id,
+            'slot_number': number,
+            'status': STATUSES[self.codes[number]],
+            'license_plate': self.plates.get(number),
+            'check_in_time': self.checkins.get(number),
+        }
+
+    def slot(self, slot_id):
+        """One slot as a dict, or None."""
+        if slot_id in self.extra:
+            return dict(self.extra[slot_id])
+        number = self.index.get(slot_id)
+        return None if number is None else self._dense_row(number)
+
+    def iter_slots(self):
+        """Slot dicts in grid order (slot number; unnumbered slots last)."""
+        extras = list(self.extra.values())
+        # Same order as sorting on the views' slot key: non-numeric numbers sort as 0
+        for row in extras:
+            if row['slot_number'] is not None and not _is_int(row['slot_number']):
+                yield dict(row)
+        numbered = sorted(
+            (int(row['slot_number']), row) for row in extras
+            if row['slot_number'] is not None and _is_int(row['slot_number'])
+        )
+        position = 0
+        codes = self.codes
+        for number in range(len(codes)):
+            while position < len(numbered) and numbered[position][0] <= number:
+                yield dict(numbered[position][1])
+                position += 1
+            if codes[number]:
+                yield self._dense_row(number)
+        for _, row in numbered[position:]:
+            yield dict(row)
+        for row in extras:
+            if row['slot_number'] is None:
+                yield dict(row)
+
+
+def _is_int(value):
+    try:
+        int(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def group_rows(rows):
+    """{lot_id: LotSnapshot} from parking_slot rows (rows without a lot are skipped)."""
+    rows_by_lot = {}
+    for row in rows:
+        lot_id = row.get('lot_id')
+        if lot_id is None:
+            continue
+        # Ensure lot_id is int for consistent lookup
+        if type(lot_id) is not int:
+            try:
+                lot_id = int(lot_id)
+            except (TypeError, ValueError):
+                pass
+        lot_rows = rows_by_lot.get(lot_id)
+        if lot_rows is None:
+            lot_rows = rows_by_lot[lot_id] = []
+        lot_rows.append(row)
+    return {lot_id: LotSnapshot.from_rows(lot_rows, lot_id) for lot_id, lot_rows in rows_by_lot.items()}
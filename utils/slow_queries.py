@@ -0,0 +1,147 @@
+"""
+Slow-query log: Supabase calls slower than settings.SLOW_QUERY_MS.
+
+Each slow call is logged (logger 'parkit.slow_queries') with its table,
+operation, filters, row count, duration, run_query site name and the code that
+issued it: the views.py / async_views.py function and line, or else the first
+app frame outside the Supabase plumbing. Calls are also aggregated per call site
+over the last SLOW_QUERY_WINDOW_SECONDS; report() ranks them by total time
+spent (GET /api/admin/slow-queries/).
+
+The aggregate is per worker process; the log lines cover every worker.
+"""
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger('parkit.slow_queries')
+
+DEFAULT_THRESHOLD_MS = 500
+DEFAULT_WINDOW_SECONDS = 3600
+BUCKETS_PER_WINDOW = 12
+MAX_FILTERS_LENGTH = 300
+
+# run_query site name of the call in progress (set by utils.resilience)
+current_site = contextvars.ContextVar('parkit_query_site', default=None)
+
+_VIEW_FILES = ('views.py', 'async_views.py')
+_APP_DIRS = tuple(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), name) + os.sep
+    for name in ('Park_IT', 'utils')
+)
+# The Supabase plumbing between a view and the HTTP call
+_PLUMBING = {'resilience.py', 'supabase_client.py', 'local_backend.py', 'metrics.py', 'slow_queries.py',
+             'concurrency.py', 'tracing.py'}
+
+_config = None
+_lock = threading.Lock()
+_buckets = {}  # bucket start -> {(call_site, site, table, operation): stats}
+
+
+def _load_config():
+    global _config
+    if _config is None:
+        threshold, window = DEFAULT_THRESHOLD_MS, DEFAULT_WINDOW_SECONDS
+        try:
+            from django.conf import settings
+            if settings.configured:
+                threshold = getattr(settings, 'SLOW_QUERY_MS', threshold)
+                window = getattr(settings, 'SLOW_QUERY_WINDOW_SECONDS', window)
+        except ImportError:
+            pass
+        _config = (float(threshold) / 1000.0, float(window))
+    return _config
+
+
+def call_site(frame=None):
+    """'views.py:DashboardView.get:652' for the code that issued the current call."""
+    frame = frame or sys._getframe(1)
+    fallback = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        basename = os.path.basename(filename)
+        if basename in _VIEW_FILES:
+            return f'{basename}:{frame.f_code.co_qualname}:{frame.f_lineno}'
+        if fallback is None and basename not in _PLUMBING and filename.startswith(_APP_DIRS):
+            fallback = f'{basename}:{frame.f_code.co_qualname}:{frame.f_lineno}'
+        frame = frame.f_back
+    return fallback or 'unknown'
+
+
+def _prune(now, window):
+    bucket_seconds = window / BUCKETS_PER_WINDOW
+    oldest = now - window - bucket_seconds
+    for start in [start for start in _buckets if start < oldest]:
+        del _buckets[start]
+
+
+def observe(table, operation, seconds, filters='', rows=None, outcome='ok'):
+    """Record a finished Supabase call; only slow ones cost more than a comparison."""
+    threshold, window = _load_config()
+    if seconds < threshold:
+        return
+    site = current_site.get() or '-'
+    where = call_site(sys._getframe(1))
+    filters = filters if len(filters) <= MAX_FILTERS_LENGTH else filters[:MAX_FILTERS_LENGTH] + '...'
+    logger.warning(
+        'Slow query: %s %s took %.0fms at %s (site %s)', operation, table, seconds * 1000, where, site,
+        extra={'table': table, 'operation': operation, 'filters': filters, 'rows': rows,
+               'duration_ms': round(seconds * 1000, 1), 'call_site': where, 'site': site, 'outcome': outcome},
+    )
+
+    now = time.time()
+    bucket = now - now % (window / BUCKETS_PER_WINDOW)
+    key = (where, site, table, operation)
+    with _lock:
+        stats = _buckets.setdefault(bucket, {}).get(key)
+        if stats is None:
+            stats = _buckets[bucket][key] = {'count': 0, 'total': 0.0, 'max': 0.0, 'rows': None, 'filters': ''}
+        stats['count'] += 1
+        stats['total'] += seconds
+        if seconds >= stats['max']:
+            stats['max'] = seconds
+            stats['filters'] = filters  # of the slowest call
+        if rows is not None:
+            stats['rows'] = max(rows, stats['rows'] or 0)
+        _prune(now, window)
+
+
+def report(top=20):
+    """The top call sites by time spent in slow calls over the window, slowest first."""
+    threshold, window = _load_config()
+    now = time.time()
+    merged = {}
+    with _lock:
+        _prune(now, window)
+        for start, entries in _buckets.items():
+            if start < now - window:
+                continue
+            for key, stats in entries.items():
+                total = merged.setdefault(key, {'count': 0, 'total': 0.0, 'max': 0.0, 'rows': None, 'filters': ''})
+                total['count'] += stats['count']
+                total['total'] += stats['total']
+                if stats['max'] >= total['max']:
+                    total['max'], total['filters'] = stats['max'], stats['filters']
+                if stats['rows'] is not None:
+                    total['rows'] = max(stats['rows'], total['rows'] or 0)
+    ranked = sorted(merged.items(), key=lambda item: -item[1]['total'])[:top]
+    return {
+        'threshold_ms': threshold * 1000,
+        'window_seconds': window,
+        'worker': os.getpid(),
+        'queries': [
+            {
+                'call_site': where, 'site': site, 'table': table, 'operation': operation,
+                'count': stats['count'],
+                'total_ms': round(stats['total'] * 1000, 1),
+                'avg_ms': round(stats['total'] * 1000 / stats['count'], 1),
+                'max_ms': round(stats['max'] * 1000, 1),
+                'max_rows': stats['rows'],
+                'slowest_filters': stats['filters'],
+            }
+            for (where, site, table, operation), stats in ranked
+        ],
+    }
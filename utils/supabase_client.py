@@ -1,16 +1,219 @@
 from supabase import create_client, Client
+import asyncio
 import os
+import threading
+import time
+import weakref
+
+from . import metrics, slow_queries, tracing
 
 # Global client instance
 _supabase_client: Client = None
 
+# Thread-safety notes (gunicorn runs several threads per worker sharing this module):
+# - httpx.Client and its connection pool are thread-safe, so a single client per
+#   worker process is shared by every thread and its keep-alive connections reused.
+# - Creation is guarded by a lock so concurrent first requests do not each build a
+#   client (and a pool) and leak all but one of them.
+# - auth.sign_in_with_password() on the shared client changes its Authorization
+#   header and drops the postgrest session for every thread; the tuned session is
+#   rebuilt on next use because the factory below is patched on the instance.
+_client_lock = threading.Lock()
+
+# The library defaults are httpx's pool limits with a 5s keep-alive expiry (so an
+# idle worker pays a new TLS handshake on almost every request) and a 120s timeout.
+# Overridden by settings.SUPABASE_HTTP when running under Django.
+DEFAULT_TRANSPORT = {
+    'HTTP2': True,
+    'MAX_CONNECTIONS': 20,
+    'MAX_KEEPALIVE_CONNECTIONS': 10,
+    'KEEPALIVE_EXPIRY': 60.0,
+    'CONNECT_TIMEOUT': 5.0,
+    'READ_TIMEOUT': 15.0,
+    'WRITE_TIMEOUT': 15.0,
+    'POOL_TIMEOUT': 5.0,
+}
+
+
+def get_transport_config():
+    """HTTP transport settings for the Supabase client (settings.SUPABASE_HTTP)."""
+    config = dict(DEFAULT_TRANSPORT)
+    try:
+        from django.conf import settings
+        config.update(getattr(settings, 'SUPABASE_HTTP', None) or {})
+    except Exception:
+        # Used outside Django (benchmarks, scripts) - keep the defaults
+        pass
+    return config
+
+
+def _row_count(response):
+    # PostgREST's Content-Range is "0-24/*" (or "*/0" when nothing matched); the body isn't read yet
+    first_last = response.headers.get('content-range', '').split('/', 1)[0]
+    first, _, last = first_last.partition('-')
+    if first.isdigit() and last.isdigit():
+        return int(last) - int(first) + 1
+    return 0 if first_last == '*' else None
+
+
+def _query_span(request):
+    # Client span of a PostgREST call; PostgREST gets the trace in the traceparent header
+    table, operation = metrics.describe_request(request.method, request.url.path, request.headers.get('prefer', ''))
+    return tracing.span(f'{operation} {table}', tracing.CLIENT, {
+        'db.system': 'postgresql',
+        'db.operation.name': operation,
+        'db.collection.name': table,
+        'http.request.method': request.method,
+        'server.address': request.url.host,
+        'parkit.query.site': slow_queries.current_site.get(),
+    })
+
+
+def _observe_query(request, started, response=None, span=None):
+    seconds = time.perf_counter() - started
+    table, operation = metrics.describe_request(request.method, request.url.path, request.headers.get('prefer', ''))
+    if response is None:
+        outcome = 'failed'
+    else:
+        outcome = 'error' if response.status_code >= 400 else 'ok'
+    rows = _row_count(response) if response is not None else None
+    metrics.observe_query(table, operation, seconds, outcome)
+    slow_queries.observe(
+        table, operation, seconds, filters=request.url.query.decode(errors='replace'), rows=rows, outcome=outcome,
+    )
+    if span is not None and response is not None:
+        span.set_attribute('http.response.status_code', response.status_code)
+        span.set_attribute('db.response.returned_rows', rows)
+        if outcome == 'error':
+            span.set_error(f'HTTP {response.status_code}')
+
+
+_metered_transports = None
+
+
+def _metered_transport_classes():
+    """httpx transports that count, time and trace every PostgREST call (utils/metrics.py, utils/tracing.py)."""
+    global _metered_transports
+    if _metered_transports is None:
+        import httpx
+
+        class MeteredTransport(httpx.HTTPTransport):
+            def handle_request(self, request):
+                started = time.perf_counter()
+                with _query_span(request) as span:
+                    if span is not None:
+                        request.headers['traceparent'] = span.traceparent
+                    try:
+                        response = super().handle_request(request)
+                    except Exception:
+                        _observe_query(request, started)
+                        raise
+                    _observe_query(request, started, response, span)
+                    return response
+
+        class AsyncMeteredTransport(httpx.AsyncHTTPTransport):
+            async def handle_async_request(self, request):
+                started = time.perf_counter()
+                with _query_span(request) as span:
+                    if span is not None:
+                        request.headers['traceparent'] = span.traceparent
+                    try:
+                        response = await super().handle_async_request(request)
+                    except Exception:
+                        _observe_query(request, started)
+                        raise
+                    _observe_query(request, started, response, span)
+                    return response
+
+        _metered_transports = (MeteredTransport, AsyncMeteredTransport)
+    return _metered_transports
+
+
+def _http_client_options(config, is_async=False):
+    import httpx
+
+    http2 = bool(config['HTTP2'])
+    limits = httpx.Limits(
+        max_connections=int(config['MAX_CONNECTIONS']),
+        max_keepalive_connections=int(config['MAX_KEEPALIVE_CONNECTIONS']),
+        keepalive_expiry=float(config['KEEPALIVE_EXPIRY']),
+    )
+    transport_class = _metered_transport_classes()[1 if is_async else 0]
+    return dict(
+        http2=http2,
+        limits=limits,
+        transport=transport_class(http2=http2, limits=limits),
+        timeout=httpx.Timeout(
+            connect=float(config['CONNECT_TIMEOUT']),
+            read=float(config['READ_TIMEOUT']),
+            write=float(config['WRITE_TIMEOUT']),
+            pool=float(config['POOL_TIMEOUT']),
+        ),
+        follow_redirects=True,
+    )
+
+
+def build_http_client(config, base_url='', headers=None):
+    """Create a pooled keep-alive httpx client from a transport config."""
+    import httpx
+
+    return httpx.Client(base_url=base_url, headers=headers, **_http_client_options(config))
+
+
+def build_async_http_client(config, base_url='', headers=None):
+    """Async counterpart of build_http_client() for the async Supabase client."""
+    import httpx
+
+    return httpx.AsyncClient(base_url=base_url, headers=headers, **_http_client_options(config, is_async=True))
+
+
+def _tune_transport(client, config, builder=build_http_client):
+    """Swap postgrest's default httpx session for one built from the transport config."""
+    original_factory = getattr(client, '_init_postgrest_client', None)
+    if original_factory is None:
+        # Unknown client layout - keep the library defaults rather than fail
+        return client
+
+    def tuned_factory(*args, **kwargs):
+        postgrest = original_factory(*args, **kwargs)
+        session = getattr(postgrest, 'session', None)
+        if session is not None:
+            postgrest.session = builder(config, session.base_url, session.headers)
+            # The replaced session has not opened any connection yet; async
+            # sessions only have aclose() and are simply dropped.
+            if hasattr(session, 'close'):
+                session.close()
+        return postgrest
+
+    # Patched on the instance so the session rebuilt after auth events is tuned too
+    client._init_postgrest_client = tuned_factory
+    if getattr(client, '_postgrest', None) is not None:
+        client._postgrest = None
+    return client
+
+
 def get_client() -> Client:
     """Get or create Supabase client instance (lazy initialization)."""
+    if _supabase_client is not None:
+        return _supabase_client
+
+    with _client_lock:
+        return _create_client_locked()
+
+
+def _create_client_locked() -> Client:
     global _supabase_client
     
     if _supabase_client is not None:
         return _supabase_client
     
+    # SUPABASE_BACKEND=local swaps in the in-memory stand-in (benchmarks, offline work)
+    backend = (os.environ.get("SUPABASE_BACKEND") or "remote").strip().lower()
+    if backend == "local":
+        from .local_backend import create_local_client
+        _supabase_client = create_local_client()
+        return _supabase_client
+
     url: str = os.environ.get("SUPABASE_URL")
     # Check for both SUPABASE_SERVICE_ROLE_KEY and SUPABASE_ANON_KEY
     # Service role key is preferred for admin operations, but anon key works for auth
@@ -26,9 +229,47 @@ def get_client() -> Client:
             "either SUPABASE_SERVICE_ROLE_KEY or SUPABASE_ANON_KEY in your environment variables."
         )
 
-    _supabase_client = create_client(url, key)
+    _supabase_client = _tune_transport(create_client(url, key), get_transport_config())
     return _supabase_client
 
+# Async clients keyed by event loop: httpx.AsyncClient connections belong to the
+# loop that opened them. Under uvicorn there is one loop (so one client) per worker.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+async def get_async_client():
+    """Get or create the async Supabase client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is not None:
+        return client
+
+    backend = (os.environ.get("SUPABASE_BACKEND") or "remote").strip().lower()
+    if backend == "local":
+        # Share the sync client's store so both view paths see the same data
+        from .local_backend import create_async_local_client
+        client = create_async_local_client(get_client().store)
+    else:
+        from supabase import acreate_client
+
+        url = os.environ.get("SUPABASE_URL")
+        key = (
+            os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+            or os.environ.get("SUPABASE_ANON_KEY")
+            or os.environ.get("SUPABASE_KEY")
+        )
+        if not url or not key:
+            raise ValueError(
+                "Supabase credentials not found. Please set SUPABASE_URL and "
+                "either SUPABASE_SERVICE_ROLE_KEY or SUPABASE_ANON_KEY in your environment variables."
+            )
+        client = _tune_transport(
+            await acreate_client(url, key), get_transport_config(), builder=build_async_http_client
+        )
+
+    # Another task on this loop may have finished first while we awaited
+    return _async_clients.setdefault(loop, client)
+
 # For backwards compatibility, create a proxy object
 class _SupabaseProxy:
     """Proxy object that lazily initializes Supabase client on attribute access."""
@@ -0,0 +1,353 @@
+"""
+Request tracing: spans in the OpenTelemetry data model, exported as OTLP/JSON.
+
+TracingMiddleware opens a server span per request (continuing an incoming W3C
+`traceparent`); inside it, code opens child spans:
+
+    with tracing.span('render dashboard.html', attributes={'template': name}):
+        ...
+
+Spans exist for every Supabase call (table/operation attributes, the
+`traceparent` header is passed on to PostgREST), template rendering and
+reference-cache lookups, so a check-in shows as a waterfall of its calls.
+Outside a sampled request span() yields None and costs one context variable
+lookup. Log records get the trace_id/span_id next to the request id.
+
+Finished traces go through a queue to an exporter thread, which appends them to
+TRACE_DIR/<date>-<pid>.jsonl (one OTLP ExportTraceServiceRequest per line) and,
+when TRACE_OTLP_ENDPOINT is set, POSTs them to an OTLP/HTTP collector
+(e.g. http://localhost:4318/v1/traces). `manage.py show_trace <request id>`
+prints the waterfall of a trace from the files.
+"""
+import atexit
+import contextvars
+import glob
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger('parkit.tracing')
+
+SERVICE_NAME = 'parkit'
+# OTLP SpanKind and StatusCode values
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+EXPORT_SECONDS = 2.0
+MAX_QUEUE = 2000
+MAX_SPANS_PER_TRACE = 1000
+
+# Span the current thread/task is in (None outside sampled requests)
+current_span = contextvars.ContextVar('parkit_span', default=None)
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+
+def _setting(name, default):
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except ImportError:
+        return default
+
+
+class _Trace:
+    """The spans of one trace finished in this process, exported with its root."""
+    __slots__ = ('spans', 'dropped')
+
+    def __init__(self):
+        self.spans = []
+        self.dropped = 0
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns', 'attributes',
+                 'status', 'status_message', 'events', '_trace')
+
+    def __init__(self, name, kind, trace_id, parent_id, trace, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = {key: value for key, value in attributes.items() if value is not None} if attributes else {}
+        self.status = STATUS_UNSET
+        self.status_message = ''
+        self.events = []
+        self._trace = trace
+
+    def set_attribute(self, key, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, message=''):
+        self.status, self.status_message = STATUS_ERROR, message
+
+    def record_exception(self, exc):
+        self.set_error(f'{type(exc).__name__}: {exc}')
+        self.events.append((time.time_ns(), 'exception', {
+            'exception.type': type(exc).__qualname__, 'exception.message': str(exc),
+        }))
+
+    @property
+    def traceparent(self):
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        trace = self._trace
+        if len(trace.spans) < MAX_SPANS_PER_TRACE:
+            trace.spans.append(self)
+        else:
+            trace.dropped += 1
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': _otlp_attributes(self.attributes),
+            'status': {'code': self.status, 'message': self.status_message} if self.status else {},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        if self.events:
+            span['events'] = [
+                {'timeUnixNano': str(at), 'name': name, 'attributes': _otlp_attributes(attributes)}
+                for at, name, attributes in self.events
+            ]
+        return span
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items()]
+
+
+# -- starting spans -------------------------------------------------------------
+
+def _sampled(parent_flags):
+    if parent_flags is not None:
+        return bool(int(parent_flags, 16) & 1)  # the caller already decided
+    rate = float(_setting('TRACE_SAMPLE_RATE', 1.0))
+    return rate >= 1 or random.random() < rate
+
+
+def start_trace(name, traceparent=None, attributes=None):
+    """A server span for an incoming request, or None when it is not sampled.
+
+    Continues the caller's trace when traceparent is a valid W3C header.
+    """
+    match = _TRACEPARENT.match(traceparent or '')
+    if match and match.group(1) != '0' * 32:
+        trace_id, parent_id, flags = match.groups()
+    else:
+        trace_id, parent_id, flags = os.urandom(16).hex(), None, None
+    if not _sampled(flags):
+        return None
+    return Span(name, SERVER, trace_id, parent_id, _Trace(), attributes)
+
+
+def finish_trace(root):
+    """End the request span and queue its trace for export."""
+    root.end()
+    get_exporter().export(root._trace)
+
+
+@contextmanager
+def span(name, kind=INTERNAL, attributes=None):
+    """Child span of the current one; yields None (and records nothing) outside a trace."""
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, kind, parent.trace_id, parent.span_id, parent._trace, attributes)
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.record_exception(exc)
+        raise
+    finally:
+        current_span.reset(token)
+        child.end()
+
+
+# -- export ---------------------------------------------------------------------
+
+def _payload(spans):
+    """An OTLP ExportTraceServiceRequest in its JSON encoding."""
+    return {'resourceSpans': [{
+        'resource': {'attributes': _otlp_attributes({'service.name': SERVICE_NAME, 'process.pid': os.getpid()})},
+        'scopeSpans': [{'scope': {'name': 'parkit.tracing'}, 'spans': [item.to_otlp() for item in spans]}],
+    }]}
+
+
+class Exporter:
+    """Writes queued traces to TRACE_DIR and/or an OTLP/HTTP endpoint from a background thread."""
+
+    def __init__(self, directory, endpoint=None, interval=EXPORT_SECONDS):
+        self.directory = str(directory) if directory else ''
+        self.endpoint = endpoint or ''
+        self.interval = interval
+        self.pid = os.getpid()
+        self.dropped = 0
+        self._queue = queue.Queue(MAX_QUEUE)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+
+    def start(self):
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        if self.pid == os.getpid() and not self._stop.is_set():
+            self._stop.set()
+            self._thread.join(timeout=5)
+
+    def export(self, trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._drain()
+        self._drain()
+
+    def _drain(self):
+        spans = []
+        while True:
+            try:
+                spans.extend(self._queue.get_nowait().spans)
+            except queue.Empty:
+                break
+        if not spans:
+            return
+        payload = _payload(spans)
+        try:
+            self.write(payload)
+        except Exception as exc:
+            logger.warning('Could not export %d spans: %s', len(spans), exc)
+
+    def write(self, payload):
+        body = json.dumps(payload, separators=(',', ':'))
+        if self.directory:
+            path = os.path.join(self.directory, f'{datetime.now():%Y%m%d}-{self.pid}.jsonl')
+            with open(path, 'a', encoding='utf-8') as handle:
+                handle.write(body + '\n')
+        if self.endpoint:
+            request = urllib.request.Request(
+                self.endpoint, data=body.encode(), headers={'Content-Type': 'application/json'}, method='POST',
+            )
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter():
+    """This process's exporter, started on first use (again in a forked worker)."""
+    global _exporter
+    if _exporter is None or _exporter.pid != os.getpid():
+        with _exporter_lock:
+            if _exporter is None or _exporter.pid != os.getpid():
+                _exporter = Exporter(_setting('TRACE_DIR', 'traces'), _setting('TRACE_OTLP_ENDPOINT', '')).start()
+    return _exporter
+
+
+# -- reading exported traces ---------------------------------------------------
+
+def _attribute_value(value):
+    for kind in ('stringValue', 'boolValue', 'doubleValue'):
+        if kind in value:
+            return value[kind]
+    return int(value['intValue']) if 'intValue' in value else None
+
+
+def read_spans(paths):
+    """{trace id: [span dicts]} from OTLP/JSON lines files; attributes become plain dicts."""
+    traces = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as handle:
+            for line in handle:
+                try:
+                    payload = json.loads(line)
+                except ValueError:
+                    continue  # cut short by a crash
+                for resource in payload.get('resourceSpans', []):
+                    for scope in resource.get('scopeSpans', []):
+                        for item in scope.get('spans', []):
+                            item['attributes'] = {
+                                attribute['key']: _attribute_value(attribute['value'])
+                                for attribute in item.get('attributes', [])
+                            }
+                            traces.setdefault(item['traceId'], []).append(item)
+    return traces
+
+
+def trace_files(directory):
+    return sorted(glob.glob(os.path.join(directory, '*.jsonl')))
+
+
+def root_of(spans):
+    ids = {item['spanId'] for item in spans}
+    roots = [item for item in spans if item.get('parentSpanId') not in ids]
+    return min(roots, key=lambda item: int(item['startTimeUnixNano'])) if roots else None
+
+
+def render_waterfall(spans, width=40):
+    """Text waterfall of one trace: each span indented under its parent, with a time bar."""
+    root = root_of(spans)
+    if root is None:
+        return ''
+    start = int(root['startTimeUnixNano'])
+    end = max(int(item['endTimeUnixNano']) for item in spans)
+    total = max(end - start, 1)
+    children = {}
+    for item in spans:
+        children.setdefault(item.get('parentSpanId'), []).append(item)
+
+    lines = []
+    pending = [(root, 0)]
+    while pending:
+        item, depth = pending.pop()
+        began, ended = int(item['startTimeUnixNano']) - start, int(item['endTimeUnixNano']) - start
+        left = int(width * began / total)
+        bar = ' ' * left + '#' * max(1, int(width * ended / total) - left)
+        error = ' !' if item.get('status', {}).get('code') == STATUS_ERROR else ''
+        label = ('  ' * depth + item['name'])[:48]
+        lines.append(f'{label:<48} {began / 1e6:9.1f}ms {(ended - began) / 1e6:9.1f}ms |{bar:<{width}}|{error}')
+        for child in sorted(children.get(item['spanId'], []), key=lambda c: -int(c['startTimeUnixNano'])):
+            pending.append((child, depth + 1))
+    return '\n'.join(lines)